@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Batched UPDATE helper
+Applies many single-row updates as one UPDATE ... FROM (VALUES ...) statement
+per chunk instead of one round trip per row.
+
+Each chunk runs inside a savepoint: if the chunk fails, it is rolled back to
+the savepoint and its rows are retried one by one (each in its own savepoint)
+so a single bad row only fails itself. With only_changed=True rows whose
+values already match are skipped by an IS DISTINCT FROM guard, so unchanged
+rows (and their TOASTed values) are never rewritten.
+"""
+
+import logging
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+def get_column_types(conn, table):
+    """
+    Return {column: SQL type} for a table, e.g. {'images': 'json'}.
+    Type modifiers are dropped on purpose: an explicit ::varchar(n) cast would
+    silently truncate, while the assignment itself raises on overlong values.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT a.attname, format_type(a.atttypid, NULL)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+    """, (table,))
+    column_types = dict(cursor.fetchall())
+    cursor.close()
+    return column_types
+
+def build_batch_update_query(table, key_column, value_columns, column_types,
+                             extra_assignments=None, only_changed=True):
+    """
+    Build the UPDATE ... FROM (VALUES %s) statement and its VALUES row template.
+    extra_assignments is {column: value} applied to every updated row
+    (e.g. modified_date); values are passed as literals.
+    """
+    all_columns = [key_column] + list(value_columns)
+
+    assignments = [
+        sql.SQL("{col} = v.{col}").format(col=sql.Identifier(col))
+        for col in value_columns
+    ]
+    for col, value in (extra_assignments or {}).items():
+        assignments.append(sql.SQL("{col} = {value}").format(
+            col=sql.Identifier(col), value=sql.Literal(value)
+        ))
+
+    conditions = [sql.SQL("t.{key} = v.{key}").format(key=sql.Identifier(key_column))]
+    if only_changed:
+        changed = []
+        for col in value_columns:
+            # json has no equality operator; compare its text form instead
+            if column_types.get(col) == 'json':
+                template = "t.{col}::text IS DISTINCT FROM v.{col}::text"
+            else:
+                template = "t.{col} IS DISTINCT FROM v.{col}"
+            changed.append(sql.SQL(template).format(col=sql.Identifier(col)))
+        conditions.append(sql.SQL("({})").format(sql.SQL(" OR ").join(changed)))
+
+    query = sql.SQL("""
+        UPDATE {table} AS t
+        SET {assignments}
+        FROM (VALUES %s) AS v({columns})
+        WHERE {conditions}
+        RETURNING t.{key}
+    """).format(
+        table=sql.Identifier(table),
+        assignments=sql.SQL(", ").join(assignments),
+        columns=sql.SQL(", ").join(sql.Identifier(col) for col in all_columns),
+        conditions=sql.SQL(" AND ").join(conditions),
+        key=sql.Identifier(key_column)
+    )
+
+    # Cast every VALUES column to the target type so NULL-only or
+    # literal-typed columns (json, numeric, dates) match the table
+    template = "(" + ", ".join(
+        f"%s::{column_types[col]}" if col in column_types else "%s"
+        for col in all_columns
+    ) + ")"
+
+    return query, template
+
+def batch_update(conn, table, key_column, value_columns, rows,
+                 extra_assignments=None, only_changed=True, chunk_size=500):
+    """
+    Update rows of table in chunks of chunk_size.
+    rows is a list of tuples (key, value1, value2, ...) matching value_columns.
+    Keys with no matching row count as unchanged; callers match keys first.
+    Does not commit; the caller owns the transaction.
+    Returns {'updated': [keys], 'unchanged': count, 'failed': [(key, error)]}.
+    """
+    result = {'updated': [], 'unchanged': 0, 'failed': []}
+    if not rows:
+        return result
+
+    column_types = get_column_types(conn, table)
+    query, template = build_batch_update_query(
+        table, key_column, value_columns, column_types, extra_assignments, only_changed
+    )
+
+    cursor = conn.cursor()
+    try:
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+
+            cursor.execute("SAVEPOINT batch_update_chunk")
+            try:
+                updated = execute_values(
+                    cursor, query, chunk, template=template, page_size=len(chunk), fetch=True
+                )
+                cursor.execute("RELEASE SAVEPOINT batch_update_chunk")
+                updated_keys = [row[0] for row in updated]
+                result['updated'].extend(updated_keys)
+                result['unchanged'] += len(chunk) - len(updated_keys)
+                logger.info(f"{table}: chunk {start // chunk_size + 1} - "
+                            f"{len(updated_keys)}/{len(chunk)} rows updated")
+                continue
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT batch_update_chunk")
+                logger.warning(f"{table}: chunk starting at row {start} failed ({e}); retrying row by row")
+
+            # Isolate the bad rows
+            for row in chunk:
+                cursor.execute("SAVEPOINT batch_update_row")
+                try:
+                    updated = execute_values(cursor, query, [row], template=template, fetch=True)
+                    cursor.execute("RELEASE SAVEPOINT batch_update_row")
+                    if updated:
+                        result['updated'].append(updated[0][0])
+                    else:
+                        result['unchanged'] += 1
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT batch_update_row")
+                    result['failed'].append((row[0], str(e)))
+                    logger.error(f"{table}: update failed for {key_column}={row[0]}: {e}")
+    finally:
+        cursor.close()
+
+    return result
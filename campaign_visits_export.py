@@ -8,7 +8,10 @@ import os
 import sys
 import psycopg2
 import csv
-from datetime import datetime
+import json
+import re
+import time
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
 
@@ -33,95 +36,132 @@ def connect_db():
         logger.error(f"Database connection failed: {e}")
         raise
 
-def get_campaign_visits_data(conn):
+# Start of the campaign export window (full exports cover everything after it)
+EXPORT_WINDOW_START = '2025-12-19 18:30:00+00'
+
+# Incremental mode keeps the max exported visit timestamp here
+WATERMARK_FILE = 'campaign_visits_export.watermark.json'
+
+# Incremental runs re-read visits this far behind the watermark, so visits
+# that are written late (with a timestamp at or just below the watermark)
+# are still exported. Visits arriving later than this behind the watermark
+# are only picked up by a full export.
+WATERMARK_LOOKBACK_MINUTES = 60
+
+# Attribution logic (latest visit per IP, META/GOOGLE source, action_type,
+# bookings flag). {visit_filter} lets callers narrow the visits, e.g. the
+# attribution refresh job restricts it to the IPs that changed.
+CAMPAIGN_ATTRIBUTION_CTE = """
+    WITH unique_bookings AS (
+        SELECT DISTINCT ON (dummy_order_code)
+            id,
+            dummy_order_code,
+            flat_booking_order_code,
+            flat_slug,
+            tenant_phone_number
+        FROM flat_booking_orders
+        WHERE flat_booking_order_code IS NOT NULL
+          AND flat_booking_order_code <> '-'
+        ORDER BY dummy_order_code, created_at DESC
+    ),
+    distinct_visits AS (
+        SELECT DISTINCT ON (cv.ip_address)
+            cv.id,
+            cv.timestamp,
+            cv.ip_address,
+            cv.created_at,
+            cv.referrer,
+            cv.user_agent,
+            cv.area,
+            cv.city,
+            cv.flat_id,
+            cv.dummy_order_code,
+            cv.campaign_id,
+            cv.lead_id,
+            cv.page,
+
+            CASE
+                WHEN cv.campaign_id LIKE 'M00%%' THEN 'META'
+                ELSE 'GOOGLE'
+            END AS source,
+
+            CASE
+                WHEN cv.page = 'whatsapp_click' THEN 'whatsapp'
+                WHEN ce.id IS NOT NULL THEN 'paidlead_form'
+                WHEN sw.id IS NOT NULL THEN 'phone_call'
+                ELSE NULL
+            END AS action_type,
+
+            CASE
+                WHEN ub.dummy_order_code IS NOT NULL THEN 'YES'
+                ELSE 'No'
+            END AS bookings,
+
+            ub.flat_slug AS flat_view
+
+        FROM public.campaign_visits cv
+
+        LEFT JOIN unique_bookings ub
+            ON cv.dummy_order_code = ub.dummy_order_code
+
+        LEFT JOIN contact_enquiries ce
+            ON ce.ip::text = cv.ip_address::text
+
+        LEFT JOIN sales_webhook sw
+            ON ub.tenant_phone_number IS NOT NULL
+            AND sw.phone = CONCAT('+91', ub.tenant_phone_number)
+
+        WHERE cv.timestamp > %(since)s::timestamptz
+        {visit_filter}
+
+        ORDER BY cv.ip_address, cv.timestamp DESC
+    )
+"""
+
+CAMPAIGN_VISITS_QUERY = CAMPAIGN_ATTRIBUTION_CTE.format(visit_filter='') + """
+    SELECT 
+        timestamp::date AS date,
+        campaign_id,
+        source,
+        action_type,
+        page AS page_url,
+        bookings,
+        ip_address::text AS ip_address,
+        COALESCE(flat_view, '') AS flat_view,
+        timestamp AS time_stamp
+    FROM distinct_visits
+    ORDER BY timestamp DESC
+"""
+
+# Cheap indexed read from the table maintained by refresh_campaign_attribution.py
+ATTRIBUTION_EXPORT_QUERY = """
+    SELECT
+        timestamp::date AS date,
+        campaign_id,
+        source,
+        action_type,
+        page AS page_url,
+        bookings,
+        ip_address,
+        COALESCE(flat_view, '') AS flat_view,
+        timestamp AS time_stamp
+    FROM campaign_visit_attribution
+    WHERE timestamp > %(since)s::timestamptz
+    ORDER BY timestamp DESC
+"""
+
+def get_campaign_visits_data(conn, since=EXPORT_WINDOW_START, query=CAMPAIGN_VISITS_QUERY):
     """
     Query campaign_visits with all required joins and transformations.
     Returns distinct records based on lead_id.
+    Only visits with timestamp > since are considered.
+    Pass query=ATTRIBUTION_EXPORT_QUERY to read the maintained attribution table.
     """
     try:
         cursor = conn.cursor()
         
-        # Complex query with all joins and logic
-        query = """
-        WITH unique_bookings AS (
-            SELECT DISTINCT ON (dummy_order_code)
-                id,
-                dummy_order_code,
-                flat_booking_order_code,
-                flat_slug,
-                tenant_phone_number
-            FROM flat_booking_orders
-            WHERE flat_booking_order_code IS NOT NULL
-              AND flat_booking_order_code <> '-'
-            ORDER BY dummy_order_code, created_at DESC
-        ),
-        distinct_visits AS (
-            SELECT DISTINCT ON (cv.ip_address)
-                cv.id,
-                cv.timestamp,
-                cv.ip_address,
-                cv.created_at,
-                cv.referrer,
-                cv.user_agent,
-                cv.area,
-                cv.city,
-                cv.flat_id,
-                cv.dummy_order_code,
-                cv.campaign_id,
-                cv.lead_id,
-                cv.page,
-
-                CASE
-                    WHEN cv.campaign_id LIKE 'M00%' THEN 'META'
-                    ELSE 'GOOGLE'
-                END AS source,
-
-                CASE
-                    WHEN cv.page = 'whatsapp_click' THEN 'whatsapp'
-                    WHEN ce.id IS NOT NULL THEN 'paidlead_form'
-                    WHEN sw.id IS NOT NULL THEN 'phone_call'
-                    ELSE NULL
-                END AS action_type,
-
-                CASE
-                    WHEN ub.dummy_order_code IS NOT NULL THEN 'YES'
-                    ELSE 'No'
-                END AS bookings,
-                
-                ub.flat_slug AS flat_view
-
-            FROM public.campaign_visits cv
-
-            LEFT JOIN unique_bookings ub
-                ON cv.dummy_order_code = ub.dummy_order_code
-
-            LEFT JOIN contact_enquiries ce
-                ON ce.ip::text = cv.ip_address::text
-
-            LEFT JOIN sales_webhook sw
-                ON ub.tenant_phone_number IS NOT NULL
-                AND sw.phone = CONCAT('+91', ub.tenant_phone_number)
-
-            WHERE cv.timestamp > TIMESTAMPTZ '2025-12-19 18:30:00+00'
-
-            ORDER BY cv.ip_address, cv.timestamp DESC
-        )
-        SELECT 
-            timestamp::date AS date,
-            campaign_id,
-            source,
-            action_type,
-            page AS page_url,
-            bookings,
-            ip_address::text AS ip_address,
-            COALESCE(flat_view, '') AS flat_view,
-            timestamp AS time_stamp
-        FROM distinct_visits
-        ORDER BY timestamp DESC
-        """
-        
         logger.info("Executing query to fetch campaign visits data...")
-        cursor.execute(query)
+        cursor.execute(query, {'since': since})
         # print(query)
         # exit()
         columns = [desc[0] for desc in cursor.description]
@@ -136,77 +176,67 @@ def get_campaign_visits_data(conn):
         logger.error(f"Error retrieving data from database: {e}")
         raise
 
+# CSV column order for the export
+CSV_COLUMNS = [
+    'Date',
+    'campaign_id',
+    'Source',
+    'action_type (whatsapp / phone_call / paidlead_form)',
+    'page_url',
+    'Bookings',
+    'IP ADRESS',
+    'FLAT VIEW',
+    'Time Stamp'
+]
+
+IP_COLUMN_INDEX = CSV_COLUMNS.index('IP ADRESS')
+TIMESTAMP_COLUMN_INDEX = CSV_COLUMNS.index('Time Stamp')
+
+def format_value(value):
+    """Format a database value for the CSV"""
+    if value is None:
+        return ''
+    # Handle datetime objects
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    # Handle date objects (from timestamp::date)
+    if hasattr(value, 'strftime'):
+        try:
+            return value.strftime('%Y-%m-%d')
+        except:
+            return str(value)
+    return str(value)
+
+def format_csv_row(row_dict):
+    """Format a query row according to CSV column order"""
+    return [
+        format_value(row_dict.get('date')),  # Date
+        format_value(row_dict.get('campaign_id')),  # campaign_id
+        format_value(row_dict.get('source')),  # Source
+        format_value(row_dict.get('action_type')),  # action_type
+        format_value(row_dict.get('page_url')),  # page_url
+        format_value(row_dict.get('bookings', 'No')),  # Bookings
+        format_value(row_dict.get('ip_address')),  # IP ADRESS
+        format_value(row_dict.get('flat_view')),  # FLAT VIEW
+        format_value(row_dict.get('time_stamp'))  # Time Stamp
+    ]
+
 def export_to_csv(columns, rows, output_file='campaign_visits_export.csv'):
     """Export data to CSV file"""
     try:
-        # Map database column names to CSV column names
-        csv_column_mapping = {
-            'date': 'Date',
-            'campaign_id': 'campaign_id',
-            'source': 'Source',
-            'action_type': 'action_type (whatsapp / phone_call / paidlead_form)',
-            'page_url': 'page_url',
-            'bookings': 'Bookings',
-            'ip_address': 'IP ADRESS',
-            'flat_view': 'FLAT VIEW',
-            'time_stamp': 'Time Stamp'
-        }
-        
-        # Create CSV with proper column order
-        csv_columns = [
-            'Date',
-            'campaign_id',
-            'Source',
-            'action_type (whatsapp / phone_call / paidlead_form)',
-            'page_url',
-            'Bookings',
-            'IP ADRESS',
-            'FLAT VIEW',
-            'Time Stamp'
-        ]
-        
         logger.info(f"Writing data to {output_file}...")
         
         with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.writer(csvfile)
+            # Unix line endings so the file matches COPY ... CSV output byte for byte
+            writer = csv.writer(csvfile, lineterminator='\n')
             
             # Write header
-            writer.writerow(csv_columns)
+            writer.writerow(CSV_COLUMNS)
             
             # Write data rows
             for row in rows:
                 # Convert row to dict for easier mapping
-                row_dict = dict(zip(columns, row))
-                
-                # Helper function to format values
-                def format_value(value):
-                    if value is None:
-                        return ''
-                    # Handle datetime objects
-                    if isinstance(value, datetime):
-                        return value.strftime('%Y-%m-%d %H:%M:%S')
-                    # Handle date objects (from timestamp::date)
-                    if hasattr(value, 'strftime'):
-                        try:
-                            return value.strftime('%Y-%m-%d')
-                        except:
-                            return str(value)
-                    return str(value)
-                
-                # Format the row according to CSV column order
-                csv_row = [
-                    format_value(row_dict.get('date')),  # Date
-                    format_value(row_dict.get('campaign_id')),  # campaign_id
-                    format_value(row_dict.get('source')),  # Source
-                    format_value(row_dict.get('action_type')),  # action_type
-                    format_value(row_dict.get('page_url')),  # page_url
-                    format_value(row_dict.get('bookings', 'No')),  # Bookings
-                    format_value(row_dict.get('ip_address')),  # IP ADRESS
-                    format_value(row_dict.get('flat_view')),  # FLAT VIEW
-                    format_value(row_dict.get('time_stamp'))  # Time Stamp
-                ]
-                
-                writer.writerow(csv_row)
+                writer.writerow(format_csv_row(dict(zip(columns, row))))
         
         logger.info(f"Successfully exported {len(rows)} records to {output_file}")
         return output_file
@@ -215,27 +245,471 @@ def export_to_csv(columns, rows, output_file='campaign_visits_export.csv'):
         logger.error(f"Error exporting to CSV: {e}")
         raise
 
+def build_copy_query(query):
+    """
+    Wrap the export query in COPY ... TO STDOUT so PostgreSQL produces the CSV.
+    Headers and value formatting mirror export_to_csv: dates/timestamps are
+    rendered with to_char and empty strings become NULLs, because COPY writes
+    NULL as an unquoted empty field but quotes a real empty string ("").
+    """
+    return f"""
+    COPY (
+        SELECT
+            to_char(export.date, 'YYYY-MM-DD') AS "Date",
+            NULLIF(export.campaign_id, '') AS "campaign_id",
+            NULLIF(export.source, '') AS "Source",
+            NULLIF(export.action_type, '') AS "action_type (whatsapp / phone_call / paidlead_form)",
+            NULLIF(export.page_url, '') AS "page_url",
+            NULLIF(export.bookings, '') AS "Bookings",
+            NULLIF(export.ip_address, '') AS "IP ADRESS",
+            NULLIF(export.flat_view, '') AS "FLAT VIEW",
+            to_char(export.time_stamp, 'YYYY-MM-DD HH24:MI:SS') AS "Time Stamp"
+        FROM ({query}) export
+        ORDER BY export.time_stamp DESC
+    ) TO STDOUT WITH CSV HEADER
+    """
+
+def export_with_copy(conn, output_file='campaign_visits_export.csv', query=CAMPAIGN_VISITS_QUERY):
+    """
+    Export campaign visits using COPY ... TO STDOUT WITH CSV HEADER.
+    The CSV bytes are streamed straight from the server into the output file,
+    so Python does no per-row work.
+    """
+    try:
+        cursor = conn.cursor()
+
+        logger.info(f"Streaming campaign visits via COPY to {output_file}...")
+
+        # Text-mode file: psycopg2 decodes each COPY chunk from the client
+        # encoding, so the file is utf-8 like the Python path
+        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+            # COPY takes no bind parameters, so inline the window start
+            bound_query = cursor.mogrify(query, {'since': EXPORT_WINDOW_START}).decode('utf-8')
+            cursor.copy_expert(build_copy_query(bound_query), csvfile)
+
+        # rowcount is set by COPY on PostgreSQL 8.2+
+        row_count = cursor.rowcount
+        cursor.close()
+
+        logger.info(f"Successfully exported {row_count} records to {output_file}")
+        return output_file, row_count
+
+    except Exception as e:
+        logger.error(f"Error exporting with COPY: {e}")
+        raise
+
+def load_watermark(watermark_file=WATERMARK_FILE):
+    """Return the max exported visit timestamp (ISO string), or None"""
+    if not os.path.exists(watermark_file):
+        return None
+    try:
+        with open(watermark_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('watermark')
+    except Exception as e:
+        logger.warning(f"Could not read watermark file {watermark_file}: {e}")
+        return None
+
+def save_watermark(watermark, output_file, watermark_file=WATERMARK_FILE):
+    """Persist the max exported visit timestamp for the next incremental run"""
+    state = {
+        'watermark': watermark,
+        'output_file': output_file,
+        'updated_at': datetime.now().isoformat()
+    }
+    tmp_file = f"{watermark_file}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_file, watermark_file)
+    logger.info(f"Watermark saved: {watermark}")
+
+def get_max_timestamp(columns, rows):
+    """Max time_stamp of the query rows, at full precision, as an ISO string"""
+    ts_index = columns.index('time_stamp')
+    return max(row[ts_index] for row in rows).isoformat()
+
+def merge_incremental_export(columns, rows, output_file='campaign_visits_export.csv', append=False):
+    """
+    Merge newly exported visits into an existing export file.
+    The export holds one row per IP (DISTINCT ON ip_address, latest visit), so
+    rows are deduplicated on IP: a new row replaces the existing row for its IP
+    when it is newer, and re-read rows from the lookback overlap that are
+    already in the file are skipped. The file stays newest-first.
+    With append=True, new rows that are all newer than the top of the file and
+    share no IP with it are prepended by copying the existing rows through
+    unchanged, without sorting them; otherwise this falls back to a merge.
+    Note: attribution (action_type / bookings) of rows already in the file is
+    not revisited; run a full export to refresh it.
+    """
+    try:
+        new_rows = [format_csv_row(dict(zip(columns, row))) for row in rows]
+        new_rows.sort(key=lambda r: r[TIMESTAMP_COLUMN_INDEX], reverse=True)
+        
+        existing_rows = []
+        with open(output_file, 'r', newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader, None)
+            if header != CSV_COLUMNS:
+                raise ValueError(f"{output_file} does not have the expected export header")
+            existing_rows = list(reader)
+        
+        existing_by_ip = {r[IP_COLUMN_INDEX]: r for r in existing_rows}
+        new_by_ip = {}
+        for r in new_rows:
+            current = existing_by_ip.get(r[IP_COLUMN_INDEX])
+            # Keep only rows that are new or newer than the exported row for the IP
+            if current is None or r[TIMESTAMP_COLUMN_INDEX] > current[TIMESTAMP_COLUMN_INDEX]:
+                new_by_ip.setdefault(r[IP_COLUMN_INDEX], r)
+        
+        if not new_by_ip:
+            return 0, 0
+        
+        changed_rows = list(new_by_ip.values())
+        replaced = sum(1 for ip in new_by_ip if ip in existing_by_ip)
+        newest_existing = existing_rows[0][TIMESTAMP_COLUMN_INDEX] if existing_rows else ''
+        
+        if append and not replaced and changed_rows[-1][TIMESTAMP_COLUMN_INDEX] >= newest_existing:
+            logger.info(f"Prepending {len(changed_rows)} new records to {output_file}...")
+            merged_rows = changed_rows + existing_rows
+        else:
+            if append:
+                logger.info("New visits overlap rows already exported; merging instead of prepending")
+            kept_rows = [r for r in existing_rows if r[IP_COLUMN_INDEX] not in new_by_ip]
+            merged_rows = changed_rows + kept_rows
+            # 'YYYY-MM-DD HH:MM:SS' sorts chronologically as a string
+            merged_rows.sort(key=lambda r: r[TIMESTAMP_COLUMN_INDEX], reverse=True)
+        
+        logger.info(f"Rewriting {output_file} with {len(merged_rows)} records...")
+        tmp_file = f"{output_file}.tmp"
+        with open(tmp_file, 'w', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile, lineterminator='\n')
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(merged_rows)
+        os.replace(tmp_file, output_file)
+        
+        return len(changed_rows) - replaced, replaced
+        
+    except Exception as e:
+        logger.error(f"Error merging incremental export: {e}")
+        raise
+
+def run_incremental_export(conn, output_file='campaign_visits_export.csv', append=False,
+                           lookback_minutes=WATERMARK_LOOKBACK_MINUTES):
+    """
+    Export visits newer than the stored watermark (minus a lookback overlap)
+    and merge them into the existing export. Falls back to a full export on
+    the first run.
+    """
+    watermark = load_watermark()
+    
+    if watermark is None or not os.path.exists(output_file):
+        logger.info("No watermark or export file found; running full export")
+        columns, rows = get_campaign_visits_data(conn)
+        if not rows:
+            logger.warning("No data found to export")
+            return output_file
+        export_to_csv(columns, rows, output_file)
+        save_watermark(get_max_timestamp(columns, rows), output_file)
+        return output_file
+    
+    since = (datetime.fromisoformat(watermark) - timedelta(minutes=lookback_minutes)).isoformat()
+    logger.info(f"Exporting visits newer than {since} (watermark {watermark} minus {lookback_minutes} min lookback)")
+    columns, rows = get_campaign_visits_data(conn, since=since)
+    
+    if not rows:
+        logger.info("Export is already up to date")
+        return output_file
+    
+    added, replaced = merge_incremental_export(columns, rows, output_file, append)
+    logger.info(f"Incremental export: {added} new IPs, {replaced} IPs updated with newer visits")
+    # Never move the watermark backwards because of the overlap
+    latest = get_max_timestamp(columns, rows)
+    if datetime.fromisoformat(latest) > datetime.fromisoformat(watermark):
+        save_watermark(latest, output_file)
+    return output_file
+
+# Expression / partial indexes that let the export query use index scans.
+# Each entry is proposed when a plan node touches its table.
+INDEX_SUGGESTIONS = [
+    {
+        'table': 'contact_enquiries',
+        'name': 'idx_contact_enquiries_ip_text',
+        'sql': 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_contact_enquiries_ip_text '
+               'ON contact_enquiries ((ip::text))',
+        'reason': 'join on ce.ip::text = cv.ip_address::text cannot use a plain index on ip'
+    },
+    {
+        'table': 'campaign_visits',
+        'name': 'idx_campaign_visits_ip_timestamp',
+        'sql': 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_campaign_visits_ip_timestamp '
+               'ON campaign_visits (ip_address, timestamp DESC)',
+        'reason': 'DISTINCT ON (cv.ip_address) ... ORDER BY cv.ip_address, cv.timestamp DESC sort'
+    },
+    {
+        'table': 'campaign_visits',
+        'name': 'idx_campaign_visits_timestamp',
+        'sql': 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_campaign_visits_timestamp '
+               'ON campaign_visits (timestamp)',
+        'reason': 'cv.timestamp > window start filter (and incremental watermark)'
+    },
+    {
+        'table': 'flat_booking_orders',
+        'name': 'idx_flat_booking_orders_dummy_code_created',
+        'sql': 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_flat_booking_orders_dummy_code_created '
+               'ON flat_booking_orders (dummy_order_code, created_at DESC) '
+               "WHERE flat_booking_order_code IS NOT NULL AND flat_booking_order_code <> '-'",
+        'reason': 'DISTINCT ON (dummy_order_code) ... ORDER BY dummy_order_code, created_at DESC sort'
+    },
+    {
+        'table': 'sales_webhook',
+        'name': 'idx_sales_webhook_phone',
+        'sql': 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sales_webhook_phone '
+               'ON sales_webhook (phone)',
+        'reason': "lookup on sw.phone = CONCAT('+91', ub.tenant_phone_number)"
+    }
+]
+
+def explain_export_query(conn):
+    """Run EXPLAIN (ANALYZE, BUFFERS) on the export query and return plan lines"""
+    cursor = conn.cursor()
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {CAMPAIGN_VISITS_QUERY}", {'since': EXPORT_WINDOW_START})
+    plan_lines = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    return plan_lines
+
+def analyse_plan(plan_lines):
+    """
+    Flag sequential scans and sorts in a text EXPLAIN plan.
+    Returns a list of findings: {'type', 'table', 'line', 'detail'}.
+    """
+    findings = []
+    seq_scan_re = re.compile(r'Seq Scan on (?:\w+\.)?(\w+)')
+    sort_node_re = re.compile(r'^(?:Incremental )?Sort\s+\(')
+    
+    for i, line in enumerate(plan_lines):
+        stripped = line.strip()
+        if stripped.startswith('->'):
+            stripped = stripped[2:].strip()
+        
+        match = seq_scan_re.search(stripped)
+        if match:
+            findings.append({
+                'type': 'Seq Scan',
+                'table': match.group(1),
+                'line': stripped,
+                'detail': ''
+            })
+            continue
+        
+        if sort_node_re.match(stripped):
+            # Sort Key / Sort Method are reported on the following lines
+            detail = []
+            for follow in plan_lines[i + 1:i + 4]:
+                follow = follow.strip()
+                if follow.startswith(('Sort Key:', 'Sort Method:')):
+                    detail.append(follow)
+            findings.append({
+                'type': 'Sort',
+                'table': None,
+                'line': stripped,
+                'detail': '; '.join(detail)
+            })
+    
+    return findings
+
+def index_signature(index_sql):
+    """
+    Normalised (table, key list, predicate) of a CREATE INDEX statement, so an
+    index is recognised by what it indexes rather than by its name.
+    Accepts both the statements in INDEX_SUGGESTIONS and pg_get_indexdef()
+    output, which adds quotes, parentheses and ::text casts of its own.
+    """
+    match = re.search(
+        r'\sON\s+(?:ONLY\s+)?(?:"?\w+"?\.)?"?(\w+)"?\s+(?:USING\s+\w+\s*)?(\(.*?\))(?:\s+WHERE\s+(.*))?$',
+        index_sql.strip(), re.S
+    )
+    if not match:
+        return None
+    
+    def normalise(text):
+        text = re.sub(r'[()"]', '', text.lower())
+        return re.sub(r'\s+', ' ', text).replace(' asc', '').strip()
+    
+    table, keys, predicate = match.groups()
+    if predicate:
+        # pg_get_indexdef casts varchar columns and literals in the predicate
+        predicate = re.sub(r'::(text|character varying)', '', normalise(predicate))
+    return table.lower(), normalise(keys), predicate or ''
+
+def get_existing_indexes(conn, tables):
+    """Return {index_signature: index name} for the indexes on the given tables"""
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT index_class.relname, pg_get_indexdef(pg_index.indexrelid)
+        FROM pg_index
+        JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+        JOIN pg_class table_class ON table_class.oid = pg_index.indrelid
+        WHERE table_class.relname = ANY(%s)
+        """,
+        (list(tables),)
+    )
+    existing = {index_signature(indexdef): name for name, indexdef in cursor.fetchall()}
+    cursor.close()
+    return existing
+
+def suggest_indexes(conn, findings):
+    """Propose missing supporting indexes for the tables the plan flagged"""
+    flagged_tables = {f['table'] for f in findings if f['table']}
+    has_sorts = any(f['type'] == 'Sort' for f in findings)
+    
+    candidates = [
+        s for s in INDEX_SUGGESTIONS
+        # Sort nodes carry no table name; the DISTINCT ON sorts are on these
+        if s['table'] in flagged_tables
+        or (has_sorts and s['table'] in ('campaign_visits', 'flat_booking_orders'))
+    ]
+    if not candidates:
+        return []
+    
+    existing = get_existing_indexes(conn, {s['table'] for s in candidates})
+    missing = []
+    for suggestion in candidates:
+        equivalent = existing.get(index_signature(suggestion['sql']))
+        if equivalent:
+            logger.info(f"{suggestion['name']} is already covered by index {equivalent}")
+        else:
+            missing.append(suggestion)
+    return missing
+
+def time_export_query(conn):
+    """Time the export query end to end (execute + fetch), in seconds"""
+    cursor = conn.cursor()
+    start = time.perf_counter()
+    cursor.execute(CAMPAIGN_VISITS_QUERY, {'since': EXPORT_WINDOW_START})
+    cursor.fetchall()
+    elapsed = time.perf_counter() - start
+    cursor.close()
+    return elapsed
+
+def create_indexes(conn, suggestions):
+    """Create the suggested indexes (CONCURRENTLY, so autocommit) and ANALYZE"""
+    previous_autocommit = conn.autocommit
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        cursor = conn.cursor()
+        for suggestion in suggestions:
+            logger.info(f"Creating index {suggestion['name']}...")
+            cursor.execute(suggestion['sql'])
+        for table in sorted({s['table'] for s in suggestions}):
+            cursor.execute(f"ANALYZE {table}")
+        cursor.close()
+    finally:
+        conn.autocommit = previous_autocommit
+
+def run_query_plan_report(conn, apply_indexes=False, plan_file='campaign_visits_explain.txt'):
+    """
+    Capture EXPLAIN (ANALYZE, BUFFERS) for the export query, flag seq scans
+    and sorts, and propose supporting indexes. With apply_indexes=True the
+    indexes are created and the export is timed before and after.
+    """
+    try:
+        logger.info("Capturing EXPLAIN (ANALYZE, BUFFERS) for the export query...")
+        plan_lines = explain_export_query(conn)
+        
+        with open(plan_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(plan_lines) + '\n')
+        logger.info(f"Query plan saved to {plan_file}")
+        
+        findings = analyse_plan(plan_lines)
+        logger.info(f"Plan findings: {len(findings)}")
+        for finding in findings:
+            logger.info(f"  [{finding['type']}] {finding['line']}")
+            if finding['detail']:
+                logger.info(f"      {finding['detail']}")
+        
+        suggestions = suggest_indexes(conn, findings)
+        conn.rollback()
+        if not suggestions:
+            logger.info("No missing supporting indexes to propose")
+            return
+        
+        logger.info("Proposed indexes:")
+        for suggestion in suggestions:
+            logger.info(f"  -- {suggestion['reason']}")
+            logger.info(f"  {suggestion['sql']};")
+        
+        if not apply_indexes:
+            logger.info("Run with --create-indexes to create them and compare timings")
+            return
+        
+        before = time_export_query(conn)
+        logger.info(f"Export query time before indexes: {before:.3f}s")
+        
+        create_indexes(conn, suggestions)
+        
+        after = time_export_query(conn)
+        logger.info(f"Export query time after indexes: {after:.3f}s")
+        if after > 0:
+            logger.info(f"Speedup: {before / after:.1f}x")
+        
+        after_plan_file = plan_file.replace('.txt', '_after.txt')
+        with open(after_plan_file, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(explain_export_query(conn)) + '\n')
+        logger.info(f"Query plan after indexes saved to {after_plan_file}")
+        
+    except Exception as e:
+        logger.error(f"Error inspecting query plan: {e}")
+        raise
+
 def main():
     """Main function"""
     logger.info("="*60)
     logger.info("Campaign Visits Export Script")
     logger.info("="*60)
     
+    # --copy: let PostgreSQL build the CSV and stream it straight to disk
+    copy_mode = '--copy' in sys.argv
+    # --incremental: only export visits newer than the stored watermark
+    incremental_mode = '--incremental' in sys.argv
+    append_mode = '--append' in sys.argv
+    lookback_minutes = WATERMARK_LOOKBACK_MINUTES
+    for arg in sys.argv:
+        if arg.startswith('--lookback-minutes='):
+            lookback_minutes = int(arg.split('=', 1)[1])
+    # --explain: inspect the query plan and propose indexes (--create-indexes applies them)
+    explain_mode = '--explain' in sys.argv
+    create_indexes_mode = '--create-indexes' in sys.argv
+    # --from-attribution: read the table maintained by refresh_campaign_attribution.py
+    query = ATTRIBUTION_EXPORT_QUERY if '--from-attribution' in sys.argv else CAMPAIGN_VISITS_QUERY
+    
     # Connect to database
     conn = None
     try:
         conn = connect_db()
         logger.info("Database connection established")
         
-        # Get data
-        columns, rows = get_campaign_visits_data(conn)
-        
-        if not rows:
-            logger.warning("No data found to export")
+        if explain_mode:
+            run_query_plan_report(conn, apply_indexes=create_indexes_mode)
             return
         
-        # Export to CSV
-        output_file = export_to_csv(columns, rows)
+        if incremental_mode:
+            output_file = run_incremental_export(conn, append=append_mode, lookback_minutes=lookback_minutes)
+        elif copy_mode:
+            output_file, row_count = export_with_copy(conn, query=query)
+            
+            if not row_count:
+                logger.warning("No data found to export")
+        else:
+            # Get data
+            columns, rows = get_campaign_visits_data(conn, query=query)
+            
+            if not rows:
+                logger.warning("No data found to export")
+                return
+            
+            # Export to CSV
+            output_file = export_to_csv(columns, rows)
         
         logger.info("="*60)
         logger.info(f"Export completed successfully!")
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Nearby places crawler for every property
+Reads property coordinates from the properties table (or a properties CSV
+export) and fetches nearby places for all of them concurrently with
+fetch_nearby_places: one search per (property, place type) runs on a
+thread pool that shares a pooled requests session, a global rate limiter
+and an adaptive page-token poller. Results are written to one JSON file
+keyed by property id, with each place reduced to the fields slim_place
+keeps; photo references go to a separate file keyed by place_id.
+
+Searches go through a geohash cell cache (nearby_places_cache.py) so
+neighbouring properties share them and a refresh only fetches cells whose
+cached search is missing or older than the TTL.
+
+Usage:
+    python crawl_nearby_places.py [--property=ID[,ID...]] [--csv=properties_data.csv]
+                                  [--types=hospital,school,...] [--radius=1500]
+                                  [--workers=8] [--rate=10] [--output=FILE] [--photos=FILE]
+                                  [--base-url=URL] [--cache=FILE | --no-cache]
+                                  [--cache-ttl-days=30] [--cache-precision=7]
+                                  [--log=nearby_places_crawl.log]
+
+The API key is read from GOOGLE_MAPS_API_KEY. --base-url points the crawl at
+places_api_stub.py instead of Google. --log= (empty) logs to the console only.
+"""
+
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import psycopg2
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from fetch_nearby_places import (NEARBY_SEARCH_URL, PageTokenPoller, RateLimiter, fetch_nearby_places,
+                                 photo_references, slim_places)
+from nearby_places_cache import (DEFAULT_PRECISION, NearbyPlacesCache, geohash_neighbours,
+                                 haversine_metres, places_within)
+
+# Load environment variables
+load_dotenv('staging.env')
+
+# Handlers are attached in main(), so importing the crawler writes no log file
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLACE_TYPES = ['point_of_interest']
+DEFAULT_RADIUS = 1500
+DEFAULT_OUTPUT = 'nearby_places_by_property.json'
+DEFAULT_PHOTOS = 'nearby_place_photos.json'
+DEFAULT_CACHE = 'nearby_places_cache.db'
+DEFAULT_LOG = 'nearby_places_crawl.log'
+
+def setup_logging(log_file=DEFAULT_LOG):
+    """Log to the console and, unless log_file is empty, to log_file"""
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+def connect_db():
+    """Connect to PostgreSQL database"""
+    try:
+        conn = psycopg2.connect(
+            host=os.getenv('DB_HOST'),
+            database=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            port=os.getenv('DB_PORT', 5432)
+        )
+        logger.info("Database connection established")
+        return conn
+    except Exception as e:
+        logger.error(f"Database connection failed: {e}")
+        raise
+
+def get_property_locations(conn, property_ids=None):
+    """Active properties with coordinates: [{'id', 'name', 'latitude', 'longitude'}]"""
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, name, latitude, longitude
+        FROM properties
+        WHERE latitude IS NOT NULL
+          AND longitude IS NOT NULL
+          AND COALESCE(archived, 0) = 0
+          AND (%s::int[] IS NULL OR id = ANY(%s::int[]))
+        ORDER BY id
+    """, (property_ids, property_ids))
+    rows = cursor.fetchall()
+    cursor.close()
+    return [
+        {'id': row[0], 'name': row[1], 'latitude': float(row[2]), 'longitude': float(row[3])}
+        for row in rows
+    ]
+
+def load_property_locations_csv(path, property_ids=None):
+    """Same as get_property_locations, from a properties table CSV export"""
+    locations = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row.get('latitude') in (None, '', 'NULL') or row.get('longitude') in (None, '', 'NULL'):
+                continue
+            if row.get('archived') not in (None, '', 'NULL', '0'):
+                continue
+            property_id = int(row['id'])
+            if property_ids and property_id not in property_ids:
+                continue
+            locations.append({
+                'id': property_id,
+                'name': row.get('name'),
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude'])
+            })
+    return locations
+
+def make_session(pool_size):
+    """Session whose connection pool is large enough for every worker"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def merge_places(place_lists):
+    """Concatenate place lists, keeping the first occurrence of each place_id"""
+    seen = set()
+    merged = []
+    for places in place_lists:
+        for place in places:
+            if place.get('place_id') in seen:
+                continue
+            seen.add(place.get('place_id'))
+            merged.append(place)
+    return merged
+
+def plan_searches(locations, place_types, radius, cache=None):
+    """
+    Decide which searches to run.
+    Returns (searches, assignments, cached): searches is {key: search params},
+    assignments lists (location, place_type, key) for every (location, type)
+    a search has to serve, and cached is {(property_id, place_type): places}
+    for those already answered by the cache. Without a cache every
+    (location, type) gets its own search; with one, uncovered locations are
+    grouped into per-cell searches, shared with neighbours they cover.
+    """
+    searches = {}
+    assignments = []
+    cached = {}
+
+    for location in locations:
+        lat, lng = location['latitude'], location['longitude']
+        for place_type in place_types:
+            if cache is None:
+                key = (location['id'], place_type)
+                searches[key] = {'lat': lat, 'lng': lng, 'radius': radius, 'place_type': place_type, 'cell': None}
+                assignments.append((location, place_type, key))
+                continue
+
+            places = cache.lookup(lat, lng, radius, place_type)
+            if places is not None:
+                cached[(location['id'], place_type)] = places
+                continue
+
+            cell, center_lat, center_lng, fetch_radius = cache.plan_fetch(lat, lng, radius)
+            key = (cell, place_type)
+            # A search already planned in a neighbouring cell may cover this location
+            for neighbour in geohash_neighbours(cell):
+                search = searches.get((neighbour, place_type))
+                if search and haversine_metres(lat, lng, search['lat'], search['lng']) + radius <= search['radius']:
+                    key = (neighbour, place_type)
+                    break
+            else:
+                searches[key] = {'lat': center_lat, 'lng': center_lng, 'radius': fetch_radius,
+                                 'place_type': place_type, 'cell': cell}
+            assignments.append((location, place_type, key))
+
+    return searches, assignments, cached
+
+def crawl_nearby_places(locations, api_key, place_types=None, radius=DEFAULT_RADIUS,
+                        workers=8, rate=10.0, base_url=NEARBY_SEARCH_URL, cache=None, photos=None):
+    """
+    Fetch nearby places for every location concurrently.
+    Returns ({property_id: {'name', 'latitude', 'longitude', 'places'}}, stats).
+    Places found for several types are kept once per property. With a
+    NearbyPlacesCache only locations no cached cell search covers are
+    fetched, one search per cell. If photos is a dict it is updated with
+    the photo references of every fetched place. A search that raises is
+    logged and counted in stats['failed']; its locations get no places of
+    that type and nothing is cached for it, so the next run retries it.
+    Empty (ZERO_RESULTS) answers are cached like any other.
+    """
+    place_types = place_types or DEFAULT_PLACE_TYPES
+    session = make_session(workers)
+    rate_limiter = RateLimiter(rate, burst=max(1, int(rate)))
+    page_poller = PageTokenPoller()
+
+    searches, assignments, cached = plan_searches(locations, place_types, radius, cache)
+    fetched = {}
+    failed = 0
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='places') as executor:
+        futures = {
+            executor.submit(
+                fetch_nearby_places,
+                search['lat'], search['lng'],
+                radius=search['radius'], place_type=search['place_type'], api_key=api_key,
+                session=session, base_url=base_url,
+                rate_limiter=rate_limiter, page_poller=page_poller
+            ): key
+            for key, search in searches.items()
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            key = futures[future]
+            search = searches[key]
+            try:
+                places = future.result()
+                if photos is not None:
+                    photos.update(photo_references(places))
+                fetched[key] = slim_places(places)
+            except Exception as e:
+                logger.error(f"Search failed at {search['lat']},{search['lng']} ({search['place_type']}): {e}")
+                fetched[key] = []
+                failed += 1
+            else:
+                # Errors raise, so an empty list here is a real ZERO_RESULTS
+                # answer and is cached too; failed searches are never stored
+                if cache and search['cell']:
+                    cache.store(search['cell'], radius, search['place_type'],
+                                search['lat'], search['lng'], search['radius'], fetched[key])
+            if done % 50 == 0 or done == len(searches):
+                logger.info(f"Completed {done}/{len(searches)} searches")
+
+    found = dict(cached)
+    for location, place_type, key in assignments:
+        places = fetched[key]
+        if cache:
+            places = places_within(places, location['latitude'], location['longitude'], radius)
+        found[(location['id'], place_type)] = places
+
+    results = {}
+    for location in locations:
+        results[location['id']] = {
+            'name': location['name'],
+            'latitude': location['latitude'],
+            'longitude': location['longitude'],
+            'places': merge_places(found.get((location['id'], place_type), []) for place_type in place_types)
+        }
+
+    stats = {
+        'locations': len(locations),
+        'searches': len(searches),
+        'failed': failed,
+        'cache_hits': len(cached),
+        'pages': page_poller.stats['pages'],
+        'premature_page_polls': page_poller.stats['premature'],
+        'page_token_delay': round(page_poller.expected_delay, 2),
+        'elapsed_seconds': round(time.monotonic() - start, 2)
+    }
+    session.close()
+    return results, stats
+
+def save_results(results, filename):
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump({str(property_id): entry for property_id, entry in results.items()}, f,
+                  ensure_ascii=False, separators=(',', ':'))
+    logger.info(f"Saved nearby places for {len(results)} properties to {filename}")
+
+def save_photo_references(photos, filename):
+    """Merge new photo references into the file (places served from cache keep theirs)"""
+    merged = {}
+    if os.path.exists(filename):
+        with open(filename, 'r', encoding='utf-8') as f:
+            merged = json.load(f)
+    merged.update(photos)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(merged, f, ensure_ascii=False, separators=(',', ':'))
+    logger.info(f"Saved {len(photos)} new photo references to {filename} ({len(merged)} total)")
+
+def main():
+    property_ids = None
+    csv_path = None
+    place_types = DEFAULT_PLACE_TYPES
+    radius = DEFAULT_RADIUS
+    workers = 8
+    rate = 10.0
+    output = DEFAULT_OUTPUT
+    photos_output = DEFAULT_PHOTOS
+    base_url = NEARBY_SEARCH_URL
+    cache_path = DEFAULT_CACHE
+    cache_ttl_days = 30.0
+    cache_precision = DEFAULT_PRECISION
+    log_file = DEFAULT_LOG
+
+    if '--help' in sys.argv or '-h' in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+
+    for arg in sys.argv[1:]:
+        if arg.startswith('--property='):
+            try:
+                property_ids = [int(p) for p in arg.split('=')[1].split(',') if p.strip()]
+            except ValueError:
+                print(f"Invalid property id list: {arg}")
+                sys.exit(1)
+        elif arg.startswith('--csv='):
+            csv_path = arg.split('=', 1)[1]
+        elif arg.startswith('--types='):
+            place_types = [t.strip() for t in arg.split('=')[1].split(',') if t.strip()]
+        elif arg.startswith('--radius='):
+            radius = int(arg.split('=')[1])
+        elif arg.startswith('--workers='):
+            workers = int(arg.split('=')[1])
+        elif arg.startswith('--rate='):
+            rate = float(arg.split('=')[1])
+        elif arg.startswith('--output='):
+            output = arg.split('=', 1)[1]
+        elif arg.startswith('--photos='):
+            photos_output = arg.split('=', 1)[1]
+        elif arg.startswith('--base-url='):
+            base_url = arg.split('=', 1)[1]
+        elif arg.startswith('--cache='):
+            cache_path = arg.split('=', 1)[1]
+        elif arg == '--no-cache':
+            cache_path = None
+        elif arg.startswith('--cache-ttl-days='):
+            cache_ttl_days = float(arg.split('=')[1])
+        elif arg.startswith('--cache-precision='):
+            cache_precision = int(arg.split('=')[1])
+        elif arg.startswith('--log='):
+            log_file = arg.split('=', 1)[1]
+
+    setup_logging(log_file)
+
+    api_key = os.getenv('GOOGLE_MAPS_API_KEY')
+    if not api_key:
+        logger.error("GOOGLE_MAPS_API_KEY is not set")
+        sys.exit(1)
+
+    if csv_path:
+        locations = load_property_locations_csv(csv_path, property_ids)
+    else:
+        conn = connect_db()
+        try:
+            locations = get_property_locations(conn, property_ids)
+        finally:
+            conn.close()
+
+    if not locations:
+        logger.error("No properties with coordinates found")
+        sys.exit(1)
+
+    logger.info(f"Crawling {len(locations)} properties x {len(place_types)} types "
+                f"(radius {radius}m, {workers} workers, {rate} req/s)")
+    cache = None
+    if cache_path:
+        cache = NearbyPlacesCache(cache_path, ttl_seconds=cache_ttl_days * 24 * 3600, precision=cache_precision)
+        logger.info(f"Using cell cache {cache_path} (precision {cache_precision}, TTL {cache_ttl_days} days)")
+
+    photos = {}
+    try:
+        results, stats = crawl_nearby_places(locations, api_key, place_types, radius, workers=workers,
+                                             rate=rate, base_url=base_url, cache=cache, photos=photos)
+    finally:
+        if cache:
+            cache.close()
+    logger.info(f"Crawl stats: {stats}")
+    if stats['failed']:
+        logger.warning(f"{stats['failed']} searches failed; rerun to fill them in")
+    save_results(results, output)
+    save_photo_references(photos, photos_output)
+
+if __name__ == "__main__":
+    main()
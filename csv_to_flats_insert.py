@@ -147,6 +147,40 @@ def get_csv_to_db_mapping():
         'Flat Rent Next Start Date': 'flat_rent_next_start_date'
     }
 
+# Database columns grouped by how their CSV values are cleaned
+CURRENCY_FIELDS = [
+    'agreement_charges', 'selling_price', 'maintenance_amount',
+    'garbage_amount', 'flat_security_deposit', 'move_out_charges',
+    'agreement_charges_record_charges', 'flat_security_deposit_record_currency',
+    'garbage_amount_record_currency', 'renewal_rate', 'exchange_rate'
+]
+
+DATE_FIELDS = [
+    'added_date', 'modified_date', 'current_move_in_date',
+    'current_check_out_date', 'catalogue_price_last_updates_date',
+    'available_date_for_next_booking', 'created_time', 'flat_rent_next_start_date',
+    'next_move_in_date', 'unsubsribed_time'
+]
+
+INTEGER_FIELDS = ['floor_number', 'no_of_bathrooms', 'booking_2_contarct_days']
+
+ENUM_FIELDS = [
+    'flat_facing', 'flat_booking_hold_status', 'flat_available_rent_status',
+    'track_inventory', 'email_opt_out', 'reserved_car_parking_available'
+]
+
+def get_field_type(db_column):
+    """Return the clean_data_value field type used for a database column"""
+    if db_column in CURRENCY_FIELDS:
+        return 'numeric'
+    if db_column in DATE_FIELDS:
+        return 'date'
+    if db_column in INTEGER_FIELDS:
+        return 'integer'
+    if db_column in ENUM_FIELDS:
+        return 'enum'
+    return 'text'
+
 def handle_duplicate_columns(headers):
     """
     Handle duplicate column names by creating unique identifiers.
@@ -503,36 +537,15 @@ def process_csv_file(csv_file_path):
                         raw_value = row[csv_position]
                         
                         # Apply data type specific cleaning
-                        if col in ['agreement_charges', 'selling_price', 'maintenance_amount', 
-                                 'garbage_amount', 'flat_security_deposit', 'move_out_charges',
-                                 'agreement_charges_record_charges', 'flat_security_deposit_record_currency',
-                                 'garbage_amount_record_currency', 'renewal_rate', 'exchange_rate']:
+                        field_type = get_field_type(col)
+                        if field_type == 'numeric':
                             # Debug currency cleaning for first few rows
                             if rows_processed < 3 and raw_value and '₹' in str(raw_value):
                                 logger.info(f"Currency cleaning - Column: {col}, Original: '{raw_value}' -> Cleaned: '{clean_currency_value(raw_value)}'")
-                            cleaned_value = clean_data_value(raw_value, 'numeric', col)
-                        elif col in ['added_date', 'modified_date', 'current_move_in_date',
-                                   'current_check_out_date', 'catalogue_price_last_updates_date',
-                                   'available_date_for_next_booking', 'created_time', 'flat_rent_next_start_date',
-                                   'next_move_in_date', 'unsubsribed_time']:
-                            cleaned_value = clean_data_value(raw_value, 'date', col)
-                        elif col in ['floor_number', 'no_of_bathrooms', 'booking_2_contarct_days']:
-                            cleaned_value = clean_data_value(raw_value, 'integer', col)
-                        elif col in ['flat_facing', 'flat_booking_hold_status', 'flat_available_rent_status',
-                                   'track_inventory', 'email_opt_out', 'reserved_car_parking_available']:
+                        elif col == 'reserved_car_parking_available' and rows_processed < 5:
                             # Debug parking field
-                            if col == 'reserved_car_parking_available' and rows_processed < 5:
-                                logger.info(f"Processing {col}: raw_value='{raw_value}' -> cleaned='{clean_data_value(raw_value, 'enum', col)}'")
-                            cleaned_value = clean_data_value(raw_value, 'enum', col)
-                        elif col in ['created_by', 'currency', 'flat_category', 'flat_master_owner',
-                                   'validatortag', 'record_id', 'property_unique_id', 'max_occupancy',
-                                   'block_name', 'cluster_name', 'care_taker_master', 'cir_tracker',
-                                   'electricity_meter_number', 'flat_next_booking_status', 'flat_video',
-                                   'update_status', 'sample_contract_link', 'parking_queue', 'modified_by',
-                                   'property_master', 'current_tenant_id', 'next_booking_id']:
-                            cleaned_value = clean_data_value(raw_value, 'text', col)
-                        else:
-                            cleaned_value = clean_data_value(raw_value, 'text', col)
+                            logger.info(f"Processing {col}: raw_value='{raw_value}' -> cleaned='{clean_data_value(raw_value, 'enum', col)}'")
+                        cleaned_value = clean_data_value(raw_value, field_type, col)
                         
                         values.append(cleaned_value)
                     else:
@@ -1,11 +1,42 @@
 import csv
+import io
 import json
 import re
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
 from datetime import datetime
 import os
 
+# Column types are read from the live table once per run
+COLUMN_INFO_QUERY = """
+    SELECT column_name, data_type, character_maximum_length
+    FROM information_schema.columns
+    WHERE table_schema = %s AND table_name = %s
+    ORDER BY ordinal_position
+"""
+
+# Value ranges of the PostgreSQL integer types
+INTEGER_RANGES = {
+    'smallint': (-2**15, 2**15 - 1),
+    'integer': (-2**31, 2**31 - 1),
+    'bigint': (-2**63, 2**63 - 1)
+}
+
+DATE_TYPES = ('date', 'timestamp without time zone', 'timestamp with time zone')
+
+# Types whose character_maximum_length makes longer strings fail
+LENGTH_LIMITED_TYPES = ('character varying', 'character')
+
+# Date/timestamp strings the date converter passes through and PostgreSQL
+# still accepts, e.g. '2025-09-02 07:08:39.309031+00'
+ISO_DATETIME = re.compile(r'^\d{4}-\d{2}-\d{2}([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}(:?\d{2})?)?$')
+
+# COPY text format escapes
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+# Converter plans per (schema, table), built on first use
+_converter_plans = {}
+
 def fix_json_format(value):
     """Fix malformed JSON strings like {savedName: file.webp} to proper JSON"""
     if not value or value.strip() == '':
@@ -35,254 +66,209 @@ def fix_json_format(value):
     
     return json.dumps(value) if value else None
 
-def convert_value(value, column_name, data_type):
-    """Convert CSV string values to appropriate Python types"""
-    if value is None or value.strip() == '':
+def to_boolean(value):
+    return value.lower() in ('true', 't', '1', 'yes', 'y')
+
+def to_number(value):
+    try:
+        return float(value) if '.' in value else int(value)
+    except ValueError:
         return None
-    
-    value = value.strip()
-    
-    # Handle specific enum columns
-    if column_name == 'booking_lock_status':
-        # Always return 'available' regardless of CSV value
-        return 'available'
-    
-    # Handle columns with length restrictions
-    if column_name == 'reserved_car_parking_available':
-        # This field is VARCHAR(3), so truncate or use default
-        if value and value.strip().upper() in ['YES', 'Y', 'TRUE', '1']:
-            return 'YES'
-        else:
-            return 'NO'  # Default value
-    
-    # Handle JSON/JSONB columns
-    if 'json' in data_type.lower():
-        return fix_json_format(value)
-    
-    # Handle boolean columns
-    if data_type.lower() == 'boolean':
-        return value.lower() in ('true', 't', '1', 'yes', 'y')
-    
-    # Handle numeric types
-    if 'numeric' in data_type.lower() or 'decimal' in data_type.lower():
+
+def to_integer(value):
+    try:
+        return int(float(value))  # Handle cases like "1.0"
+    except (ValueError, OverflowError):
+        return None
+
+def to_date(value):
+    if value.lower() == 'null':
+        return None
+    # Try different date formats
+    for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y']:
         try:
-            return float(value) if '.' in value else int(value)
-        except:
-            return None
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return value  # Return as string if can't parse
+
+def to_text(value):
+    return value
+
+def to_yes_no(value):
+    # reserved_car_parking_available is VARCHAR(3), so map to YES/NO
+    return 'YES' if value.upper() in ['YES', 'Y', 'TRUE', '1'] else 'NO'
+
+TYPE_CONVERTERS = {
+    'json': fix_json_format,
+    'jsonb': fix_json_format,
+    'boolean': to_boolean,
+    'numeric': to_number,
+    'real': to_number,
+    'double precision': to_number,
+    'smallint': to_integer,
+    'integer': to_integer,
+    'bigint': to_integer,
+    'date': to_date,
+    'timestamp without time zone': to_date,
+    'timestamp with time zone': to_date
+}
+
+# Columns whose values are rewritten regardless of the CSV
+COLUMN_CONVERTERS = {
+    'booking_lock_status': lambda value: 'available',  # Always 'available'
+    'reserved_car_parking_available': to_yes_no
+}
+
+def build_converter(column_name, data_type, max_length=None):
+    """
+    Converter for one column: CSV string -> value for COPY
+    Type dispatch happens here once, so converting a cell is a single call.
+    """
+    convert_typed = COLUMN_CONVERTERS.get(column_name) or TYPE_CONVERTERS.get(data_type, to_text)
     
-    # Handle integer types
-    if any(int_type in data_type.lower() for int_type in ['integer', 'bigint', 'smallint']):
-        try:
-            return int(float(value))  # Handle cases like "1.0"
-        except:
-            return None
+    if max_length and data_type in LENGTH_LIMITED_TYPES and convert_typed is to_text:
+        # Truncate to the declared length instead of failing the row
+        convert_typed = lambda value: value[:max_length]
     
-    # Handle date/timestamp columns
-    if 'date' in data_type.lower() or 'timestamp' in data_type.lower():
-        if value.lower() in ['null', '']:
+    def convert(value):
+        if value is None:
             return None
-        try:
-            # Try different date formats
-            for fmt in ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y']:
-                try:
-                    return datetime.strptime(value, fmt)
-                except:
-                    continue
-            return value  # Return as string if can't parse
-        except:
+        value = value.strip()
+        if not value:
             return None
+        return convert_typed(value)
     
-    # Handle general varchar length limits
-    if 'varchar' in data_type.lower() or 'character varying' in data_type.lower():
-        # Truncate very long strings to prevent errors
-        if len(value) > 255:  # General safety limit
-            value = value[:255]
+    return convert
+
+def build_validator(data_type):
+    """
+    Validator for one column: converted value -> reason string for values
+    that would make COPY fail, else None.
+    """
+    integer_range = INTEGER_RANGES.get(data_type)
+    is_date = data_type in DATE_TYPES
     
-    # Default: return as string
-    return value
+    def validate(value):
+        if isinstance(value, str):
+            if '\x00' in value:
+                return 'contains a NUL character'
+            if is_date and not ISO_DATETIME.match(value):
+                return f'unrecognised {data_type} {value!r}'
+        elif integer_range and isinstance(value, int) and not integer_range[0] <= value <= integer_range[1]:
+            return f'{value} is out of range for {data_type}'
+        return None
+    
+    return validate
+
+def build_converter_plan(column_info):
+    """
+    Converter plan for a table
+    
+    Args:
+        column_info (dict): column name -> (data_type, character_maximum_length),
+            as returned by fetch_column_info
+    
+    Returns:
+        dict: column name -> {'data_type', 'max_length', 'convert', 'validate'}
+    """
+    return {
+        column_name: {
+            'data_type': data_type,
+            'max_length': max_length,
+            'convert': build_converter(column_name, data_type, max_length),
+            'validate': build_validator(data_type)
+        }
+        for column_name, (data_type, max_length) in column_info.items()
+    }
 
-def get_column_info():
-    """Define column data types for temp_flats table"""
+def fetch_column_info(cursor, table_name='temp_flats', schema='public'):
+    """Column types of a table from information_schema.columns"""
+    cursor.execute(COLUMN_INFO_QUERY, (schema, table_name))
     return {
-        'id': 'bigint',
-        'seller_id': 'bigint',
-        'product_type_id': 'bigint',
-        'flat_type': 'varchar',
-        'flat_number': 'varchar',
-        'name': 'varchar',
-        'slug': 'varchar',
-        'code': 'varchar',
-        'route_id': 'bigint',
-        'description': 'text',
-        'featured_image': 'jsonb',
-        'images': 'jsonb',
-        'videos': 'text',
-        'youtube_link': 'jsonb',
-        'product_tags': 'text',
-        'category': 'varchar',
-        'price_with_tax': 'numeric',
-        'price_setting': 'smallint',
-        'selling_price': 'numeric',
-        'original_price': 'numeric',
-        'discount': 'numeric',
-        'sku': 'varchar',
-        'zoho_unique_id': 'varchar',
-        'zoho_record_id': 'varchar',
-        'barcode': 'varchar',
-        'quantity': 'integer',
-        'track_inventory': 'smallint',
-        'allow_purchase': 'smallint',
-        'low_stock_notification': 'smallint',
-        'quantity_per_user': 'integer',
-        'weight': 'numeric',
-        'weight_type': 'smallint',
-        'dim_length': 'numeric',
-        'dim_width': 'numeric',
-        'dim_height': 'numeric',
-        'dim_type': 'smallint',
-        'brand': 'bigint',
-        'publish_now': 'smallint',
-        'publish_date': 'timestamp',
-        'meta_title': 'varchar',
-        'meta_keywords': 'text',
-        'meta_description': 'text',
-        'meta_url': 'varchar',
-        'meta_image': 'varchar',
-        'status': 'smallint',
-        'digital': 'smallint',
-        'shipping': 'smallint',
-        'selected_packaging': 'bigint',
-        'tax': 'smallint',
-        'gst_id': 'bigint',
-        'tax_type': 'smallint',
-        'goods_or_service': 'smallint',
-        'hsn_sac_code': 'varchar',
-        'tax_rate': 'numeric',
-        'price_included_tax': 'smallint',
-        'informations_for_custom_app': 'text',
-        'gift_wrap_id': 'bigint',
-        'gift_wrap_details': 'text',
-        'gift_wrap_settings': 'smallint',
-        'gift_wrap_allowed': 'smallint',
-        'gift_wrap_price': 'numeric',
-        'gift_wrap_price_included_tax': 'smallint',
-        'gift_wrap_gst_type': 'smallint',
-        'gift_wrap_hsn_sac_code': 'varchar',
-        'gift_wrap_gst_id': 'bigint',
-        'size_chart': 'text',
-        'archived': 'smallint',
-        'advance_booking_amount': 'numeric',
-        'minimum_deposit': 'numeric',
-        'flat_available_status': 'smallint',
-        'available_date_for_next_booking': 'date',
-        'flat_next_booking_status': 'varchar',
-        'flat_available_rent_status': 'smallint',
-        'flat_booking_hold_status': 'smallint',
-        'buffer_days_for_booking': 'integer',
-        'type': 'smallint',
-        'floor_number': 'integer',
-        'no_of_balconies': 'integer',
-        'no_of_bathrooms': 'integer',
-        'flat_facing': 'smallint',
-        'added_date': 'timestamp',
-        'modified_date': 'timestamp',
-        'added_by': 'bigint',
-        'modified_by': 'varchar',
-        'added_by_name': 'varchar',
-        'modified_by_name': 'varchar',
-        'added_ip': 'varchar',
-        'modified_ip': 'varchar',
-        'sort_order': 'integer',
-        'total_views': 'integer',
-        'maintenance_included': 'smallint',
-        'maintenance_amount': 'numeric',
-        'garbage_included': 'smallint',
-        'garbage_amount': 'numeric',
-        'car_parking_allowed': 'smallint',
-        'car_parking_included': 'smallint',
-        'car_parking_amount': 'numeric',
-        'move_out_included': 'smallint',
-        'move_out_charges': 'numeric',
-        'agreement_charges': 'numeric',
-        'terms_conditions': 'text',
-        'built_up_area': 'varchar',
-        'super_built_area': 'varchar',
-        'max_occupancy': 'varchar',
-        'furnishing_type': 'smallint',
-        'inside_the_flat_description': 'text',
-        'landlord_name': 'varchar',
-        'landlord_mailing_street': 'text',
-        'landlord_mailing_city': 'varchar',
-        'landlord_mailing_state': 'varchar',
-        'landlord_mailing_zip': 'varchar',
-        'landlord_mailing_country': 'varchar',
-        'flat_mailing_street': 'text',
-        'flat_mailing_city': 'varchar',
-        'flat_mailing_state': 'varchar',
-        'flat_mailing_zip': 'varchar',
-        'flat_mailing_country': 'varchar',
-        'renewal_rate': 'varchar',
-        'webp_conversion': 'smallint',
-        'balcony_id': 'bigint',
-        'balcony_type': 'varchar',
-        'total_available_parking_slots': 'integer',
-        'map_description': 'text',
-        'category_slug': 'varchar',
-        'user_friendly_url': 'varchar',
-        'property_id': 'integer',
-        'gift_wrap_hsnsac_code': 'varchar',
-        'block_name': 'varchar',
-        'booking_2_contarct_days': 'integer',
-        'care_taker_master': 'varchar',
-        'catalogue_price_last_updates_date': 'date',
-        'cir_tracker': 'varchar',
-        'cluster_name': 'varchar',
-        'created_by': 'varchar',
-        'created_time': 'timestamp',
-        'currency': 'varchar',
-        'current_move_in_date': 'date',
-        'current_check_out_date': 'date',
-        'current_tenant_id': 'integer',
-        'electricity_meter_number': 'varchar',
-        'email_opt_out': 'boolean',
-        'exchange_rate': 'integer',
-        'flat_category': 'varchar',
-        'flat_master_owner': 'varchar',
-        'flat_rent_next_start_date': 'varchar',
-        'flat_security_deposit': 'bigint',
-        'agreement_charges_record_charges': 'bigint',
-        'flat_security_deposit_record_currency': 'bigint',
-        'flat_video': 'varchar',
-        'flat_unique_id': 'varchar',
-        'garbage_amount_record_currency': 'integer',
-        'last_activity_time': 'timestamp',
-        'website_flat_url': 'varchar',
-        'validatortag': 'varchar',
-        'update_status': 'varchar',
-        'unsubsribed_time': 'timestamp',
-        'unsubsribed_mode': 'varchar',
-        'sample_contract_link': 'varchar',
-        'reserved_car_parking_available': 'varchar',
-        'record_id': 'varchar',
-        'property_unique_id': 'varchar',
-        'property_master': 'varchar',
-        'parking_queue': 'boolean',
-        'next_move_in_date': 'timestamp',
-        'next_booking_id': 'varchar',
-        'wifi_id': 'varchar',
-        'wifi_password': 'varchar',
-        'flat_occupancy_status': 'varchar',
-        'booking_lock_status': 'varchar',
-        'current_lock_id': 'varchar'
+        column_name: (data_type, max_length)
+        for column_name, data_type, max_length in cursor.fetchall()
     }
 
-def insert_csv_to_temp_flats(csv_file_path, db_config):
+def get_converter_plan(cursor, table_name='temp_flats', schema='public'):
+    """Converter plan for a table, introspected on first use and cached"""
+    key = (schema, table_name)
+    if key not in _converter_plans:
+        column_info = fetch_column_info(cursor, table_name, schema)
+        if not column_info:
+            raise ValueError(f"Table {schema}.{table_name} not found or has no columns")
+        _converter_plans[key] = build_converter_plan(column_info)
+    return _converter_plans[key]
+
+def format_copy_value(value):
+    """Render a converted value as a COPY text-format field"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value).translate(COPY_ESCAPES)
+
+def build_copy_stream(csv_reader, columns, plan, reject_writer=None):
+    """
+    Pre-validation pass over the CSV.
+    Converts the given columns of every row with the converter plan and
+    writes them to an in-memory tab-separated COPY stream; rows that COPY
+    would reject (wrong field count, out-of-range integers, unparseable
+    dates, NUL characters) go to reject_writer with their line number and
+    reason instead.
+    Returns (stream positioned at the start, rows accepted, rows rejected).
+    """
+    stream = io.StringIO()
+    accepted = 0
+    rejected = 0
+    steps = [(col, plan[col]['convert'], plan[col]['validate']) for col in columns]
+    
+    for row_num, row in enumerate(csv_reader, start=2):  # Start from 2 (accounting for header)
+        if None in row or None in row.values():
+            reason = 'wrong number of fields'
+        else:
+            reason = None
+            fields = []
+            for col, convert, validate in steps:
+                value = convert(row[col])
+                reason = validate(value)
+                if reason:
+                    reason = f'{col}: {reason}'
+                    break
+                fields.append(format_copy_value(value))
+        
+        if reason:
+            rejected += 1
+            if reject_writer:
+                reject_writer.writerow({**{k: v for k, v in row.items() if k is not None},
+                                        '_row_number': row_num, '_reject_reason': reason})
+            continue
+        
+        stream.write('\t'.join(fields))
+        stream.write('\n')
+        accepted += 1
+    
+    stream.seek(0)
+    return stream, accepted, rejected
+
+def insert_csv_to_temp_flats(csv_file_path, db_config, reject_file_path=None):
     """
-    Read CSV file and insert data into temp_flats table
+    Read CSV file and load it into the temp_flats table with one COPY
+    
+    Column types come from information_schema (get_converter_plan), so
+    schema changes to temp_flats are picked up without editing this script.
+    Rows are converted and validated locally first (build_copy_stream);
+    rows PostgreSQL would refuse are written to the reject file instead of
+    failing the load. TRUNCATE and COPY run in one transaction, so a failed
+    load leaves the previous contents of temp_flats in place.
     
     Args:
         csv_file_path (str): Path to the CSV file
         db_config (dict): Database connection configuration
+        reject_file_path (str): Where rejected rows are written
+            (default: <csv name>.rejects.csv next to the CSV)
     """
     
     # Check if CSV file exists
@@ -290,89 +276,71 @@ def insert_csv_to_temp_flats(csv_file_path, db_config):
         print(f"Error: CSV file '{csv_file_path}' not found!")
         return False
     
-    column_types = get_column_info()
+    reject_file_path = reject_file_path or os.path.splitext(csv_file_path)[0] + '.rejects.csv'
     
+    conn = None
     try:
         # Connect to PostgreSQL
         print("Connecting to database...")
         conn = psycopg2.connect(**db_config)
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Clear existing data in temp_flats (optional)
-        print("Clearing existing data in temp_flats...")
-        cur.execute("TRUNCATE TABLE public.temp_flats RESTART IDENTITY;")
-        
-        # Read CSV file
-        print(f"Reading CSV file: {csv_file_path}")
-        with open(csv_file_path, 'r', encoding='utf-8') as file:
-            csv_reader = csv.DictReader(file)
+        with conn.cursor() as cur:
+            plan = get_converter_plan(cur, 'temp_flats')
+            print(f"Found {len(plan)} columns in temp_flats")
             
-            # Get column names from CSV
-            csv_columns = csv_reader.fieldnames
-            print(f"Found {len(csv_columns)} columns in CSV")
+            # Read and validate the CSV file before changing any data
+            print(f"Reading CSV file: {csv_file_path}")
+            with open(csv_file_path, 'r', encoding='utf-8', newline='') as file, \
+                 open(reject_file_path, 'w', encoding='utf-8', newline='') as reject_file:
+                csv_reader = csv.DictReader(file)
+                
+                # Get column names from CSV
+                csv_columns = csv_reader.fieldnames
+                print(f"Found {len(csv_columns)} columns in CSV")
+                
+                valid_columns = [col for col in csv_columns if col in plan]
+                print(f"Valid columns for insertion: {len(valid_columns)}")
+                
+                reject_writer = csv.DictWriter(reject_file, fieldnames=list(csv_columns) + ['_row_number', '_reject_reason'])
+                reject_writer.writeheader()
+                stream, accepted, rejected = build_copy_stream(csv_reader, valid_columns, plan, reject_writer)
             
-            # Prepare INSERT statement
-            valid_columns = [col for col in csv_columns if col in column_types]
-            print(f"Valid columns for insertion: {len(valid_columns)}")
+            if rejected:
+                print(f"Rejected {rejected} rows; see {reject_file_path}")
+            else:
+                os.remove(reject_file_path)
             
-            placeholders = ', '.join(['%s'] * len(valid_columns))
-            columns_str = ', '.join(valid_columns)
+            copy_query = sql.SQL("COPY public.temp_flats ({columns}) FROM STDIN").format(
+                columns=sql.SQL(', ').join(sql.Identifier(col) for col in valid_columns)
+            )
             
-            insert_query = f"""
-                INSERT INTO public.temp_flats ({columns_str}) 
-                VALUES ({placeholders})
-            """
-            
-            # Process and insert rows
-            successful_inserts = 0
-            failed_inserts = 0
-            
-            for row_num, row in enumerate(csv_reader, start=2):  # Start from 2 (accounting for header)
-                try:
-                    # Convert values according to their data types
-                    values = []
-                    for col in valid_columns:
-                        raw_value = row.get(col, '')
-                        converted_value = convert_value(raw_value, col, column_types[col])
-                        values.append(converted_value)
-                    
-                    # Execute insert
-                    cur.execute(insert_query, values)
-                    successful_inserts += 1
-                    
-                    if successful_inserts % 100 == 0:
-                        print(f"Inserted {successful_inserts} rows...")
-                        
-                except Exception as e:
-                    failed_inserts += 1
-                    print(f"Error inserting row {row_num}: {str(e)}")
-                    if failed_inserts <= 5:  # Show first 5 errors
-                        print(f"Problematic row data: {dict(row)}")
-                    
-                    # Continue with next row instead of failing completely
-                    continue
-            
-            # Commit the transaction
-            conn.commit()
-            
-            print(f"\n=== Import Summary ===")
-            print(f"Total rows processed: {successful_inserts + failed_inserts}")
-            print(f"Successful inserts: {successful_inserts}")
-            print(f"Failed inserts: {failed_inserts}")
-            print(f"Success rate: {(successful_inserts/(successful_inserts + failed_inserts))*100:.2f}%")
-            
-            return True
+            # Clear existing data in temp_flats
+            print("Clearing existing data in temp_flats...")
+            cur.execute("TRUNCATE TABLE public.temp_flats RESTART IDENTITY;")
             
+            print(f"Loading {accepted} rows with COPY...")
+            cur.copy_expert(copy_query.as_string(conn), stream)
+            loaded = cur.rowcount
+        
+        # Commit the transaction
+        conn.commit()
+        
+        print(f"\n=== Import Summary ===")
+        print(f"Total rows processed: {accepted + rejected}")
+        print(f"Successful inserts: {loaded}")
+        print(f"Rejected rows: {rejected}")
+        if accepted + rejected:
+            print(f"Success rate: {(loaded/(accepted + rejected))*100:.2f}%")
+        
+        return True
+        
     except Exception as e:
         print(f"Database error: {str(e)}")
-        if 'conn' in locals():
+        if conn:
             conn.rollback()
         return False
         
     finally:
-        if 'cur' in locals():
-            cur.close()
-        if 'conn' in locals():
+        if conn:
             conn.close()
 
 def main():
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Parsed Workbook Cache
+Caches parsed Excel sheets next to the workbook so repeat runs of the
+Excel-driven scripts skip openpyxl's XML parsing.
+
+Each cache entry is keyed by the workbook's content hash, the sheet name and
+the read_excel options, so editing the workbook (or reading it differently)
+transparently produces a fresh entry. Entries live in a .excel_cache/
+directory beside the workbook.
+
+Entries are stored as pandas pickles rather than Parquet/Feather: the flat
+master sheets have mixed-type object columns (numbers, dates and text in the
+same column) that Arrow either rejects or round-trips with NaN turned into
+None, and the comparison scripts depend on the exact frame read_excel gives.
+
+Set EXCEL_CACHE_DISABLED=1 to always read the workbook directly.
+"""
+
+import os
+import glob
+import json
+import hashlib
+import logging
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR_NAME = '.excel_cache'
+
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    """Content hash of a file"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def short_hash(value):
+    """16-hex-digit digest of a JSON-serialisable value"""
+    source = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+
+def get_cache_path(excel_file_path, sheet_name, read_kwargs):
+    """
+    Cache file path for a workbook sheet read with the given options:
+    <workbook>.<sheet>.<options hash>.<file signature>.pkl
+    The options hash stays in the prefix so a workbook version change only
+    replaces entries read with the same options.
+    """
+    options_key = short_hash({'sheet_name': sheet_name, 'read_kwargs': read_kwargs})
+    file_key = short_hash({'file_hash': file_sha256(excel_file_path), 'pandas': pd.__version__})
+
+    cache_dir = os.path.join(os.path.dirname(os.path.abspath(excel_file_path)), CACHE_DIR_NAME)
+    base_name = os.path.basename(excel_file_path)
+    sheet_slug = ''.join(c if c.isalnum() else '_' for c in str(sheet_name))
+    return os.path.join(cache_dir, f"{base_name}.{sheet_slug}.{options_key}.{file_key}.pkl")
+
+def read_excel_cached(excel_file_path, sheet_name=0, **read_kwargs):
+    """
+    Drop-in replacement for pd.read_excel(excel_file_path, sheet_name, **read_kwargs)
+    that serves the parsed sheet from the cache when the workbook is unchanged.
+    """
+    if os.getenv('EXCEL_CACHE_DISABLED') == '1':
+        return pd.read_excel(excel_file_path, sheet_name=sheet_name, **read_kwargs)
+
+    cache_path = get_cache_path(excel_file_path, sheet_name, read_kwargs)
+
+    if os.path.exists(cache_path):
+        try:
+            df = pd.read_pickle(cache_path)
+            logger.info(f"Loaded {os.path.basename(excel_file_path)} [{sheet_name}] from cache")
+            return df
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Excel cache {cache_path}: {e}")
+
+    df = pd.read_excel(excel_file_path, sheet_name=sheet_name, **read_kwargs)
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        # Keep one entry per workbook sheet and options: drop ones from older
+        # versions of the workbook (only the file signature part differs)
+        prefix = cache_path.rsplit('.', 2)[0]
+        for stale_path in glob.glob(glob.escape(prefix) + '.*.pkl'):
+            os.remove(stale_path)
+
+        tmp_path = f"{cache_path}.tmp"
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except Exception as e:
+        logger.warning(f"Could not write Excel cache {cache_path}: {e}")
+
+    return df
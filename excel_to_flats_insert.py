@@ -13,6 +13,8 @@ from datetime import datetime
 import logging
 import re
 
+from excel_cache import read_excel_cached
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -267,7 +269,7 @@ def process_excel_file(excel_file_path):
     try:
         # Read Excel file
         logger.info(f"Reading Excel file: {excel_file_path}")
-        df = pd.read_excel(excel_file_path, skiprows=6)  # Skip first 6 rows like in your CSV script
+        df = read_excel_cached(excel_file_path, skiprows=6)  # Skip first 6 rows like in your CSV script
         
         logger.info(f"Found {len(df)} rows and {len(df.columns)} columns")
         logger.info(f"Columns: {list(df.columns)[:10]}")  # Show first 10 columns
@@ -14,6 +14,8 @@ from dotenv import load_dotenv
 import logging
 import re
 
+from excel_cache import read_excel_cached
+
 # Configure logging first
 logging.basicConfig(
     level=logging.INFO, 
@@ -228,7 +230,7 @@ def read_excel_file(excel_file_path, sheet_name="Active Tenant"):
         
         # Try openpyxl engine first
         try:
-            df = pd.read_excel(excel_file_path, sheet_name=sheet_name, engine='openpyxl')
+            df = read_excel_cached(excel_file_path, sheet_name=sheet_name, engine='openpyxl')
             logger.info(f"Successfully read Excel file sheet '{sheet_name}' with openpyxl engine")
         except Exception as e:
             logger.warning(f"Failed to read with openpyxl: {e}")
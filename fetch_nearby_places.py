@@ -1,6 +1,98 @@
 import requests
 import json
-from typing import List, Dict, Optional
+import threading
+import time
+from typing import Callable, List, Dict, Optional
+
+NEARBY_SEARCH_URL = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+
+# Statuses worth retrying after a pause; anything else but OK/ZERO_RESULTS is final
+RETRYABLE_STATUSES = ("OVER_QUERY_LIMIT", "UNKNOWN_ERROR")
+
+
+class PlacesAPIError(Exception):
+    """A Nearby Search (or one of its pages) came back with an error status"""
+
+    def __init__(self, status: str, message: str):
+        super().__init__(f"{status} - {message}")
+        self.status = status
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread of a crawl
+    acquire() blocks until a request may be sent, keeping the overall rate at
+    or below rate_per_second with bursts of at most `burst` requests.
+    """
+    
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self.rate = rate_per_second
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class PageTokenPoller:
+    """
+    Adaptive wait for next_page_token
+    A page token only becomes valid a short, variable time after it is issued
+    and using it earlier returns INVALID_REQUEST. Instead of a fixed 2s sleep,
+    the first try waits for the typical readiness time seen so far (a moving
+    average shared across threads), then retries at short, growing intervals
+    until max_wait.
+    """
+    
+    def __init__(self, initial_delay: float = 1.0, retry_delay: float = 0.25,
+                 backoff: float = 1.5, max_wait: float = 10.0, smoothing: float = 0.3):
+        self.expected_delay = initial_delay
+        self.retry_delay = retry_delay
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.smoothing = smoothing
+        self.lock = threading.Lock()
+        self.stats = {"pages": 0, "premature": 0}
+    
+    def _record(self, waited: float, premature: int):
+        with self.lock:
+            self.stats["pages"] += 1
+            self.stats["premature"] += premature
+            self.expected_delay += self.smoothing * (waited - self.expected_delay)
+    
+    def fetch(self, get_page: Callable[[str], Dict], page_token: str) -> Dict:
+        """Call get_page(page_token) once the token is valid; returns its response"""
+        start = time.monotonic()
+        with self.lock:
+            delay = self.expected_delay
+        retry_delay = self.retry_delay
+        premature = 0
+        
+        while True:
+            time.sleep(max(0.0, delay))
+            data = get_page(page_token)
+            waited = time.monotonic() - start
+            if data.get("status") != "INVALID_REQUEST":
+                if data.get("status") == "OK":
+                    self._record(waited, premature)
+                return data
+            
+            premature += 1
+            if waited + retry_delay > self.max_wait:
+                return data
+            delay = retry_delay
+            retry_delay *= self.backoff
 
 
 def fetch_nearby_places(
@@ -8,7 +100,13 @@ def fetch_nearby_places(
     longitude: float,
     radius: int = 1500,
     place_type: str = "point_of_interest",
-    api_key: str = None
+    api_key: str = None,
+    session: Optional[requests.Session] = None,
+    base_url: str = NEARBY_SEARCH_URL,
+    rate_limiter: Optional[RateLimiter] = None,
+    page_poller: Optional[PageTokenPoller] = None,
+    timeout: float = 10,
+    max_retries: int = 3
 ) -> List[Dict]:
     """
     Fetch nearby places from Google Maps Places API
@@ -19,12 +117,35 @@ def fetch_nearby_places(
         radius: Search radius in meters (default: 1500)
         place_type: Type of place to search for (default: point_of_interest)
         api_key: Google Maps API key
+        session: Shared requests session (connection reuse across calls)
+        base_url: Nearby Search endpoint (point at places_api_stub.py for tests)
+        rate_limiter: Shared RateLimiter every request waits on
+        page_poller: Shared PageTokenPoller for next_page_token pages
+        timeout: Per-request timeout in seconds
+        max_retries: Retries for OVER_QUERY_LIMIT/UNKNOWN_ERROR responses
     
     Returns:
-        List of places formatted for database storage
+        List of places formatted for database storage; empty only when the
+        API answered ZERO_RESULTS
+
+    Raises:
+        PlacesAPIError: Any other non-OK status, for the search or a later page
+        requests.exceptions.RequestException: Transport or HTTP errors
     """
     
-    base_url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+    session = session or requests.Session()
+    page_poller = page_poller or PageTokenPoller()
+    
+    def get(params):
+        for attempt in range(max_retries + 1):
+            if rate_limiter:
+                rate_limiter.acquire()
+            response = session.get(base_url, params=params, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+            if data.get("status") not in RETRYABLE_STATUSES or attempt == max_retries:
+                return data
+            time.sleep(min(2 ** attempt, 10))
     
     params = {
         "location": f"{latitude},{longitude}",
@@ -34,43 +155,35 @@ def fetch_nearby_places(
     }
     
     all_results = []
-    
-    try:
-        # Initial request
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        data = response.json()
-        
+
+    # Initial request
+    data = get(params)
+
+    if data.get("status") == "ZERO_RESULTS":
+        return []
+    if data.get("status") != "OK":
+        raise PlacesAPIError(data.get("status"), data.get("error_message", "No error message"))
+
+    # Process results
+    all_results.extend(format_places(data.get("results", [])))
+
+    # Handle pagination (next_page_token)
+    next_page_token = data.get("next_page_token")
+
+    while next_page_token:
+        # The token needs a moment before Google accepts it
+        data = page_poller.fetch(lambda token: get({"pagetoken": token, "key": api_key}), next_page_token)
+
         if data.get("status") != "OK":
-            print(f"API Error: {data.get('status')} - {data.get('error_message', 'No error message')}")
-            return []
-        
-        # Process results
+            # A partial answer would pass for a complete one, so fail the search
+            raise PlacesAPIError(
+                data.get("status"),
+                f"paging stopped after {len(all_results)} places: {data.get('error_message', 'No error message')}"
+            )
         all_results.extend(format_places(data.get("results", [])))
-        
-        # Handle pagination (next_page_token)
         next_page_token = data.get("next_page_token")
-        
-        while next_page_token:
-            # Google requires a short delay before using next_page_token
-            import time
-            time.sleep(2)
-            
-            response = requests.get(base_url, params={"pagetoken": next_page_token, "key": api_key})
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("status") == "OK":
-                all_results.extend(format_places(data.get("results", [])))
-                next_page_token = data.get("next_page_token")
-            else:
-                break
-        
-        return all_results
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {str(e)}")
-        return []
+
+    return all_results
 
 
 def format_places(results: List[Dict]) -> List[Dict]:
@@ -126,30 +239,100 @@ def format_places(results: List[Dict]) -> List[Dict]:
     return formatted_places
 
 
-def save_to_json_file(places: List[Dict], filename: str = "places.json"):
+# Types every result carries; they say nothing about the place
+GENERIC_TYPES = ("point_of_interest", "establishment")
+
+
+def slim_place(place: Dict) -> Dict:
+    """
+    Project a formatted place onto the fields the site uses
+    
+    Drops viewport, icons, plus_code, reference/scope, the open_now
+    snapshot (stale as soon as it is stored) and photos, whose references
+    are kept apart by place_id (see photo_references). Missing values are
+    left out.
+    
+    Args:
+        place: Place as returned by format_places
+    
+    Returns:
+        Slim place dict
+    """
+    slim = {
+        "place_id": place.get("place_id"),
+        "name": place.get("name"),
+        "vicinity": place.get("vicinity"),
+        "location": {
+            "lat": place.get("location", {}).get("lat"),
+            "lng": place.get("location", {}).get("lng")
+        },
+        "types": [t for t in place.get("types", []) if t not in GENERIC_TYPES],
+        "rating": place.get("rating"),
+        "user_ratings_total": place.get("user_ratings_total")
+    }
+    if place.get("business_status") not in (None, "OPERATIONAL"):
+        slim["business_status"] = place.get("business_status")
+    
+    return {key: value for key, value in slim.items() if value not in (None, [])}
+
+
+def slim_places(places: List[Dict]) -> List[Dict]:
+    """slim_place for a list of places"""
+    return [slim_place(place) for place in places]
+
+
+def photo_references(places: List[Dict]) -> Dict[str, Dict]:
+    """
+    First photo of each place as a reference, keyed by place_id
+    
+    Only the photo_reference (for the Place Photo API) and the attribution
+    Google requires next to the image are kept; a place's photo is stored
+    once however many properties list it.
+    
+    Args:
+        places: Places as returned by format_places
+    
+    Returns:
+        {place_id: {"photo_reference": ..., "attribution": ...}}
+    """
+    references = {}
+    for place in places:
+        photos = place.get("photos") or []
+        if not photos or not photos[0].get("photo_reference"):
+            continue
+        reference = {"photo_reference": photos[0]["photo_reference"]}
+        if photos[0].get("html_attributions"):
+            reference["attribution"] = photos[0]["html_attributions"][0]
+        references[place.get("place_id")] = reference
+    return references
+
+
+def save_to_json_file(places: List[Dict], filename: str = "places.json", slim: bool = True):
     """
     Save places to a JSON file
     
     Args:
         places: List of formatted places
         filename: Output filename
+        slim: Store only the fields slim_place keeps
     """
     with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(places, f, indent=2, ensure_ascii=False)
+        json.dump(slim_places(places) if slim else places, f, ensure_ascii=False, separators=(',', ':'))
     print(f"Saved {len(places)} places to {filename}")
 
 
-def get_places_json_string(places: List[Dict]) -> str:
+def get_places_json_string(places: List[Dict], slim: bool = True) -> str:
     """
     Convert places to JSON string for database storage
     
     Args:
         places: List of formatted places
+        slim: Store only the fields slim_place keeps (the listing pages need no more)
     
     Returns:
         JSON string ready for database column
     """
-    return json.dumps(places, ensure_ascii=False)
+    return json.dumps(slim_places(places) if slim else places, ensure_ascii=False, separators=(',', ':'))
 
 
 # Example usage
@@ -163,13 +346,17 @@ if __name__ == "__main__":
     
     # Fetch places
     print(f"Fetching places near ({LATITUDE}, {LONGITUDE}) within {RADIUS}m...")
-    places = fetch_nearby_places(
-        latitude=LATITUDE,
-        longitude=LONGITUDE,
-        radius=RADIUS,
-        place_type=PLACE_TYPE,
-        api_key=API_KEY
-    )
+    try:
+        places = fetch_nearby_places(
+            latitude=LATITUDE,
+            longitude=LONGITUDE,
+            radius=RADIUS,
+            place_type=PLACE_TYPE,
+            api_key=API_KEY
+        )
+    except (PlacesAPIError, requests.exceptions.RequestException) as e:
+        print(f"Search failed: {e}")
+        raise SystemExit(1)
     
     print(f"Found {len(places)} places")
     
@@ -10,6 +10,14 @@ import sys
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
+import csv
+import json
+import heapq
+import tempfile
+from itertools import groupby
+from operator import itemgetter
+
+from flat_data_comparison import read_excel_with_header
 
 # Load environment variables
 load_dotenv()
@@ -58,40 +66,8 @@ def get_flat_names_from_db():
 def get_flat_names_from_excel(excel_file_path):
     """Get all flat names from Excel file"""
     try:
-        # First, try to read with different header row options
-        df = None
-        header_row = None
-        
-        # Try different header rows (0, 1, 2, 3, 4, 5, 6) to find the actual column names
-        for skip_rows in range(7):
-            try:
-                temp_df = pd.read_excel(excel_file_path, header=skip_rows)
-                logger.info(f"Trying header row {skip_rows}: columns = {list(temp_df.columns)[:10]}...")
-                
-                # Check if we found the actual column headers
-                if 'Flat Master Name' in temp_df.columns:
-                    df = temp_df
-                    header_row = skip_rows
-                    logger.info(f"Found proper headers at row {skip_rows}")
-                    break
-                    
-            except Exception as e:
-                logger.debug(f"Failed to read with header={skip_rows}: {e}")
-                continue
-        
-        # If we still haven't found proper headers, try reading without header and look for the row
-        if df is None:
-            logger.info("Searching for header row manually...")
-            temp_df = pd.read_excel(excel_file_path, header=None)
-            
-            # Search for the row containing 'Flat Master Name'
-            for idx, row in temp_df.iterrows():
-                if row.astype(str).str.contains('Flat Master Name', na=False).any():
-                    logger.info(f"Found 'Flat Master Name' in row {idx}")
-                    # Re-read with this row as header
-                    df = pd.read_excel(excel_file_path, header=idx)
-                    header_row = idx
-                    break
+        # Single parse of the workbook; header row located in memory
+        df, header_row = read_excel_with_header(excel_file_path, 'Flat Master Name')
         
         if df is None or 'Flat Master Name' not in df.columns:
             logger.error("Column 'Flat Master Name' not found in Excel file")
@@ -168,14 +144,196 @@ def find_missing_flats(excel_file_path):
     
     return True
 
+# Name normalisation shared by both sides of the reconciliation. It must match
+# lower(btrim(name) COLLATE "C") in PostgreSQL: btrim strips spaces only and
+# lower() under the C collation only folds ASCII letters, and C ordering is
+# byte order, i.e. the same order Python uses for str.
+ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+def normalize_name_key(name):
+    """Normalised, sortable key for a flat name (see ASCII_LOWER)"""
+    return str(name).strip(' ').translate(ASCII_LOWER)
+
+def iter_db_flat_names_sorted(conn, itersize=10000):
+    """
+    Stream (key, name, slug) from the flats table ordered by normalised name,
+    using a server-side cursor so only itersize rows are held at a time.
+    """
+    cursor = conn.cursor(name='reconcile_flat_names')
+    cursor.itersize = itersize
+    try:
+        cursor.execute("""
+            SELECT lower(btrim(name) COLLATE "C") AS name_key, name, slug
+            FROM flats
+            WHERE name IS NOT NULL AND name != ''
+            ORDER BY lower(btrim(name) COLLATE "C")
+        """)
+        for name_key, name, slug in cursor:
+            yield name_key, name, slug
+    finally:
+        cursor.close()
+
+def iter_flat_names_from_csv(csv_file_path, header_name='Flat Master Name'):
+    """
+    Stream flat names from a CSV export without loading the file.
+    The header row is the first row containing header_name (the flat master
+    export has a few preamble rows before it).
+    """
+    with open(csv_file_path, 'r', encoding='utf-8-sig', errors='replace', newline='') as f:
+        reader = csv.reader(f)
+        name_index = None
+        for row in reader:
+            stripped = [cell.strip() for cell in row]
+            if header_name in stripped:
+                name_index = stripped.index(header_name)
+                break
+        
+        if name_index is None:
+            raise ValueError(f"Column '{header_name}' not found in {csv_file_path}")
+        
+        for row in reader:
+            if name_index < len(row) and row[name_index].strip():
+                yield row[name_index]
+
+def iter_source_flat_names(file_path):
+    """Flat names from a CSV (streamed) or Excel workbook"""
+    if file_path.lower().endswith('.csv'):
+        return iter_flat_names_from_csv(file_path)
+    
+    # Workbooks are parsed whole by openpyxl anyway
+    names = get_flat_names_from_excel(file_path)
+    if names is None:
+        raise ValueError(f"Column 'Flat Master Name' not found in {file_path}")
+    return iter(names)
+
+def external_sort_names(names, chunk_size=200000):
+    """
+    Yield (key, name) sorted by normalised key using bounded memory.
+    Names are sorted in chunks of chunk_size; if more than one chunk is
+    needed the sorted runs are spilled to temp files and merged lazily.
+    """
+    run_files = []
+    chunk = []
+    
+    def spill(chunk):
+        chunk.sort()
+        run_file = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+        for record in chunk:
+            run_file.write(json.dumps(record) + '\n')
+        run_file.seek(0)
+        run_files.append(run_file)
+    
+    for name in names:
+        chunk.append((normalize_name_key(name), str(name)))
+        if len(chunk) >= chunk_size:
+            spill(chunk)
+            chunk = []
+    
+    if not run_files:
+        # Everything fit in one chunk: sort in memory, no disk I/O
+        chunk.sort()
+        yield from chunk
+        return
+    
+    if chunk:
+        spill(chunk)
+    
+    try:
+        runs = [(tuple(json.loads(line)) for line in run_file) for run_file in run_files]
+        yield from heapq.merge(*runs)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+def reconcile_sorted(excel_sorted, db_sorted):
+    """
+    Merge-join two streams sorted by normalised name key.
+    excel_sorted yields (key, name); db_sorted yields (key, name, slug).
+    Yields report rows with status EXCEL_ONLY, DB_ONLY or BOTH_DIFFERENT
+    (same normalised name, but the raw names differ in case/spacing).
+    Memory use is bounded by the largest group of equal keys.
+    """
+    excel_groups = groupby(excel_sorted, key=itemgetter(0))
+    db_groups = groupby(db_sorted, key=itemgetter(0))
+    
+    excel_group = next(excel_groups, None)
+    db_group = next(db_groups, None)
+    
+    while excel_group is not None or db_group is not None:
+        if db_group is None or (excel_group is not None and excel_group[0] < db_group[0]):
+            for key, name in excel_group[1]:
+                yield {'status': 'EXCEL_ONLY', 'name_key': key, 'excel_name': name, 'db_name': '', 'db_slug': ''}
+            excel_group = next(excel_groups, None)
+        
+        elif excel_group is None or db_group[0] < excel_group[0]:
+            for key, name, slug in db_group[1]:
+                yield {'status': 'DB_ONLY', 'name_key': key, 'excel_name': '', 'db_name': name, 'db_slug': slug or ''}
+            db_group = next(db_groups, None)
+        
+        else:
+            excel_names = [name for _, name in excel_group[1]]
+            db_rows = [(name, slug) for _, name, slug in db_group[1]]
+            if set(excel_names) != {name for name, _ in db_rows}:
+                for excel_name in excel_names:
+                    for db_name, db_slug in db_rows:
+                        # Exact matches within the group are not differences
+                        if excel_name == db_name:
+                            continue
+                        yield {
+                            'status': 'BOTH_DIFFERENT',
+                            'name_key': excel_group[0],
+                            'excel_name': excel_name,
+                            'db_name': db_name,
+                            'db_slug': db_slug or ''
+                        }
+            excel_group = next(excel_groups, None)
+            db_group = next(db_groups, None)
+
+def reconcile_flats(source_file_path, output_file='flat_reconciliation_report.csv'):
+    """
+    Bidirectional Excel/CSV <-> DB reconciliation in one streaming pass.
+    Reports flats only in the file, only in the DB, and flats present in
+    both whose names differ only by case/spacing.
+    """
+    counts = {'EXCEL_ONLY': 0, 'DB_ONLY': 0, 'BOTH_DIFFERENT': 0}
+    
+    conn = connect_db()
+    try:
+        excel_sorted = external_sort_names(iter_source_flat_names(source_file_path))
+        db_sorted = iter_db_flat_names_sorted(conn)
+        
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['status', 'name_key', 'excel_name', 'db_name', 'db_slug'])
+            writer.writeheader()
+            for row in reconcile_sorted(excel_sorted, db_sorted):
+                counts[row['status']] += 1
+                writer.writerow(row)
+    finally:
+        conn.close()
+    
+    logger.info(f"\n{'='*70}")
+    logger.info("FLAT RECONCILIATION SUMMARY")
+    logger.info(f"{'='*70}")
+    logger.info(f"In file but NOT in database: {counts['EXCEL_ONLY']}")
+    logger.info(f"In database but NOT in file: {counts['DB_ONLY']}")
+    logger.info(f"In both, names differ by case/spacing: {counts['BOTH_DIFFERENT']}")
+    logger.info(f"Reconciliation report saved to: {output_file}")
+    
+    return True
+
 def main():
     """Main function"""
-    if len(sys.argv) != 2:
-        print("Usage: python find_missing_flats.py <excel_file_path>")
+    if len(sys.argv) < 2 or len(sys.argv) > 3:
+        print("Usage: python find_missing_flats.py <excel_file_path> [--reconcile]")
         print("Example: python find_missing_flats.py Flat_data_before_live.xlsx")
+        print("Example: python find_missing_flats.py flat_master.csv --reconcile")
+        print("\nOptions:")
+        print("  --reconcile    Streaming two-way reconciliation (file-only, DB-only, both-but-different)")
+        print("                 both-but-different: same name after normalisation, differing only in case/spacing")
         sys.exit(1)
     
     excel_file_path = sys.argv[1]
+    reconcile = len(sys.argv) == 3 and sys.argv[2] == '--reconcile'
     
     if not os.path.exists(excel_file_path):
         logger.error(f"Excel file not found: {excel_file_path}")
@@ -193,7 +351,10 @@ def main():
     logger.info(f"Finding missing flats from: {excel_file_path}")
     
     try:
-        success = find_missing_flats(excel_file_path)
+        if reconcile:
+            success = reconcile_flats(excel_file_path)
+        else:
+            success = find_missing_flats(excel_file_path)
         if success:
             logger.info("Missing flats check completed successfully!")
             sys.exit(0)
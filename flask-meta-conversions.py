@@ -1,87 +1,127 @@
 """
 Flask Meta Conversions API Implementation
 Handles server-side conversion tracking to Meta (Facebook) for better attribution
+
+Tracking endpoints queue events and answer 202 straight away; a background
+dispatcher sends them to the Graph API, so endpoint latency does not depend
+on Meta's response time. By default events are journaled to SQLite
+(META_JOURNAL_PATH) before the 202, so they survive restarts and outages.
+Repeats of an (event_name, event_id) already accepted are answered from the
+dedup store (META_DEDUP_BACKEND) without being queued again.
 """
 
-import hashlib
+import atexit
 import json
 import os
+import queue
+import random
+import signal
+import sys
+import threading
 import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Any, Callable, Dict, List, Optional
 
 import requests
-from flask import Flask, request, jsonify
+from requests.adapters import HTTPAdapter
+from flask import Blueprint, Flask, current_app, request, jsonify
+
+from meta_event_dedup import create_dedup_store
+from meta_event_journal import MetaEventJournal, make_dedup_key
+from meta_user_data import prepare_user_data, prepare_user_data_batch
 
 # Required packages:
 # pip install flask requests
 
+# The Graph API accepts at most this many events in one /events request
+MAX_EVENTS_PER_REQUEST = 1000
+
+# Graph API error codes (error.code) that are throttling, not a bad request
+GRAPH_RATE_LIMIT_CODES = {4, 17, 32, 613}
+# Access token and permission errors: every event would fail the same way
+GRAPH_AUTH_CODES = {10, 102, 190} | set(range(200, 300))
+# error_subcode 33: the pixel does not exist or the token cannot see it
+GRAPH_CONFIG_SUBCODES = {33}
+
+def graph_error(error: Exception) -> Dict[str, Any]:
+    """The Graph API `error` object of a failed request ({} if there is none)"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return {}
+    try:
+        body = response.json()
+    except ValueError:
+        return {}
+    return body.get('error') or {} if isinstance(body, dict) else {}
+
 class MetaConversionsService:
     """
     Meta Conversions API Service for Flask
     Handles server-side event tracking to Meta (Facebook)
     """
     
-    def __init__(self, pixel_id: str, access_token: str, api_version: str = "v19.0"):
+    def __init__(self, pixel_id: str, access_token: str, api_version: str = "v19.0",
+                 pool_size: int = 10, timeout: float = 10,
+                 graph_url: str = "https://graph.facebook.com"):
         self.pixel_id = pixel_id
         self.access_token = access_token
         self.api_version = api_version
-        self.base_url = f"https://graph.facebook.com/{api_version}/{pixel_id}/events"
+        self.base_url = f"{graph_url.rstrip('/')}/{api_version}/{pixel_id}/events"
+        self.timeout = timeout
+        
+        # Pooled keep-alive connections instead of a new TLS handshake per event
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
-    def _hash_user_data(self, data: str) -> str:
-        """Hash sensitive user data as required by Meta"""
-        return hashlib.sha256(data.lower().strip().encode()).hexdigest()
-    
     def _prepare_user_data(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Prepare user data with proper hashing"""
-        prepared = user_data.copy()
-        
-        # Hash sensitive fields
-        if 'em' in prepared and prepared['em']:
-            prepared['em'] = self._hash_user_data(prepared['em'])
-        if 'ph' in prepared and prepared['ph']:
-            # Remove non-numeric characters from phone
-            phone = ''.join(filter(str.isdigit, prepared['ph']))
-            prepared['ph'] = self._hash_user_data(phone)
-        if 'fn' in prepared and prepared['fn']:
-            prepared['fn'] = self._hash_user_data(prepared['fn'])
-        if 'ln' in prepared and prepared['ln']:
-            prepared['ln'] = self._hash_user_data(prepared['ln'])
-        if 'ct' in prepared and prepared['ct']:
-            prepared['ct'] = self._hash_user_data(prepared['ct'])
-        if 'st' in prepared and prepared['st']:
-            prepared['st'] = self._hash_user_data(prepared['st'])
-        if 'zp' in prepared and prepared['zp']:
-            prepared['zp'] = self._hash_user_data(prepared['zp'])
-        if 'external_id' in prepared and prepared['external_id']:
-            prepared['external_id'] = self._hash_user_data(str(prepared['external_id']))
-            
-        return prepared
+        """Prepare user data with proper normalisation and hashing (see meta_user_data.py)"""
+        return prepare_user_data(user_data)
     
-    def send_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Send conversion event to Meta"""
+    def prepare_event(self, event_data: Dict[str, Any],
+                      prepared_user_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the Graph API representation of one event (user data hashed)"""
+        if prepared_user_data is None:
+            prepared_user_data = self._prepare_user_data(event_data.get('user_data', {}))
+        
+        prepared_event = {
+            'event_name': event_data.get('event_name'),
+            'event_time': event_data.get('event_time', int(time.time())),
+            'user_data': prepared_user_data,
+            'action_source': event_data.get('action_source', 'website')
+        }
+        
+        # Add optional fields
+        if 'event_id' in event_data:
+            prepared_event['event_id'] = event_data['event_id']
+        if 'custom_data' in event_data:
+            prepared_event['custom_data'] = event_data['custom_data']
+        if 'event_source_url' in event_data:
+            prepared_event['event_source_url'] = event_data['event_source_url']
+        if 'opt_out' in event_data:
+            prepared_event['opt_out'] = event_data['opt_out']
+        
+        return prepared_event
+    
+    def send_events(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Send up to MAX_EVENTS_PER_REQUEST conversion events to Meta in one request"""
+        # Hash the batch's user data together: shared identifiers are hashed once
+        user_data_list = prepare_user_data_batch([event_data.get('user_data', {}) for event_data in events])
+        return self.send_prepared_events([
+            self.prepare_event(event_data, user_data)
+            for event_data, user_data in zip(events, user_data_list)
+        ])
+    
+    def send_prepared_events(self, prepared_events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Send events already built by prepare_event (e.g. replayed from the journal)"""
+        if len(prepared_events) > MAX_EVENTS_PER_REQUEST:
+            raise ValueError(f"At most {MAX_EVENTS_PER_REQUEST} events per request, got {len(prepared_events)}")
+        
         try:
-            # Prepare the event data
-            prepared_event = {
-                'event_name': event_data.get('event_name'),
-                'event_time': event_data.get('event_time', int(time.time())),
-                'user_data': self._prepare_user_data(event_data.get('user_data', {})),
-                'action_source': event_data.get('action_source', 'website')
-            }
-            
-            # Add optional fields
-            if 'event_id' in event_data:
-                prepared_event['event_id'] = event_data['event_id']
-            if 'custom_data' in event_data:
-                prepared_event['custom_data'] = event_data['custom_data']
-            if 'event_source_url' in event_data:
-                prepared_event['event_source_url'] = event_data['event_source_url']
-            if 'opt_out' in event_data:
-                prepared_event['opt_out'] = event_data['opt_out']
-            
             # Prepare request payload
             payload = {
-                'data': [prepared_event],
+                'data': prepared_events,
                 'access_token': self.access_token
             }
             
@@ -90,17 +130,18 @@ class MetaConversionsService:
                 payload['test_event_code'] = 'TEST12345'
             
             # Send request to Meta
-            response = requests.post(
+            response = self.session.post(
                 self.base_url,
                 json=payload,
                 headers={'Content-Type': 'application/json'},
-                timeout=10
+                timeout=self.timeout
             )
             
             response.raise_for_status()
             result = response.json()
             
-            print(f"Meta Conversion Event sent successfully: {event_data.get('event_name')}")
+            print(f"Meta Conversion Events sent successfully: {len(prepared_events)} events, "
+                  f"{result.get('events_received', 0)} received")
             return result
             
         except requests.exceptions.RequestException as e:
@@ -109,16 +150,558 @@ class MetaConversionsService:
         except Exception as e:
             print(f"Unexpected error in Meta tracking: {e}")
             raise
+    
+    def send_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Send conversion event to Meta"""
+        return self.send_events([event_data])
 
-# Initialize Flask app
-app = Flask(__name__)
+class MetaEventDispatcher:
+    """
+    In-process background dispatcher for Meta conversion events
+    Request handlers enqueue events and return immediately; worker threads
+    send them through the service's pooled session, retrying transient
+    failures (connection errors, timeouts, 429 and 5xx) with exponential
+    backoff and jitter. The queue is capped: when it is full the
+    overflow policy either drops the oldest queued event ('drop_oldest')
+    or rejects the new one ('drop_newest').
+    
+    Events are micro-batched: a worker takes the first queued event, keeps
+    collecting for up to flush_interval seconds or until max_batch_size
+    events, and sends them as one multi-event `data` payload. Meta rejects a
+    whole batch if one event is invalid, so a batch refused with a payload
+    validation error (a 400 carrying a Graph error code or subcode) is split
+    in halves until the bad events are isolated. Any other failure (expired
+    token, wrong pixel, a bug building the request) would hit every event
+    alike: the batch is failed once and the fault is reported by readiness()
+    until a send succeeds again.
+    Every event's outcome is reported to on_result(event_data, success, detail).
+    """
+    
+    OVERFLOW_POLICIES = ('drop_oldest', 'drop_newest')
+    
+    def __init__(self, service: MetaConversionsService, max_queue_size: int = 10000,
+                 overflow_policy: str = 'drop_oldest', workers: int = 2,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0,
+                 max_batch_size: int = MAX_EVENTS_PER_REQUEST, flush_interval: float = 1.0,
+                 on_result: Optional[Callable[[Dict[str, Any], bool, Any], None]] = None):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        if not 1 <= max_batch_size <= MAX_EVENTS_PER_REQUEST:
+            raise ValueError(f"max_batch_size must be between 1 and {MAX_EVENTS_PER_REQUEST}")
+        
+        self.service = service
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.overflow_policy = overflow_policy
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.on_result = on_result or self._log_result
+        
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._fault: Optional[Dict[str, Any]] = None
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'retried': 0, 'dropped': 0, 'requests': 0,
+                      'faults': 0}
+    
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+    
+    def _set_fault(self, error: Exception):
+        """Record a failure that affects every event (auth, configuration, bugs)"""
+        details = graph_error(error)
+        message = f"{error} ({details.get('type', 'GraphError')} {details.get('code')}: {details.get('message')})" \
+            if details else str(error)
+        with self._lock:
+            self.stats['faults'] += 1
+            new_fault = self._fault is None
+            self._fault = {
+                'error': message[:500],
+                'since': self._fault['since'] if self._fault else time.time()
+            }
+        if new_fault:
+            print(f"Meta dispatcher fault, every event is affected: {message}")
+    
+    def _clear_fault(self):
+        with self._lock:
+            self._fault = None
+    
+    def fault(self) -> Optional[Dict[str, Any]]:
+        """The current dispatcher-wide fault ({'error', 'since'}), or None"""
+        with self._lock:
+            return dict(self._fault) if self._fault else None
+    
+    def start(self):
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"meta-dispatcher-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the workers, giving queued events up to timeout seconds to drain"""
+        if not self._threads:
+            return
+        deadline = time.monotonic() + timeout
+        # unfinished_tasks also covers events taken into a batch but not yet sent
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+        
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        
+        if not self.queue.empty():
+            print(f"Meta dispatcher stopped with {self.queue.qsize()} events still queued")
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Dispatcher counters and current queue depth"""
+        with self._lock:
+            metrics = dict(self.stats)
+        metrics['queue_depth'] = self.queue.qsize()
+        metrics['fault'] = self.fault()
+        return metrics
+    
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Whether new events can be accepted and delivered: workers alive, queue
+        not full and no dispatcher-wide fault (events would only fail)
+        """
+        workers_alive = sum(thread.is_alive() for thread in self._threads)
+        queue_full = self.queue.full()
+        fault = self.fault()
+        return {
+            'ready': workers_alive == self.workers and not queue_full and fault is None,
+            'workers_alive': workers_alive,
+            'queue_depth': self.queue.qsize(),
+            'queue_full': queue_full,
+            'fault': fault
+        }
+    
+    def submit(self, event_data: Dict[str, Any]) -> bool:
+        """
+        Queue an event without blocking
+        Returns False if the event was rejected because the queue is full.
+        """
+        try:
+            self.queue.put_nowait(event_data)
+            self._count('queued')
+            return True
+        except queue.Full:
+            pass
+        
+        if self.overflow_policy == 'drop_newest':
+            self._count('dropped')
+            print(f"Meta dispatcher queue full, dropped {event_data.get('event_name')} event")
+            return False
+        
+        # drop_oldest: make room by discarding the event that has waited longest
+        try:
+            dropped = self.queue.get_nowait()
+            self.queue.task_done()
+            self._count('dropped')
+            print(f"Meta dispatcher queue full, dropped oldest {dropped.get('event_name')} event")
+        except queue.Empty:
+            pass
+        
+        try:
+            self.queue.put_nowait(event_data)
+            self._count('queued')
+            return True
+        except queue.Full:
+            self._count('dropped')
+            return False
+    
+    def _is_retryable(self, error: Exception) -> bool:
+        """Connection problems, timeouts, throttling and server errors are worth retrying"""
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            if graph_error(error).get('code') in GRAPH_RATE_LIMIT_CODES:
+                return True
+            return error.response.status_code == 429 or error.response.status_code >= 500
+        return False
+    
+    def _is_invalid_payload(self, error: Exception) -> bool:
+        """
+        A 400 where Graph reports an event or payload validation error (an
+        error code or subcode that is not about the token or the pixel).
+        Only these are worth bisecting: the rest of the batch may be valid.
+        """
+        if not isinstance(error, requests.exceptions.HTTPError) or error.response is None:
+            return False
+        if error.response.status_code != 400:
+            return False
+        details = graph_error(error)
+        code, subcode = details.get('code'), details.get('error_subcode')
+        if code is None and subcode is None:
+            return False
+        return (code not in GRAPH_AUTH_CODES and code not in GRAPH_RATE_LIMIT_CODES
+                and subcode not in GRAPH_CONFIG_SUBCODES)
+    
+    def _backoff_delay(self, attempt: int) -> float:
+        """Exponential backoff with jitter for the given retry attempt (0-based)"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+    
+    def _log_result(self, event_data: Dict[str, Any], success: bool, detail: Any):
+        """Default per-event result handler"""
+        event_label = f"{event_data.get('event_name')} event {event_data.get('event_id') or ''}".strip()
+        if not success:
+            print(f"Meta {event_label} failed: {detail}")
+    
+    def _report(self, events: List[Dict[str, Any]], success: bool, detail: Any):
+        """Fan a batch outcome back out to every event in it"""
+        self._count('sent' if success else 'failed', len(events))
+        for event_data in events:
+            try:
+                self.on_result(event_data, success, detail)
+            except Exception as e:
+                print(f"Meta dispatcher result handler error: {e}")
+    
+    def _send_batch(self, events: List[Dict[str, Any]]):
+        """Send a batch, retrying transient errors and bisecting rejected batches"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._count('requests')
+                result = self.service.send_events(events)
+                self._clear_fault()
+                self._report(events, True, result)
+                return
+            except Exception as e:
+                if self._is_invalid_payload(e):
+                    if len(events) > 1:
+                        # Isolate the invalid event(s) instead of losing the whole batch
+                        middle = len(events) // 2
+                        self._send_batch(events[:middle])
+                        self._send_batch(events[middle:])
+                    else:
+                        self._report(events, False, e)
+                    return
+                if not self._is_retryable(e):
+                    # Bisecting would only repeat the same failure ~2N times
+                    self._set_fault(e)
+                    self._report(events, False, e)
+                    return
+                if attempt >= self.max_retries:
+                    print(f"Giving up on batch of {len(events)} events after {attempt + 1} attempts: {e}")
+                    self._report(events, False, e)
+                    return
+                self._count('retried')
+                # Wake early on shutdown so stop() is not held up by a long backoff
+                if self._stop.wait(self._backoff_delay(attempt)):
+                    self._report(events, False, e)
+                    return
+    
+    def _collect_batch(self, first_event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Gather queued events after first_event until the batch is full or the window closes"""
+        batch = [first_event]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first_event = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            batch = self._collect_batch(first_event)
+            try:
+                self._send_batch(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+class JournaledMetaEventDispatcher(MetaEventDispatcher):
+    """
+    Dispatcher backed by a persistent MetaEventJournal
+    submit() prepares the event and appends it to the journal before the
+    request is acknowledged, so nothing is lost if Meta is down or the
+    process restarts. A single drainer thread replays due events in batches:
+    sent events are marked sent, transient failures stay pending with an
+    exponential backoff (retried until they succeed), and events Meta
+    rejects as invalid are parked as failed. Dispatcher-wide faults (expired
+    token, wrong pixel) are not the events' fault: they stay pending with a
+    backoff, the drainer pauses between attempts and the fault is reported
+    by readiness() until a send succeeds. Events with an event_id that is
+    already pending or sent are not journaled twice.
+    """
+    
+    PURGE_INTERVAL = 3600
+    
+    def __init__(self, service: MetaConversionsService, journal: MetaEventJournal, **kwargs):
+        kwargs['workers'] = 1  # one drainer per process; claims keep processes apart
+        super().__init__(service, **kwargs)
+        self.journal = journal
+        self.stats['duplicates'] = 0
+        self._wake = threading.Event()
+        self._last_purge = 0.0
+        # Claimed rows are skipped by other drainers until the send has had time to finish
+        self.lease_seconds = max(60.0, 2 * service.timeout)
+    
+    def submit(self, event_data: Dict[str, Any]) -> bool:
+        """Persist an event; returns False only if it could not be written"""
+        try:
+            seq = self.journal.append(self.service.prepare_event(event_data))
+        except Exception as e:
+            print(f"Could not journal {event_data.get('event_name')} event: {e}")
+            return False
+        
+        self._count('queued' if seq is not None else 'duplicates')
+        self._wake.set()
+        return True
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the drainer, giving due events up to timeout seconds to go out"""
+        if not self._threads:
+            return
+        deadline = time.monotonic() + timeout
+        # Leased rows are invisible to fetch_due, so wait on every pending row
+        while self.journal.pending_count() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        
+        pending = self.journal.metrics()['pending']
+        if pending:
+            print(f"Meta dispatcher stopped with {pending} events journaled for the next run")
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Dispatcher counters plus journal backlog, lag and throughput"""
+        return {**super().metrics(), **self.journal.metrics()}
+    
+    def readiness(self) -> Dict[str, Any]:
+        """
+        Whether new events can be accepted: drainer alive and journal readable.
+        A dispatcher-wide fault is reported but does not make the instance
+        unready: accepted events are kept in the journal until it is fixed.
+        """
+        drainer_alive = any(thread.is_alive() for thread in self._threads)
+        try:
+            journal_metrics = self.journal.metrics()
+            journal_ok = True
+        except Exception as e:
+            journal_metrics = {'error': str(e)}
+            journal_ok = False
+        return {
+            'ready': drainer_alive and journal_ok,
+            'workers_alive': int(drainer_alive),
+            'journal': journal_metrics,
+            'fault': self.fault()
+        }
+    
+    def _send_journal_batch(self, rows: List[tuple]):
+        """Send journaled (seq, event, attempts) rows and record the outcome"""
+        seqs = [seq for seq, _, _ in rows]
+        events = [event for _, event, _ in rows]
+        
+        try:
+            self._count('requests')
+            result = self.service.send_prepared_events(events)
+        except Exception as e:
+            if self._is_invalid_payload(e):
+                if len(rows) > 1:
+                    # Isolate the invalid event(s) instead of parking the whole batch
+                    middle = len(rows) // 2
+                    self._send_journal_batch(rows[:middle])
+                    self._send_journal_batch(rows[middle:])
+                else:
+                    self.journal.mark_failed(seqs, e)
+                    self._report(events, False, e)
+                return
+            
+            if not self._is_retryable(e):
+                # Token, pixel or code problem: the events are fine, keep them pending
+                self._set_fault(e)
+            attempt = max(attempts for _, _, attempts in rows)
+            self.journal.mark_retry(seqs, self._backoff_delay(attempt), e)
+            self._count('retried', len(rows))
+            return
+        
+        self._clear_fault()
+        self.journal.mark_sent(seqs)
+        self._report(events, True, result)
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                rows = self.journal.claim_due(self.max_batch_size, lease_seconds=self.lease_seconds)
+                if rows:
+                    self._send_journal_batch(rows)
+                
+                if time.monotonic() - self._last_purge > self.PURGE_INTERVAL:
+                    self.journal.purge_sent()
+                    self._last_purge = time.monotonic()
+            except Exception as e:
+                print(f"Meta journal drainer error: {e}")
+                rows = None
+            
+            if self.fault():
+                # Every send would fail: probe again after a pause instead of
+                # spending a request on each newly accepted batch
+                self._stop.wait(self.backoff_max)
+                continue
+            
+            # A full batch means more is waiting; otherwise sleep until new
+            # events arrive (or retries come due) and let the batch window fill
+            if not rows or len(rows) < self.max_batch_size:
+                woke = self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                if woke:
+                    self._stop.wait(self.flush_interval)
 
 # Configuration - get from environment variables
 PIXEL_ID = os.getenv('META_PIXEL_ID', '611397144049399')  # Your pixel ID
 ACCESS_TOKEN = os.getenv('META_ACCESS_TOKEN', 'EAAVeDVIwm3QBPRDGzWL6JqUCYVfcwWAb08uaZAdPQpWmyitus7BI8dWm8WoJYgsUYEaL1AOZAWIzyYHDkx5LSuxUzscqX8VRi8k4pfuqeqZAZAtYyYb37a3jIHXGrXv9wS62AQ18Q4TuY8bWNcf63KEUhWde6UXdSm2WZAjmeM4EIdYLzUHGxl2NnBtBS7gVu0AZDZD')
 
-# Initialize Meta service
-meta_service = MetaConversionsService(PIXEL_ID, ACCESS_TOKEN)
+# Background dispatch settings
+QUEUE_MAX_SIZE = int(os.getenv('META_QUEUE_MAX_SIZE', '10000'))
+QUEUE_OVERFLOW_POLICY = os.getenv('META_QUEUE_OVERFLOW_POLICY', 'drop_oldest')
+DISPATCH_WORKERS = int(os.getenv('META_DISPATCH_WORKERS', '2'))
+MAX_RETRIES = int(os.getenv('META_MAX_RETRIES', '3'))
+BATCH_SIZE = int(os.getenv('META_BATCH_SIZE', str(MAX_EVENTS_PER_REQUEST)))
+BATCH_FLUSH_INTERVAL = float(os.getenv('META_BATCH_FLUSH_INTERVAL', '1.0'))
+GRAPH_URL = os.getenv('META_GRAPH_URL', 'https://graph.facebook.com')  # point at a stub for testing
+JOURNAL_PATH = os.getenv('META_JOURNAL_PATH', 'meta_events_journal.db')  # empty = in-memory queue only
+
+# Duplicate event_id suppression: memory (per process), sqlite (shared by workers) or none
+DEDUP_BACKEND = os.getenv('META_DEDUP_BACKEND', 'memory')
+DEDUP_TTL_SECONDS = int(os.getenv('META_DEDUP_TTL_SECONDS', str(48 * 3600)))
+DEDUP_MAX_ENTRIES = int(os.getenv('META_DEDUP_MAX_ENTRIES', '100000'))
+DEDUP_PATH = os.getenv('META_DEDUP_PATH', 'meta_event_dedup.db')
+
+# Web serving settings (used by meta_conversions_gunicorn.py and __main__)
+WEB_HOST = os.getenv('META_WEB_HOST', '127.0.0.1')
+WEB_PORT = int(os.getenv('META_WEB_PORT', '5000'))
+
+# Tracking routes; create_app registers them on a fresh app
+meta_routes = Blueprint('meta_conversions', __name__)
+
+def release_failed_events(dedup):
+    """
+    Dispatcher on_result handler: log failed events and forget their dedup
+    keys, so a corrected resend of the same event_id is accepted again.
+    """
+    def on_result(event_data: Dict[str, Any], success: bool, detail: Any):
+        if success:
+            return
+        event_label = f"{event_data.get('event_name')} event {event_data.get('event_id') or ''}".strip()
+        print(f"Meta {event_label} failed: {detail}")
+        dedup_key = make_dedup_key(event_data)
+        if dedup and dedup_key:
+            dedup.release(dedup_key)
+    return on_result
+
+def create_dispatcher(on_result=None):
+    """Build the Meta service and the dispatcher that sends its events"""
+    meta_service = MetaConversionsService(PIXEL_ID, ACCESS_TOKEN, pool_size=DISPATCH_WORKERS, graph_url=GRAPH_URL)
+    if JOURNAL_PATH:
+        return JournaledMetaEventDispatcher(
+            meta_service,
+            MetaEventJournal(JOURNAL_PATH),
+            max_batch_size=BATCH_SIZE,
+            flush_interval=BATCH_FLUSH_INTERVAL,
+            on_result=on_result
+        )
+    return MetaEventDispatcher(
+        meta_service,
+        max_queue_size=QUEUE_MAX_SIZE,
+        overflow_policy=QUEUE_OVERFLOW_POLICY,
+        workers=DISPATCH_WORKERS,
+        max_retries=MAX_RETRIES,
+        max_batch_size=BATCH_SIZE,
+        flush_interval=BATCH_FLUSH_INTERVAL,
+        on_result=on_result
+    )
+
+def create_app() -> Flask:
+    """
+    Application factory
+    Each call builds its own dispatcher and starts its threads, so servers
+    must call it after forking (gunicorn without preload_app, one app per
+    worker process):
+        gunicorn -c meta_conversions_gunicorn.py 'flask-meta-conversions:create_app()'
+    """
+    app = Flask(__name__)
+    
+    dedup = create_dedup_store(
+        DEDUP_BACKEND, ttl_seconds=DEDUP_TTL_SECONDS, path=DEDUP_PATH, max_entries=DEDUP_MAX_ENTRIES
+    )
+    dispatcher = create_dispatcher(on_result=release_failed_events(dedup))
+    dispatcher.start()
+    atexit.register(dispatcher.stop)
+    app.extensions['meta_dispatcher'] = dispatcher
+    app.extensions['meta_dedup'] = dedup
+    
+    app.register_blueprint(meta_routes)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, internal_error)
+    return app
+
+def create_asgi_app():
+    """
+    ASGI entry point for uvicorn (needs asgiref):
+        uvicorn --factory 'flask-meta-conversions:create_asgi_app' --workers 4
+    """
+    try:
+        from asgiref.wsgi import WsgiToAsgi
+    except ImportError:
+        raise ImportError("create_asgi_app needs asgiref: pip install asgiref uvicorn")
+    return WsgiToAsgi(create_app())
+
+def get_dispatcher():
+    """Dispatcher of the app handling the current request"""
+    return current_app.extensions['meta_dispatcher']
+
+def queue_event(event_data):
+    """
+    Hand an event to the background dispatcher and build the 202/503 response
+    An event whose (event_name, event_id) was already accepted gets the
+    original response back (marked duplicate) and is not queued again.
+    """
+    result = {
+        'success': True,
+        'queued': True,
+        'event_name': event_data.get('event_name'),
+        'event_id': event_data.get('event_id')
+    }
+    
+    dedup = current_app.extensions.get('meta_dedup')
+    dedup_key = make_dedup_key(event_data) if dedup else None
+    if dedup_key:
+        cached = dedup.claim(dedup_key, result)
+        if cached is not None:
+            return jsonify({**cached, 'duplicate': True}), 202
+    
+    if not get_dispatcher().submit(event_data):
+        if dedup_key:
+            dedup.release(dedup_key)
+        return jsonify({
+            'success': False,
+            'error': 'Event could not be queued, try again later'
+        }), 503
+    
+    return jsonify(result), 202
 
 def get_client_ip():
     """Get client IP address from request headers"""
@@ -130,7 +713,7 @@ def get_client_ip():
         '127.0.0.1'
     )
 
-@app.route('/api/meta/track-conversion', methods=['POST'])
+@meta_routes.route('/api/meta/track-conversion', methods=['POST'])
 def track_conversion():
     """
     Track Meta conversion event
@@ -194,22 +777,8 @@ def track_conversion():
         if 'opt_out' in data:
             event_data['opt_out'] = data['opt_out']
         
-        # Send to Meta
-        result = meta_service.send_event(event_data)
-        
-        return jsonify({
-            'success': True,
-            'events_received': result.get('events_received', 0),
-            'events_dropped': result.get('events_dropped', 0),
-            'messages': result.get('messages', [])
-        })
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Meta API Error: {e}")
-        return jsonify({
-            'success': False,
-            'error': 'Failed to send event to Meta'
-        }), 500
+        # Sent to Meta in the background
+        return queue_event(event_data)
         
     except Exception as e:
         print(f"Server Error: {e}")
@@ -218,9 +787,29 @@ def track_conversion():
             'error': 'Internal server error'
         }), 500
 
+@meta_routes.route('/api/meta/queue-metrics', methods=['GET'])
+def queue_metrics():
+    """Dispatcher counters; with the journal also backlog, lag and throughput"""
+    metrics = get_dispatcher().metrics()
+    dedup = current_app.extensions.get('meta_dedup')
+    if dedup:
+        metrics['dedup'] = dedup.metrics()
+    return jsonify({'success': True, 'metrics': metrics})
+
+@meta_routes.route('/healthz', methods=['GET'])
+def health():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@meta_routes.route('/readyz', methods=['GET'])
+def readiness():
+    """Readiness: the dispatcher can accept events (503 otherwise)"""
+    status = get_dispatcher().readiness()
+    return jsonify(status), 200 if status['ready'] else 503
+
 # Helper routes for common events
 
-@app.route('/api/meta/track-purchase', methods=['POST'])
+@meta_routes.route('/api/meta/track-purchase', methods=['POST'])
 def track_purchase():
     """Track purchase event with simplified interface"""
     try:
@@ -246,7 +835,7 @@ def track_purchase():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/meta/track-lead', methods=['POST'])
+@meta_routes.route('/api/meta/track-lead', methods=['POST'])
 def track_lead():
     """Track lead event with simplified interface"""
     try:
@@ -269,7 +858,7 @@ def track_lead():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/meta/track-page-view', methods=['POST'])
+@meta_routes.route('/api/meta/track-page-view', methods=['POST'])
 def track_page_view():
     """Track page view event"""
     try:
@@ -305,24 +894,19 @@ def track_conversion_internal(event_data):
     if not event_data.get('event_source_url'):
         event_data['event_source_url'] = referer
     
-    # Send to Meta
-    result = meta_service.send_event(event_data)
-    
-    return jsonify({
-        'success': True,
-        'events_received': result.get('events_received', 0),
-        'events_dropped': result.get('events_dropped', 0),
-        'messages': result.get('messages', [])
-    })
+    # Sent to Meta in the background
+    return queue_event(event_data)
 
 # Error handlers
-@app.errorhandler(404)
 def not_found(error):
     return jsonify({'success': False, 'error': 'Endpoint not found'}), 404
 
-@app.errorhandler(500)
 def internal_error(error):
     return jsonify({'success': False, 'error': 'Internal server error'}), 500
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    # Exit normally on SIGTERM so atexit stops the dispatcher and drains it
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Development server only; use gunicorn/uvicorn with create_app in production
+    create_app().run(host=WEB_HOST, port=WEB_PORT, threaded=True, debug=os.getenv('FLASK_DEBUG') == '1', use_reloader=False)
@@ -5,13 +5,20 @@ Compares Excel data with database flats table to identify mismatches.
 """
 
 import pandas as pd
+import numpy as np
+from pandas.io.parsers import TextParser
 import psycopg2
 import os
 import sys
 from datetime import datetime
+from decimal import Decimal
+import json
 from dotenv import load_dotenv
 import logging
 
+from excel_cache import read_excel_cached
+from csv_to_flats_insert import get_csv_to_db_mapping, get_field_type, clean_data_value
+
 # Load environment variables
 load_dotenv()
 
@@ -125,43 +132,52 @@ def get_flat_data_from_db():
         if 'conn' in locals():
             conn.close()
 
+def locate_header_row(raw_df, header_name, max_exact_rows=7):
+    """
+    Find the header row in a sheet read with header=None.
+    An exact cell match in the first max_exact_rows rows wins (as the old
+    header=0..6 probing did); otherwise the first row containing header_name.
+    """
+    exact = raw_df.iloc[:max_exact_rows].isin([header_name]).any(axis=1)
+    if exact.any():
+        return int(exact.to_numpy().argmax())
+    
+    contains = raw_df.astype(str).apply(
+        lambda col: col.str.contains(header_name, regex=False, na=False)
+    ).any(axis=1)
+    if contains.any():
+        return int(contains.to_numpy().argmax())
+    
+    return None
+
+def read_excel_with_header(excel_file_path, header_name, sheet_name=0):
+    """
+    Read an Excel sheet whose header row is not necessarily the first row.
+    The workbook is parsed once with header=None; the header row is located
+    in that frame and the rows from it onward are re-parsed in memory with
+    pandas' TextParser, giving the same columns and dtypes as
+    pd.read_excel(header=<row>) without re-reading the xlsx.
+    Returns (df, header_row), or (None, None) if the header is not found.
+    """
+    raw_df = read_excel_cached(excel_file_path, sheet_name=sheet_name, header=None)
+    
+    header_row = locate_header_row(raw_df, header_name)
+    if header_row is None:
+        return None, None
+    
+    logger.info(f"Found '{header_name}' header at row {header_row}")
+    
+    body = raw_df.iloc[header_row:].astype(object)
+    # Empty cells go to the parser as '', the way the xlsx reader hands them over
+    rows = body.where(body.notna(), '').values.tolist()
+    df = TextParser(rows, header=0).read()
+    
+    return df, header_row
+
 def read_excel_data(excel_file_path):
     """Read and process Excel data"""
     try:
-        # First, try to read with different header row options
-        df = None
-        header_row = None
-        
-        # Try different header rows (0, 1, 2, 3, 4, 5, 6) to find the actual column names
-        for skip_rows in range(7):
-            try:
-                temp_df = pd.read_excel(excel_file_path, header=skip_rows)
-                logger.info(f"Trying header row {skip_rows}: columns = {list(temp_df.columns)[:10]}...")
-                
-                # Check if we found the actual column headers
-                if 'Flat Master Name' in temp_df.columns:
-                    df = temp_df
-                    header_row = skip_rows
-                    logger.info(f"Found proper headers at row {skip_rows}")
-                    break
-                    
-            except Exception as e:
-                logger.debug(f"Failed to read with header={skip_rows}: {e}")
-                continue
-        
-        # If we still haven't found proper headers, try reading without header and look for the row
-        if df is None:
-            logger.info("Searching for header row manually...")
-            temp_df = pd.read_excel(excel_file_path, header=None)
-            
-            # Search for the row containing 'Flat Master Name'
-            for idx, row in temp_df.iterrows():
-                if row.astype(str).str.contains('Flat Master Name', na=False).any():
-                    logger.info(f"Found 'Flat Master Name' in row {idx}")
-                    # Re-read with this row as header
-                    df = pd.read_excel(excel_file_path, header=idx)
-                    header_row = idx
-                    break
+        df, header_row = read_excel_with_header(excel_file_path, 'Flat Master Name')
         
         if df is None:
             logger.error("Could not find proper column headers in Excel file")
@@ -207,132 +223,406 @@ def read_excel_data(excel_file_path):
         logger.error(f"Error reading Excel file: {e}")
         raise
 
+def map_normalized(series, normalizer):
+    """
+    Apply a normalizer as a column-level operation.
+    The normalizer runs once per distinct value (via factorize) and the results
+    are broadcast back by code, so the cost scales with distinct values rather
+    than rows. Missing values map to None, as the normalizers do themselves.
+    """
+    try:
+        codes, uniques = pd.factorize(series)
+    except TypeError:
+        # Unhashable values (e.g. JSON columns) - fall back to per-row mapping
+        return series.map(normalizer)
+    normalized = np.empty(len(uniques) + 1, dtype=object)
+    normalized[:-1] = [normalizer(value) for value in uniques]
+    normalized[-1] = None  # code -1 = missing value
+    return pd.Series(normalized[codes], index=series.index)
+
+def build_mismatch_records(df, mask, issue_type, excel_values, db_values, details, field_order):
+    """Build report rows for one field from its mismatch mask"""
+    subset = df.loc[mask]
+    return pd.DataFrame({
+        'flat_name': subset['name'],
+        'slug': subset['flat_slug'],
+        'issue_type': issue_type,
+        'excel_value': excel_values[mask],
+        'db_value': db_values[mask],
+        'details': details[mask] if len(subset) else pd.Series(dtype=object),
+        '_row': subset['_row'],
+        '_field': field_order
+    })
+
 def compare_data(excel_df, db_df):
-    """Compare Excel data with database data and identify mismatches"""
-    mismatches = []
-    
+    """
+    Compare Excel data with database data and identify mismatches.
+    Excel and DB rows are joined with a single merge on name; each field is
+    normalized column-wise and compared into a boolean mismatch mask, and
+    the report rows are built only from the masked rows.
+    """
     logger.info("Starting data comparison...")
     
-    # Create a lookup dictionary for database data using name as key
-    db_lookup = {}
-    for _, row in db_df.iterrows():
-        db_lookup[row['name']] = row
-    
-    processed_count = 0
-    for _, excel_row in excel_df.iterrows():
-        flat_name = excel_row['name']
-        processed_count += 1
-        
-        if processed_count % 100 == 0:
-            logger.info(f"Processed {processed_count} records...")
-        
-        # Find corresponding database record
-        if flat_name not in db_lookup:
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': 'NOT_FOUND_IN_DB',
-                'issue_type': 'MISSING_FROM_DB',
-                'excel_value': 'N/A',
-                'db_value': 'N/A',
-                'details': 'Flat not found in database'
-            })
-            continue
-        
-        db_row = db_lookup[flat_name]
-        flat_slug = db_row['slug'] if db_row['slug'] else flat_name.lower().strip()
-        
-        # Compare Flat Available to Rent Status
-        excel_rent_status = normalize_rent_status(excel_row['excel_rent_status'])
-        db_rent_status = db_row['flat_available_rent_status']
-        
-        if excel_rent_status != db_rent_status and excel_rent_status is not None:
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': flat_slug,
-                'issue_type': 'RENT_STATUS_MISMATCH',
-                'excel_value': f"{excel_row['excel_rent_status']} -> {excel_rent_status}",
-                'db_value': db_rent_status,
-                'details': f"Excel: {excel_row['excel_rent_status']} (normalized: {excel_rent_status}), DB: {db_rent_status}"
-            })
-        
-        # Compare Flat Booking Hold Status
-        excel_booking_status = normalize_booking_hold_status(excel_row['excel_booking_status'])
-        db_booking_status = db_row['flat_booking_hold_status']
-        
-        if excel_booking_status != db_booking_status and excel_booking_status is not None:
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': flat_slug,
-                'issue_type': 'BOOKING_HOLD_STATUS_MISMATCH',
-                'excel_value': f"{excel_row['excel_booking_status']} -> {excel_booking_status}",
-                'db_value': db_booking_status,
-                'details': f"Excel: {excel_row['excel_booking_status']} (normalized: {excel_booking_status}), DB: {db_booking_status}"
-            })
-        
-        # Compare Flat Occupancy Status (direct comparison)
-        excel_occupancy = excel_row['excel_occupancy_status']
-        db_occupancy = db_row['flat_occupancy_status']
-        
-        if not pd.isna(excel_occupancy) and str(excel_occupancy).strip() != str(db_occupancy).strip() and str(excel_occupancy).strip() != '':
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': flat_slug,
-                'issue_type': 'OCCUPANCY_STATUS_MISMATCH',
-                'excel_value': excel_occupancy,
-                'db_value': db_occupancy,
-                'details': f"Excel: {excel_occupancy}, DB: {db_occupancy}"
-            })
-        
-        # Compare Flat Next Booking Status (direct comparison)
-        excel_next_booking = excel_row['excel_next_booking_status']
-        db_next_booking = db_row['flat_next_booking_status']
-        
-        if not pd.isna(excel_next_booking) and str(excel_next_booking).strip() != str(db_next_booking).strip() and str(excel_next_booking).strip() != '':
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': flat_slug,
-                'issue_type': 'NEXT_BOOKING_STATUS_MISMATCH',
-                'excel_value': excel_next_booking,
-                'db_value': db_next_booking,
-                'details': f"Excel: {excel_next_booking}, DB: {db_next_booking}"
-            })
-        
-        # Compare Available Date for Next Booking
-        excel_date = normalize_date(excel_row['excel_available_date'])
-        db_date = db_row['available_date_for_next_booking']
-        
-        if excel_date is not None and db_date is not None:
-            if excel_date != db_date:
-                mismatches.append({
-                    'flat_name': flat_name,
-                    'slug': flat_slug,
-                    'issue_type': 'AVAILABLE_DATE_MISMATCH',
-                    'excel_value': excel_date,
-                    'db_value': db_date,
-                    'details': f"Excel: {excel_date}, DB: {db_date}"
-                })
-        elif excel_date is not None and db_date is None:
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': flat_slug,
-                'issue_type': 'AVAILABLE_DATE_MISSING_IN_DB',
-                'excel_value': excel_date,
-                'db_value': 'NULL',
-                'details': f"Excel has date {excel_date}, but DB is NULL"
-            })
-        elif excel_date is None and db_date is not None:
-            mismatches.append({
-                'flat_name': flat_name,
-                'slug': flat_slug,
-                'issue_type': 'AVAILABLE_DATE_MISSING_IN_EXCEL',
-                'excel_value': 'NULL',
-                'db_value': db_date,
-                'details': f"Excel is NULL, but DB has date {db_date}"
-            })
+    excel_columns = [
+        'name',
+        'excel_rent_status',
+        'excel_booking_status',
+        'excel_occupancy_status',
+        'excel_next_booking_status',
+        'excel_available_date'
+    ]
+    left = excel_df[excel_columns].reset_index(drop=True)
+    left['_row'] = np.arange(len(left))
+    
+    # Later duplicates win, as with the old name -> row lookup dict.
+    # object dtype keeps DB integers from being upcast to float by the merge.
+    right = db_df.drop_duplicates(subset=['name'], keep='last').astype(object)
+    
+    df = left.merge(right, on='name', how='left', indicator=True, sort=False)
+    
+    missing_mask = (df['_merge'] == 'left_only').to_numpy()
+    found = df.loc[~missing_mask].copy()
+    
+    records = [pd.DataFrame({
+        'flat_name': df.loc[missing_mask, 'name'],
+        'slug': 'NOT_FOUND_IN_DB',
+        'issue_type': 'MISSING_FROM_DB',
+        'excel_value': 'N/A',
+        'db_value': 'N/A',
+        'details': 'Flat not found in database',
+        '_row': df.loc[missing_mask, '_row'],
+        '_field': 0
+    })]
+    
+    # Fall back to the lowercased name when the DB slug is empty
+    slug_present = found['slug'].notna() & (found['slug'].astype(str) != '')
+    found['flat_slug'] = found['slug'].where(
+        slug_present, found['name'].astype(str).str.lower().str.strip()
+    )
+    
+    # Compare Flat Available to Rent Status
+    raw = found['excel_rent_status']
+    excel_norm = map_normalized(raw, normalize_rent_status)
+    db_vals = found['flat_available_rent_status']
+    mask = excel_norm.notna() & (excel_norm != db_vals)
+    records.append(build_mismatch_records(
+        found, mask, 'RENT_STATUS_MISMATCH',
+        raw.astype(str) + ' -> ' + excel_norm.astype(str),
+        db_vals,
+        'Excel: ' + raw.astype(str) + ' (normalized: ' + excel_norm.astype(str) + '), DB: ' + db_vals.astype(str),
+        1
+    ))
+    
+    # Compare Flat Booking Hold Status
+    raw = found['excel_booking_status']
+    excel_norm = map_normalized(raw, normalize_booking_hold_status)
+    db_vals = found['flat_booking_hold_status']
+    mask = excel_norm.notna() & (excel_norm != db_vals)
+    records.append(build_mismatch_records(
+        found, mask, 'BOOKING_HOLD_STATUS_MISMATCH',
+        raw.astype(str) + ' -> ' + excel_norm.astype(str),
+        db_vals,
+        'Excel: ' + raw.astype(str) + ' (normalized: ' + excel_norm.astype(str) + '), DB: ' + db_vals.astype(str),
+        2
+    ))
+    
+    # Compare Flat Occupancy Status / Flat Next Booking Status (direct string comparison)
+    direct_fields = [
+        ('excel_occupancy_status', 'flat_occupancy_status', 'OCCUPANCY_STATUS_MISMATCH', 3),
+        ('excel_next_booking_status', 'flat_next_booking_status', 'NEXT_BOOKING_STATUS_MISMATCH', 4)
+    ]
+    for excel_col, db_col, issue_type, field_order in direct_fields:
+        raw = found[excel_col]
+        db_vals = found[db_col]
+        excel_str = raw.astype(str).str.strip()
+        mask = raw.notna() & (excel_str != db_vals.astype(str).str.strip()) & (excel_str != '')
+        records.append(build_mismatch_records(
+            found, mask, issue_type,
+            raw,
+            db_vals,
+            'Excel: ' + raw.astype(str) + ', DB: ' + db_vals.astype(str),
+            field_order
+        ))
     
+    # Compare Available Date for Next Booking
+    excel_date = map_normalized(found['excel_available_date'], normalize_date)
+    db_date = found['available_date_for_next_booking']
+    has_excel = excel_date.notna()
+    has_db = db_date.notna()
+    excel_date_str = excel_date.astype(str)
+    db_date_str = db_date.astype(str)
+    
+    mask = has_excel & has_db & (excel_date != db_date)
+    records.append(build_mismatch_records(
+        found, mask, 'AVAILABLE_DATE_MISMATCH',
+        excel_date, db_date,
+        'Excel: ' + excel_date_str + ', DB: ' + db_date_str,
+        5
+    ))
+    
+    mask = has_excel & ~has_db
+    records.append(build_mismatch_records(
+        found, mask, 'AVAILABLE_DATE_MISSING_IN_DB',
+        excel_date, pd.Series('NULL', index=found.index),
+        'Excel has date ' + excel_date_str + ', but DB is NULL',
+        5
+    ))
+    
+    mask = ~has_excel & has_db
+    records.append(build_mismatch_records(
+        found, mask, 'AVAILABLE_DATE_MISSING_IN_EXCEL',
+        pd.Series('NULL', index=found.index), db_date,
+        'Excel is NULL, but DB has date ' + db_date_str,
+        5
+    ))
+    
+    # Same order as a row-by-row walk: Excel row order, then field order
+    report_df = pd.concat(records, ignore_index=True)
+    report_df = report_df.sort_values(['_row', '_field'], kind='mergesort')
+    mismatches = report_df.drop(columns=['_row', '_field']).to_dict('records')
+    
+    logger.info(f"Processed {len(df)} records")
     logger.info(f"Comparison completed. Found {len(mismatches)} mismatches.")
     return mismatches
 
+def build_column_specs(excel_columns):
+    """
+    Column specs for every Excel column the importer maps to a flats column.
+    Reuses csv_to_flats_insert's mapping and field types so the audit checks
+    values exactly as the importer would have written them.
+    """
+    mapping = get_csv_to_db_mapping()
+    specs = []
+    seen_db_columns = set()
+    
+    for excel_column in excel_columns:
+        db_column = mapping.get(str(excel_column).strip())
+        # name is the join key; later duplicates of a header are ignored
+        if not db_column or db_column == 'name' or db_column in seen_db_columns:
+            continue
+        seen_db_columns.add(db_column)
+        specs.append({
+            'excel_column': excel_column,
+            'db_column': db_column,
+            'field_type': get_field_type(db_column)
+        })
+    
+    return specs
+
+def excel_cell_to_text(value):
+    """Render a parsed Excel cell as it appears in the CSV export the importer reads"""
+    if value is None or (not isinstance(value, (list, dict)) and pd.isna(value)):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        if (value.hour, value.minute, value.second) == (0, 0, 0):
+            return value.strftime('%Y-%m-%d')
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return str(value)
+
+def canonical_value(value, field_type):
+    """Canonical form of an Excel or DB value so both sides compare equal when they match"""
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    if pd.isna(value):
+        return None
+    
+    try:
+        if field_type == 'date':
+            return value.date() if isinstance(value, datetime) else value
+        if field_type == 'numeric':
+            return round(float(value), 4)
+        if field_type in ('integer', 'enum'):
+            return int(value)
+    except (TypeError, ValueError):
+        pass
+    
+    # Text: numbers stored in text-ish columns compare by their plain form
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        number = float(value)
+        value = int(number) if number.is_integer() else number
+    text = str(value).strip()
+    return text or None
+
+def get_flat_columns_from_db(db_columns):
+    """
+    Retrieve name, slug and the requested columns from the flats table.
+    Columns missing from the live schema are skipped and returned separately.
+    """
+    try:
+        conn = connect_db()
+        cursor = conn.cursor()
+        
+        cursor.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'flats'
+        """)
+        existing = {row[0] for row in cursor.fetchall()}
+        
+        selected = [col for col in db_columns if col in existing and col not in ('name', 'slug')]
+        missing = [col for col in db_columns if col not in existing]
+        
+        query = f"""
+        SELECT name, slug, {', '.join(selected) if selected else 'NULL AS _none'}
+        FROM flats
+        WHERE name IS NOT NULL
+        """
+        cursor.execute(query)
+        columns = [desc[0] for desc in cursor.description]
+        db_df = pd.DataFrame(cursor.fetchall(), columns=columns)
+        
+        logger.info(f"Retrieved {len(db_df)} records with {len(selected)} audited columns from database")
+        if missing:
+            logger.warning(f"Mapped columns not in flats table (skipped): {missing}")
+        
+        return db_df, missing
+        
+    except Exception as e:
+        logger.error(f"Error retrieving data from database: {e}")
+        raise
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        if 'conn' in locals():
+            conn.close()
+
+def read_excel_all_columns(excel_file_path):
+    """Read the flat master sheet keeping every column (for the full-schema audit)"""
+    df, header_row = read_excel_with_header(excel_file_path, 'Flat Master Name')
+    if df is None:
+        logger.error("Could not find proper column headers in Excel file")
+        return None
+    
+    logger.info(f"Excel file loaded with {len(df)} rows and {len(df.columns)} columns (header at row {header_row})")
+    
+    df = df.dropna(subset=['Flat Master Name'])
+    df = df[df['Flat Master Name'].astype(str).str.strip() != '']
+    
+    logger.info(f"After filtering, {len(df)} rows with valid names")
+    return df
+
+# Per-field codes in the mismatch matrix
+MATCH, VALUE_MISMATCH, MISSING_IN_DB, MISSING_IN_EXCEL = 0, 1, 2, 3
+
+def compare_all_fields(excel_df, db_df, specs):
+    """
+    Compare every spec'd column between Excel and DB in one vectorised pass.
+    Returns (mismatches, matrix): the long-form report rows, and a per-flat
+    per-field matrix of codes (0 match, 1 value mismatch, 2 missing in DB,
+    3 missing in Excel).
+    """
+    logger.info(f"Comparing {len(specs)} mapped columns...")
+    
+    # Neutral column names so Excel headers cannot collide with DB columns
+    excel_names = {spec['excel_column']: f"excel__{i}" for i, spec in enumerate(specs)}
+    left = excel_df[['Flat Master Name'] + list(excel_names)].rename(
+        columns={'Flat Master Name': 'name', **excel_names}
+    ).reset_index(drop=True)
+    left['_row'] = np.arange(len(left))
+    
+    right = db_df.drop_duplicates(subset=['name'], keep='last').astype(object)
+    df = left.merge(right, on='name', how='left', indicator=True, sort=False)
+    
+    missing_mask = (df['_merge'] == 'left_only').to_numpy()
+    found = df.loc[~missing_mask].copy()
+    
+    slug_present = found['slug'].notna() & (found['slug'].astype(str) != '')
+    found['flat_slug'] = found['slug'].where(
+        slug_present, found['name'].astype(str).str.lower().str.strip()
+    )
+    
+    records = [pd.DataFrame({
+        'flat_name': df.loc[missing_mask, 'name'],
+        'slug': 'NOT_FOUND_IN_DB',
+        'issue_type': 'MISSING_FROM_DB',
+        'excel_value': 'N/A',
+        'db_value': 'N/A',
+        'details': 'Flat not found in database',
+        '_row': df.loc[missing_mask, '_row'],
+        '_field': -1
+    })]
+    matrix = pd.DataFrame({'name': found['name'], 'slug': found['flat_slug']})
+    
+    for field_order, spec in enumerate(specs):
+        db_column = spec['db_column']
+        field_type = spec['field_type']
+        if db_column not in found.columns:
+            continue
+        
+        excel_raw = found[excel_names[spec['excel_column']]]
+        db_raw = found[db_column]
+        
+        excel_canon = map_normalized(excel_raw, lambda value: canonical_value(
+            clean_data_value(excel_cell_to_text(value), field_type, db_column), field_type
+        ))
+        db_canon = map_normalized(db_raw, lambda value: canonical_value(value, field_type))
+        
+        has_excel = excel_canon.notna()
+        has_db = db_canon.notna()
+        value_mask = has_excel & has_db & (excel_canon != db_canon)
+        missing_db_mask = has_excel & ~has_db
+        missing_excel_mask = ~has_excel & has_db
+        
+        matrix[db_column] = np.select(
+            [value_mask, missing_db_mask, missing_excel_mask],
+            [VALUE_MISMATCH, MISSING_IN_DB, MISSING_IN_EXCEL],
+            default=MATCH
+        ).astype(np.int8)
+        
+        if not (value_mask | missing_db_mask | missing_excel_mask).any():
+            continue
+        
+        excel_str = excel_raw.astype(str)
+        db_str = db_raw.astype(str)
+        issue_prefix = db_column.upper()
+        for mask, suffix in [(value_mask, 'MISMATCH'), (missing_db_mask, 'MISSING_IN_DB'),
+                             (missing_excel_mask, 'MISSING_IN_EXCEL')]:
+            if mask.any():
+                records.append(build_mismatch_records(
+                    found, mask, f"{issue_prefix}_{suffix}",
+                    excel_raw, db_raw,
+                    f"{spec['excel_column']} -> {db_column}: Excel: " + excel_str + ', DB: ' + db_str,
+                    field_order
+                ))
+    
+    report_df = pd.concat(records, ignore_index=True)
+    report_df = report_df.sort_values(['_row', '_field'], kind='mergesort')
+    mismatches = report_df.drop(columns=['_row', '_field']).to_dict('records')
+    
+    logger.info(f"Full-schema comparison completed. Found {len(mismatches)} mismatches.")
+    return mismatches, matrix
+
+def save_mismatch_matrix(matrix, output_file='flat_field_mismatch_matrix.csv'):
+    """Save the per-field mismatch matrix (flats with at least one issue) and log per-field counts"""
+    field_columns = [col for col in matrix.columns if col not in ('name', 'slug')]
+    if not field_columns:
+        logger.info("No fields compared")
+        return
+    
+    codes = matrix[field_columns]
+    with_issues = matrix[(codes != MATCH).any(axis=1)]
+    with_issues.to_csv(output_file, index=False)
+    
+    logger.info(f"\n{'='*60}")
+    logger.info("PER-FIELD MISMATCH COUNTS (mismatch / missing in DB / missing in Excel)")
+    logger.info(f"{'='*60}")
+    counts = pd.DataFrame({
+        'mismatch': (codes == VALUE_MISMATCH).sum(),
+        'missing_in_db': (codes == MISSING_IN_DB).sum(),
+        'missing_in_excel': (codes == MISSING_IN_EXCEL).sum()
+    })
+    counts = counts[(counts.sum(axis=1)) > 0].sort_values('mismatch', ascending=False)
+    for field, row in counts.iterrows():
+        logger.info(f"{field}: {row['mismatch']} / {row['missing_in_db']} / {row['missing_in_excel']}")
+    
+    logger.info(f"\nMismatch matrix ({len(with_issues)} flats, codes: "
+                f"{VALUE_MISMATCH}=mismatch, {MISSING_IN_DB}=missing in DB, "
+                f"{MISSING_IN_EXCEL}=missing in Excel) saved to: {output_file}")
+
 def generate_report(mismatches, output_file='flat_mismatches_report.csv'):
     """Generate a detailed report of mismatches"""
     try:
@@ -436,15 +726,17 @@ def find_missing_flat_names(excel_df, db_df, output_file='missing_flat_names.txt
 def main():
     """Main function"""
     if len(sys.argv) < 2 or len(sys.argv) > 3:
-        print("Usage: python flat_data_comparison.py <excel_file_path> [--missing-only]")
+        print("Usage: python flat_data_comparison.py <excel_file_path> [--missing-only | --all-fields]")
         print("Example: python flat_data_comparison.py Flat_data_before_live.xlsx")
         print("Example: python flat_data_comparison.py Flat_data_before_live.xlsx --missing-only")
         print("\nOptions:")
         print("  --missing-only    Only show Flat Master Names missing from database")
+        print("  --all-fields      Audit every column mapped by csv_to_flats_insert, not just the five status fields")
         sys.exit(1)
     
     excel_file_path = sys.argv[1]
     missing_only = len(sys.argv) == 3 and sys.argv[2] == '--missing-only'
+    all_fields = len(sys.argv) == 3 and sys.argv[2] == '--all-fields'
     
     if not os.path.exists(excel_file_path):
         logger.error(f"Excel file not found: {excel_file_path}")
@@ -461,6 +753,30 @@ def main():
         logger.error("Please ensure your .env file contains all required database connection details")
         sys.exit(1)
     
+    if all_fields:
+        try:
+            logger.info("Reading Excel file...")
+            excel_df = read_excel_all_columns(excel_file_path)
+            if excel_df is None:
+                sys.exit(1)
+            
+            specs = build_column_specs(excel_df.columns)
+            logger.info(f"Auditing {len(specs)} mapped columns")
+            
+            logger.info("Retrieving database data...")
+            db_df, missing_db_columns = get_flat_columns_from_db([spec['db_column'] for spec in specs])
+            specs = [spec for spec in specs if spec['db_column'] not in missing_db_columns]
+            
+            mismatches, matrix = compare_all_fields(excel_df, db_df, specs)
+            save_mismatch_matrix(matrix)
+            generate_report(mismatches, output_file='flat_full_mismatches_report.csv')
+            
+            logger.info("Full-schema comparison completed successfully!")
+        except Exception as e:
+            logger.error(f"Error during full-schema comparison: {e}")
+            sys.exit(1)
+        return
+    
     try:
         # Read Excel data
         logger.info("Reading Excel file...")
@@ -14,6 +14,8 @@ import logging
 import xml.etree.ElementTree as ET
 from xml.dom import minidom
 
+import meta_templates
+
 # Load environment variables
 load_dotenv()
 
@@ -21,6 +23,9 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Property whose flat images go into the sitemap
+SITEMAP_PROPERTY_ID = 1142
+
 def connect_db():
     """Create database connection using environment variables"""
     try:
@@ -43,8 +48,8 @@ def fetch_images_from_flats():
         cursor = conn.cursor()
         
         # Query as requested: select images from flats
-        query = "select name, images from flats where property_id=1142;"
-        cursor.execute(query)
+        query = "select name, images from flats where property_id=%s;"
+        cursor.execute(query, (SITEMAP_PROPERTY_ID,))
         rows = cursor.fetchall()
         
         logger.info(f"Fetched {len(rows)} records from flats table")
@@ -128,6 +133,10 @@ def generate_xml_sitemap(flats_with_images):
         priority_elem = ET.SubElement(url_elem, 'priority')
         priority_elem.text = '0.5'
         
+        # Title and caption are the same for every image of the flat
+        image_title = meta_templates.render('image_title', flat_name=flat_name, property_id=SITEMAP_PROPERTY_ID)
+        image_caption = meta_templates.render('image_caption', flat_name=flat_name, property_id=SITEMAP_PROPERTY_ID)
+        
         # Add all images for this flat
         for image_name in image_names:
             if not image_name:  # Skip empty image names
@@ -142,11 +151,11 @@ def generate_xml_sitemap(flats_with_images):
             
             # Add image title
             image_title_elem = ET.SubElement(image_elem, 'image:title')
-            image_title_elem.text = f"{flat_name}: Fully furnished 1BHK Flat for rent in HSR Layout | Kots Bilva"
+            image_title_elem.text = image_title
             
             # Add image caption
             image_caption_elem = ET.SubElement(image_elem, 'image:caption')
-            image_caption_elem.text = f"Book Now: Kots Bilva {flat_name} is a furnished 1 BHK rental flat in HSR Layout at Kots Bilva. Book now and enjoy premium living with high-speed internet and world-class amenities."
+            image_caption_elem.text = image_caption
     
     # Convert to string with proper formatting
     rough_string = ET.tostring(urlset, encoding='unicode')
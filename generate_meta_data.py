@@ -11,6 +11,9 @@ from datetime import datetime
 from dotenv import load_dotenv
 import logging
 
+from batch_update import batch_update
+import meta_templates
+
 # Load environment variables
 load_dotenv()
 
@@ -25,6 +28,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Properties processed when no --property/--all-properties flag is given
+DEFAULT_PROPERTY_IDS = [1169]
+
 def connect_db():
     """Create database connection using environment variables"""
     try:
@@ -53,43 +59,52 @@ def clean_string_value(value):
     except Exception:
         return None
 
-def get_flats_data(conn):
+def get_flats_data(conn, property_ids=None, include_existing=False):
     """
     Fetch flats data from database
+    property_ids limits the fetch to those properties (None = all properties);
+    include_existing also returns flats that already have meta data.
     Returns list of dictionaries with flat information
     """
     try:
         cursor = conn.cursor()
-        
+
+        conditions = ["flat_number IS NOT NULL AND flat_number != ''"]
+        params = []
+        if property_ids is not None:
+            conditions.append("property_id = ANY(%s)")
+            params.append(list(property_ids))
+        if not include_existing:
+            conditions.append("meta_title IS NULL AND meta_description IS NULL")
+
         # Get flats with their current meta data and related information
-        query = """
-            SELECT 
-                id, 
-                flat_number, 
+        query = f"""
+            SELECT
+                id,
+                property_id,
+                flat_number,
                 name,
-                meta_title, 
+                meta_title,
                 meta_description,
                 flat_mailing_city,
                 flat_mailing_state,
                 property_master,
                 flat_category
-            FROM flats 
-            WHERE property_id = 1169 
-              AND meta_title IS NULL 
-              AND meta_description IS NULL
-              AND flat_number IS NOT NULL AND flat_number != ''
-            ORDER BY flat_number
+            FROM flats
+            WHERE {' AND '.join(conditions)}
+            ORDER BY property_id, flat_number
         """
-        
-        cursor.execute(query)
+
+        cursor.execute(query, params)
         results = cursor.fetchall()
-        
+
         flats_data = []
         for row in results:
-            flat_id, flat_number, name, current_meta_title, current_meta_desc, city, state, property_master, flat_category = row
-            
+            flat_id, property_id, flat_number, name, current_meta_title, current_meta_desc, city, state, property_master, flat_category = row
+
             flats_data.append({
                 'id': flat_id,
+                'property_id': property_id,
                 'flat_number': clean_string_value(flat_number),
                 'name': clean_string_value(name),
                 'current_meta_title': clean_string_value(current_meta_title),
@@ -99,26 +114,39 @@ def get_flats_data(conn):
                 'property_master': clean_string_value(property_master) or 'Kots Rive',
                 'flat_category': clean_string_value(flat_category) or 'Studio'
             })
-        
+
         cursor.close()
-        logger.info(f"Found {len(flats_data)} flats with flat_number data for property_id 1169")
-        
+        logger.info(f"Found {len(flats_data)} flats with flat_number data for {describe_property_filter(property_ids)}")
+
         return flats_data
-        
+
     except Exception as e:
         logger.error(f"Error fetching flats data: {e}")
         return []
 
+def describe_property_filter(property_ids):
+    """Human readable form of a property filter for log messages"""
+    if property_ids is None:
+        return "all properties"
+    return f"property_id {', '.join(str(p) for p in property_ids)}"
+
+def describe_flat_filter(property_ids, include_existing=False):
+    """Human readable form of the flats selected by get_flats_data"""
+    description = f"flats with flat_number data for {describe_property_filter(property_ids)}"
+    if not include_existing:
+        description += " where meta data is NULL"
+    return description
+
 def determine_flat_category(flat_number, existing_category):
     """
     Determine flat category based on flat_number or existing category
     """
     if existing_category and existing_category.lower() not in ['null', 'none', '']:
         return existing_category
-    
+
     # Try to determine from flat_number (though this is less reliable)
     flat_number_lower = flat_number.lower() if flat_number else ''
-    
+
     if any(keyword in flat_number_lower for keyword in ['studio', '1rk', '1 rk']):
         return 'Studio'
     elif any(keyword in flat_number_lower for keyword in ['1bhk', '1 bhk', '1-bhk']):
@@ -130,161 +158,113 @@ def determine_flat_category(flat_number, existing_category):
     else:
         return 'Studio'  # Default fallback
 
-def generate_meta_title(flat_number, flat_category, city, property_master):
+def generate_meta_title(flat_number, flat_category, city, property_master, property_id=None):
     """
-    Generate meta title based on the pattern:
+    Generate meta title from the templates registered in meta_templates.py.
+    The default pattern is:
     {flat_number}: Fully Furnished {flat_category} Flat in {city} | {property_master}
     """
     try:
-        # Clean inputs
-        flat_number = flat_number or 'A601'
-        flat_category = flat_category or 'Studio'
-        city = city or 'Koramangala'
-        property_master = property_master or 'Kots Rive'
-        
-        # Generate meta title
-        # meta_title = f"{flat_number}: Fully Furnished {flat_category} Flat in {city} | {property_master}"
-        meta_title = f"{flat_number}:  Fully furnished 1 BHK flat in Whitefield | Kots Bien"
-        
-        # Ensure it's not too long (recommended max 60 characters for SEO)
-        if len(meta_title) > 60:
-            # Try shorter version
-            # meta_title = f"{flat_number}: {flat_category} Flat in {city} | {property_master}"
-            meta_title = f"{flat_number}:  Fully furnished 1 BHK flat in Whitefield | Kots Bien"
-
-            
-        return meta_title
-        
+        # Recommended max 60 characters for SEO (see meta_templates.MAX_LENGTHS)
+        return meta_templates.render(
+            'title', flat_number=flat_number, flat_category=flat_category,
+            city=city, property_master=property_master, property_id=property_id
+        )
+
     except Exception as e:
         logger.warning(f"Error generating meta title for {flat_number}: {e}")
         return f"{flat_number}: Fully Furnished Studio Flat in Koramangala | Kots Rive"
 
-def generate_meta_description(flat_number, flat_category, city, property_master):
+def generate_meta_description(flat_number, flat_category, city, property_master, property_id=None):
     """
-    Generate meta description based on the pattern:
-    {flat_number} is a fully furnished {flat_category} flat for rent in {city} at {property_master}. 
+    Generate meta description from the templates registered in meta_templates.py.
+    The default pattern is:
+    {flat_number} is a fully furnished {flat_category} flat for rent in {city} at {property_master}.
     Book now with no Hidden cost, hassle free living near Maruti Nagar for men, women and couples
     """
     try:
-        # Clean inputs
-        flat_number = flat_number or 'A601'
-        flat_category = flat_category.lower() if flat_category else 'studio'
-        city = city or 'Koramangala'
-        property_master = property_master or 'Kots Rive'
-        
-        # Generate meta description
-        # meta_description = (
-        #     f"{flat_number} is a fully furnished {flat_category} flat for rent in {city} at {property_master}. "
-        #     f"Book now with no Hidden cost, hassle free living near Maruti Nagar for men, women and couples"
-        # )
-        meta_description = (
-            f"{flat_number} is a fully furnished 1 BHK rental flat in Siddapura, Whitefield. Book now and experience premium living with world class amenities at Kots Bien."
+        # Recommended max 160 characters for SEO (see meta_templates.MAX_LENGTHS)
+        return meta_templates.render(
+            'description', flat_number=flat_number, flat_category=flat_category,
+            city=city, property_master=property_master, property_id=property_id
         )
-        
-        # Ensure it's not too long (recommended max 160 characters for SEO)
-        if len(meta_description) > 160:
-            # Try shorter version
-            # meta_description = (
-            #     f"{flat_number} is a fully furnished {flat_category} flat for rent in {city} at {property_master}. "
-            #     f"Book now with no hidden cost, hassle free living for men, women and couples"
-            # )
-            meta_description = (
-                f"{flat_number} is a fully furnished 1 BHK rental flat in Siddapura, Whitefield. Book now and experience premium living with world class amenities at Kots Bien."
-            )
-        
-        return meta_description
-        
+
     except Exception as e:
         logger.warning(f"Error generating meta description for {flat_number}: {e}")
         return f"{flat_number} is a fully furnished studio flat for rent in Koramangala at Kots Rive. Book now with no Hidden cost, hassle free living near Maruti Nagar for men, women and couples"
 
-def update_meta_data(conn, flats_data, force_update=False):
+def render_meta_data(flats_data):
+    """
+    Render meta_title and meta_description for every flat in one pass.
+    Returns a list of dicts with the flat's current and new meta data.
+    """
+    rendered = []
+
+    for flat_data in flats_data:
+        flat_number = flat_data['flat_number']
+        if not flat_number:
+            continue
+
+        flat_category = determine_flat_category(flat_number, flat_data['flat_category'])
+        args = (flat_number, flat_category, flat_data['city'], flat_data['property_master'])
+
+        rendered.append({
+            'id': flat_data['id'],
+            'property_id': flat_data.get('property_id'),
+            'flat_number': flat_number,
+            'current_meta_title': flat_data['current_meta_title'],
+            'current_meta_description': flat_data['current_meta_description'],
+            'meta_title': generate_meta_title(*args, property_id=flat_data.get('property_id')),
+            'meta_description': generate_meta_description(*args, property_id=flat_data.get('property_id'))
+        })
+
+    return rendered
+
+def is_unchanged(item):
+    """True if the rendered meta data matches what the flat already has"""
+    return (item['current_meta_title'] == item['meta_title'] and
+            item['current_meta_description'] == item['meta_description'])
+
+def update_meta_data(conn, flats_data, force_update=False, chunk_size=500):
     """
     Update meta_title and meta_description for flats
+    Renders everything up front and writes one batched UPDATE per chunk.
     """
     stats = {
-        'processed': 0,
+        'processed': len(flats_data),
         'updated': 0,
         'skipped': 0,
         'errors': 0
     }
-    
+
     try:
-        cursor = conn.cursor()
-        
-        # Prepare update query
-        update_query = """
-            UPDATE flats 
-            SET meta_title = %s, meta_description = %s, modified_date = %s 
-            WHERE id = %s
-        """
-        
-        current_time = datetime.now()
-        
-        for flat_data in flats_data:
-            try:
-                stats['processed'] += 1
-                flat_id = flat_data['id']
-                flat_number = flat_data['flat_number']
-                
-                if not flat_number:
-                    stats['skipped'] += 1
-                    logger.debug(f"Skipping flat ID {flat_id}: No flat_number")
-                    continue
-                
-                # Determine flat category
-                flat_category = determine_flat_category(flat_number, flat_data['flat_category'])
-                
-                # Generate new meta data
-                new_meta_title = generate_meta_title(
-                    flat_number, 
-                    flat_category, 
-                    flat_data['city'], 
-                    flat_data['property_master']
-                )
-                
-                new_meta_description = generate_meta_description(
-                    flat_number, 
-                    flat_category, 
-                    flat_data['city'], 
-                    flat_data['property_master']
-                )
-                
-                # Check if update is needed
-                current_meta_title = flat_data['current_meta_title']
-                current_meta_desc = flat_data['current_meta_description']
-                
-                if not force_update:
-                    if (current_meta_title == new_meta_title and 
-                        current_meta_desc == new_meta_description):
-                        stats['skipped'] += 1
-                        logger.debug(f"Skipping flat {flat_number}: Meta data unchanged")
-                        continue
-                
-                # Perform the update
-                cursor.execute(update_query, (new_meta_title, new_meta_description, current_time, flat_id))
-                
-                if cursor.rowcount > 0:
-                    stats['updated'] += 1
-                    logger.info(f"Updated meta data for flat {flat_number} (ID: {flat_id})")
-                    logger.debug(f"  Meta Title: {new_meta_title}")
-                    logger.debug(f"  Meta Description: {new_meta_description}")
-                else:
-                    stats['errors'] += 1
-                    logger.warning(f"No rows updated for flat {flat_number} (ID: {flat_id})")
-                
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"Error updating flat {flat_data.get('flat_number', 'Unknown')}: {e}")
-                conn.rollback()  # Rollback this transaction
-                continue
-        
+        rendered = render_meta_data(flats_data)
+        stats['skipped'] += len(flats_data) - len(rendered)  # no flat_number
+
+        if not force_update:
+            to_update = [item for item in rendered if not is_unchanged(item)]
+            stats['skipped'] += len(rendered) - len(to_update)
+        else:
+            to_update = rendered
+
+        rows = [(item['id'], item['meta_title'], item['meta_description']) for item in to_update]
+
+        result = batch_update(
+            conn, 'flats', 'id', ['meta_title', 'meta_description'], rows,
+            extra_assignments={'modified_date': datetime.now()},
+            only_changed=not force_update,
+            chunk_size=chunk_size
+        )
+
         # Commit all successful updates
         conn.commit()
-        cursor.close()
-        
+
+        stats['updated'] = len(result['updated'])
+        stats['skipped'] += result['unchanged']
+        stats['errors'] = len(result['failed'])
+
         return stats
-        
+
     except Exception as e:
         logger.error(f"Error in update process: {e}")
         conn.rollback()
@@ -298,35 +278,38 @@ def preview_changes(flats_data, limit=5):
     logger.info("=" * 80)
     logger.info("PREVIEW OF CHANGES (First {} records)".format(min(limit, len(flats_data))))
     logger.info("=" * 80)
-    
-    for i, flat_data in enumerate(flats_data[:limit]):
-        flat_number = flat_data['flat_number']
-        if not flat_number:
-            continue
-            
-        flat_category = determine_flat_category(flat_number, flat_data['flat_category'])
-        
-        new_meta_title = generate_meta_title(
-            flat_number, 
-            flat_category, 
-            flat_data['city'], 
-            flat_data['property_master']
-        )
-        
-        new_meta_description = generate_meta_description(
-            flat_number, 
-            flat_category, 
-            flat_data['city'], 
-            flat_data['property_master']
-        )
-        
-        logger.info(f"\nFlat Number: {flat_number}")
-        logger.info(f"Current Meta Title: {flat_data['current_meta_title'] or 'None'}")
-        logger.info(f"New Meta Title: {new_meta_title}")
-        logger.info(f"Current Meta Description: {flat_data['current_meta_description'] or 'None'}")
-        logger.info(f"New Meta Description: {new_meta_description}")
+
+    for item in render_meta_data(flats_data[:limit]):
+        logger.info(f"\nFlat Number: {item['flat_number']}")
+        logger.info(f"Current Meta Title: {item['current_meta_title'] or 'None'}")
+        logger.info(f"New Meta Title: {item['meta_title']}")
+        logger.info(f"Current Meta Description: {item['current_meta_description'] or 'None'}")
+        logger.info(f"New Meta Description: {item['meta_description']}")
         logger.info("-" * 40)
 
+def dry_run_diff(flats_data):
+    """
+    Log a diff of every flat whose meta data would change, without writing.
+    Returns the number of flats that would be updated.
+    """
+    rendered = render_meta_data(flats_data)
+    changed = [item for item in rendered if not is_unchanged(item)]
+
+    logger.info("=" * 80)
+    logger.info(f"DRY RUN: {len(changed)} of {len(rendered)} flats would change")
+    logger.info("=" * 80)
+
+    for item in changed:
+        logger.info(f"Flat {item['flat_number']} (ID: {item['id']}, property_id: {item['property_id']})")
+        for field in ('meta_title', 'meta_description'):
+            old_value = item[f'current_{field}']
+            new_value = item[field]
+            if old_value != new_value:
+                logger.info(f"  - {field}: {old_value or 'None'}")
+                logger.info(f"  + {field}: {new_value}")
+
+    return len(changed)
+
 def generate_report(stats, total_flats):
     """Generate a summary report of the update process"""
     
@@ -353,23 +336,41 @@ def main():
     # Parse command line arguments
     force_update = False
     preview_only = False
+    dry_run = False
+    property_ids = DEFAULT_PROPERTY_IDS
     
     if len(sys.argv) > 1:
         if '--force' in sys.argv:
             force_update = True
         if '--preview' in sys.argv:
             preview_only = True
+        if '--dry-run' in sys.argv:
+            dry_run = True
+        if '--all-properties' in sys.argv:
+            property_ids = None
+        for arg in sys.argv:
+            if arg.startswith('--property='):
+                try:
+                    property_ids = [int(p) for p in arg.split('=')[1].split(',') if p.strip()]
+                except ValueError:
+                    print(f"Invalid property id list: {arg}")
+                    sys.exit(1)
         if '--help' in sys.argv or '-h' in sys.argv:
-            print("Usage: python generate_meta_data.py [--force] [--preview]")
-            print("  --force   : Update all records even if meta data already exists")
-            print("  --preview : Show preview of changes without updating database")
-            print("  --help    : Show this help message")
+            print("Usage: python generate_meta_data.py [--property=ID[,ID...] | --all-properties] [--force] [--preview] [--dry-run]")
+            print("  --property=IDS   : Comma separated property ids to process (default: 1169)")
+            print("  --all-properties : Process flats of every property")
+            print("  --force          : Update all records even if meta data already exists")
+            print("  --preview        : Show preview of changes without updating database")
+            print("  --dry-run        : Show a diff of every flat that would change, without updating")
+            print("  --help           : Show this help message")
             sys.exit(0)
     
     logger.info("Starting meta data generation for flats...")
     logger.info(f"Log file: meta_data_generation.log")
     logger.info(f"Force update: {force_update}")
     logger.info(f"Preview only: {preview_only}")
+    logger.info(f"Dry run: {dry_run}")
+    logger.info(f"Properties: {describe_property_filter(property_ids)}")
     
     # Verify environment variables
     required_env_vars = ['DB_NAME', 'DB_USER', 'DB_PASSWORD', 'DB_HOST', 'DB_PORT']
@@ -391,12 +392,17 @@ def main():
     try:
         # Get flats data
         logger.info("Fetching flats data from database...")
-        flats_data = get_flats_data(conn)
+        flats_data = get_flats_data(conn, property_ids, include_existing=force_update)
         
         if not flats_data:
-            logger.error("No flats found with flat_number data for property_id 1169 where meta data is NULL. Exiting.")
+            logger.error(f"No {describe_flat_filter(property_ids, include_existing=force_update)} found. Exiting.")
             sys.exit(1)
         
+        if dry_run:
+            dry_run_diff(flats_data)
+            logger.info("Dry run - no changes made to database.")
+            sys.exit(0)
+        
         # Preview changes
         if preview_only or len(flats_data) > 0:
             preview_changes(flats_data, limit=10)
@@ -0,0 +1,23 @@
+"""
+Gunicorn settings for the Meta conversions service
+    gunicorn -c meta_conversions_gunicorn.py 'flask-meta-conversions:create_app()'
+
+Threaded workers suit this service: handlers only validate and queue events,
+and the slow Graph API calls happen on the dispatcher threads.
+"""
+
+import os
+
+bind = f"{os.getenv('META_WEB_HOST', '0.0.0.0')}:{os.getenv('META_WEB_PORT', '5000')}"
+workers = int(os.getenv('META_WEB_WORKERS', '2'))
+threads = int(os.getenv('META_WEB_THREADS', '8'))
+worker_class = 'gthread'
+timeout = int(os.getenv('META_WEB_TIMEOUT', '30'))
+graceful_timeout = 15  # lets each worker's dispatcher drain queued events
+keepalive = 5
+
+# create_app starts dispatcher threads, which do not survive fork: build the
+# app in each worker instead of in the master
+preload_app = False
+
+accesslog = os.getenv('META_WEB_ACCESS_LOG', '-')
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Load test harness for the Meta conversions service
+An asyncio load generator (keep-alive HTTP/1.1, no extra dependencies) that
+drives the tracking endpoints with a fixed number of concurrent virtual users
+and reports requests/sec and p50/p95/p99 latency per endpoint.
+
+With --spawn the service is started in a subprocess whose Graph API calls go
+to a local stub (meta_graph_stub.py) with configurable latency, so results are
+reproducible and show that endpoint latency does not follow Meta's latency.
+
+Usage:
+    # start gunicorn (or the dev server if gunicorn is missing) against the stub
+    python meta_conversions_loadtest.py --spawn [--concurrency=50] [--duration=20] [--stub-latency=0.3]
+
+    # load an already running service
+    python meta_conversions_loadtest.py --url=http://127.0.0.1:5000 [--concurrency=50] [--duration=20]
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+from meta_graph_stub import start_stub_server
+
+ENDPOINTS = {
+    '/api/meta/track-page-view': lambda i: {
+        'user_data': {'em': f'visitor{i % 500}@example.com'},
+        'event_source_url': 'https://www.kots.world/bangalore/hsr/kots-bilva'
+    },
+    '/api/meta/track-lead': lambda i: {
+        'user_data': {'em': f'lead{i % 500}@example.com', 'ph': '+91 98765 43210'},
+        'content_name': 'Enquiry form'
+    },
+    '/api/meta/track-purchase': lambda i: {
+        'user_data': {'em': f'buyer{i % 500}@example.com'},
+        'value': 25000,
+        'order_id': f'order_{i}'
+    },
+    '/api/meta/track-conversion': lambda i: {
+        'event_name': 'Contact',
+        'event_id': f'loadtest-{i}',
+        'user_data': {'em': f'contact{i % 500}@example.com', 'fn': 'Test', 'ln': 'User'}
+    }
+}
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+class Connection:
+    """Minimal keep-alive HTTP/1.1 client connection"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+    async def post_json(self, path, body):
+        """POST a JSON body; returns the status code"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        data = json.dumps(body).encode('utf-8')
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"User-Agent: meta-conversions-loadtest\r\n"
+            f"\r\n".encode('ascii') + data
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+
+        content_length = None
+        keep_alive = status_line.startswith(b'HTTP/1.1')
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                content_length = int(value.strip())
+            elif name == 'connection':
+                keep_alive = value.strip().lower() != 'close'
+
+        if content_length is not None:
+            await self.reader.readexactly(content_length)
+        else:
+            await self.reader.read()
+            keep_alive = False
+
+        if not keep_alive:
+            await self.close()
+        return status
+
+async def virtual_user(user_id, host, port, deadline, results, counter):
+    """Send requests round-robin over the endpoints until the deadline"""
+    connection = Connection(host, port)
+    paths = list(ENDPOINTS)
+
+    while time.monotonic() < deadline:
+        counter[0] += 1
+        i = counter[0]
+        path = paths[i % len(paths)]
+        start = time.perf_counter()
+        try:
+            status = await connection.post_json(path, ENDPOINTS[path](i))
+            ok = 200 <= status < 300
+        except Exception:
+            ok = False
+            await connection.close()
+        results[path].append((time.perf_counter() - start, ok))
+
+    await connection.close()
+
+async def run_load(url, concurrency, duration):
+    parsed = urlparse(url)
+    results = {path: [] for path in ENDPOINTS}
+    counter = [0]
+    deadline = time.monotonic() + duration
+
+    await asyncio.gather(*[
+        virtual_user(user_id, parsed.hostname, parsed.port or 80, deadline, results, counter)
+        for user_id in range(concurrency)
+    ])
+    return results
+
+def print_report(results, duration):
+    print()
+    print(f"{'endpoint':32} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    print("-" * 96)
+
+    all_latencies = []
+    total_requests = total_errors = 0
+    for path, samples in results.items():
+        latencies = sorted(latency * 1000 for latency, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        all_latencies.extend(latencies)
+        total_requests += len(samples)
+        total_errors += errors
+        print(f"{path:32} {len(samples):>9} {errors:>7} {len(samples) / duration:>9.1f} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+              f"{percentile(latencies, 99):>8.1f} {(latencies[-1] if latencies else 0):>8.1f}")
+
+    all_latencies.sort()
+    print("-" * 96)
+    print(f"{'all':32} {total_requests:>9} {total_errors:>7} {total_requests / duration:>9.1f} "
+          f"{percentile(all_latencies, 50):>8.1f} {percentile(all_latencies, 95):>8.1f} "
+          f"{percentile(all_latencies, 99):>8.1f} {(all_latencies[-1] if all_latencies else 0):>8.1f}")
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/readyz", timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+def spawn_service(port, stub_url, journal_path):
+    """Start the service under gunicorn, or the threaded dev server without it"""
+    env = dict(os.environ)
+    env.update({
+        'META_GRAPH_URL': stub_url,
+        'META_JOURNAL_PATH': journal_path,
+        'META_WEB_HOST': '127.0.0.1',
+        'META_WEB_PORT': str(port),
+        'META_WEB_ACCESS_LOG': '/dev/null'
+    })
+
+    stderr = None
+    if importlib.util.find_spec('gunicorn'):
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'meta_conversions_gunicorn.py',
+                   'flask-meta-conversions:create_app()']
+    else:
+        print("gunicorn is not installed; using the Flask dev server (numbers are not representative)")
+        command = [sys.executable, 'flask-meta-conversions.py']
+        stderr = subprocess.DEVNULL  # the dev server logs every request
+
+    return subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=stderr,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def main():
+    url = None
+    spawn = '--spawn' in sys.argv
+    concurrency = 50
+    duration = 20.0
+    stub_latency = 0.3
+    port = 5055
+
+    for arg in sys.argv[1:]:
+        if arg.startswith('--url='):
+            url = arg.split('=', 1)[1].rstrip('/')
+        elif arg.startswith('--concurrency='):
+            concurrency = int(arg.split('=')[1])
+        elif arg.startswith('--duration='):
+            duration = float(arg.split('=')[1])
+        elif arg.startswith('--stub-latency='):
+            stub_latency = float(arg.split('=')[1])
+        elif arg.startswith('--port='):
+            port = int(arg.split('=')[1])
+
+    if not url and not spawn:
+        print(__doc__)
+        sys.exit(1)
+
+    stub = process = None
+    work_dir = tempfile.TemporaryDirectory()
+    try:
+        if spawn:
+            stub = start_stub_server(latency=stub_latency)
+            url = f"http://127.0.0.1:{port}"
+            process = spawn_service(port, stub.url, os.path.join(work_dir.name, 'journal.db'))
+            print(f"Meta stub at {stub.url} (latency {stub_latency}s), service at {url}")
+
+        if not wait_until_ready(url):
+            print(f"ERROR: {url}/readyz did not become ready")
+            sys.exit(1)
+
+        print(f"Running {concurrency} virtual users for {duration:.0f}s against {url} ...")
+        results = asyncio.run(run_load(url, concurrency, duration))
+        print_report(results, duration)
+
+    finally:
+        if process:
+            # SIGTERM lets the workers' dispatchers drain before exiting
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if stub:
+            stats = stub.state.snapshot()
+            print(f"\nMeta stub received {stats['events']} events in {stats['requests']} requests")
+            stub.shutdown()
+        work_dir.cleanup()
+
+if __name__ == "__main__":
+    main()
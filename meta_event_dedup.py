@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Deduplication of Meta conversion events on (event_name, event_id)
+Frontend retries and double-firing tags send the same event_id to the
+tracking endpoints more than once. The first request for a key claims it
+and stores the response it was given; repeats within the TTL get that
+cached response back and never reach the dispatcher or the Graph API.
+
+Two stores with the same interface:
+
+    MemoryDedupStore    per-process dict with TTL and a size cap
+    SQLiteDedupStore    a local SQLite file shared by every worker process
+                        on the host (gunicorn workers each have their own
+                        memory store, so duplicates spread across workers
+                        are only caught by this one)
+
+Any other shared store (e.g. Redis with SET NX EX) only needs claim(),
+release() and metrics().
+
+Events without an event_id are never deduplicated.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Meta deduplicates server events with the same event_name/event_id for 48 hours
+DEFAULT_TTL_SECONDS = 48 * 3600
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta_event_dedup (
+        dedup_key TEXT PRIMARY KEY,
+        result TEXT NOT NULL,
+        expires_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_meta_event_dedup_expires_at
+        ON meta_event_dedup (expires_at);
+"""
+
+class MemoryDedupStore:
+    """
+    In-process TTL store
+    Keys expire in insertion order (the TTL is fixed), so expired and
+    excess keys are evicted from the front of an OrderedDict.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=100000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._lock = threading.Lock()
+        self.stats = {'claimed': 0, 'duplicates': 0, 'evicted': 0}
+
+    def _evict(self, now):
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+            self.stats['evicted'] += 1
+
+    def claim(self, key, result):
+        """
+        Record result for key unless it is already known.
+        Returns None when the key was claimed now, or the cached result of
+        the earlier event.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self.stats['duplicates'] += 1
+                return entry[1]
+
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl_seconds, result)
+            self.stats['claimed'] += 1
+            self._evict(now)
+            return None
+
+    def release(self, key):
+        """Forget a key whose event was not accepted, so a retry can go through"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def metrics(self):
+        with self._lock:
+            return {**self.stats, 'backend': 'memory', 'entries': len(self._entries)}
+
+class SQLiteDedupStore:
+    """
+    TTL store in a local SQLite file (WAL mode)
+    The INSERT that claims a key is atomic across processes, so two workers
+    racing on the same event_id cannot both send it.
+    """
+
+    PURGE_INTERVAL = 600
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        self.stats = {'claimed': 0, 'duplicates': 0, 'evicted': 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def claim(self, key, result):
+        """Same contract as MemoryDedupStore.claim"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_purge > self.PURGE_INTERVAL:
+                cursor = self._conn.execute("DELETE FROM meta_event_dedup WHERE expires_at <= ?", (now,))
+                self.stats['evicted'] += cursor.rowcount
+                self._last_purge = now
+
+            # Claims the key if it is new or its entry has expired
+            cursor = self._conn.execute(
+                """
+                INSERT INTO meta_event_dedup (dedup_key, result, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT (dedup_key) DO UPDATE
+                    SET result = excluded.result, expires_at = excluded.expires_at
+                    WHERE meta_event_dedup.expires_at <= ?
+                """,
+                (key, json.dumps(result, separators=(',', ':')), now + self.ttl_seconds, now)
+            )
+            if cursor.rowcount:
+                self.stats['claimed'] += 1
+                return None
+
+            row = self._conn.execute(
+                "SELECT result FROM meta_event_dedup WHERE dedup_key = ?", (key,)
+            ).fetchone()
+            self.stats['duplicates'] += 1
+            return json.loads(row[0]) if row else result
+
+    def release(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM meta_event_dedup WHERE dedup_key = ?", (key,))
+
+    def metrics(self):
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM meta_event_dedup WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+            return {**self.stats, 'backend': 'sqlite', 'entries': entries}
+
+def create_dedup_store(backend, ttl_seconds=DEFAULT_TTL_SECONDS, path=None, max_entries=100000):
+    """Store for META_DEDUP_BACKEND: 'memory', 'sqlite' or 'none' (returns None)"""
+    if backend in ('', 'none'):
+        return None
+    if backend == 'memory':
+        return MemoryDedupStore(ttl_seconds, max_entries=max_entries)
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("The sqlite dedup backend needs a path")
+        return SQLiteDedupStore(path, ttl_seconds)
+    raise ValueError(f"Unknown dedup backend: {backend}")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Persistent journal for Meta conversion events
+An append-only SQLite table (WAL mode) that holds every accepted event until
+the Graph API has acknowledged it, so events survive process restarts and
+Meta outages.
+
+Events are stored already prepared (user data hashed, event_time fixed at
+acceptance), so no raw personal data is written to disk and replayed events
+keep their original time. Events with an event_id are deduplicated on
+(event_name, event_id) while their row is pending or sent (until sent rows
+are purged); resubmitting a failed event requeues its row.
+
+Row lifecycle: pending -> sent, or pending -> failed when Meta rejects the
+event as invalid (failed -> pending again on resubmission). Transient
+failures stay pending with a later next_attempt_at. Sent rows are purged
+after the retention period.
+Drainers claim rows with a short lease, so several processes (e.g. gunicorn
+workers) can share one journal without sending an event twice.
+
+META_JOURNAL_SYNC=FULL makes every append fsync (survives power loss);
+the default NORMAL is durable across process crashes and restarts.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta_events (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        dedup_key TEXT UNIQUE,
+        event_name TEXT,
+        event_id TEXT,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        enqueued_at REAL NOT NULL,
+        next_attempt_at REAL NOT NULL,
+        sent_at REAL,
+        last_error TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_meta_events_pending
+        ON meta_events (status, next_attempt_at, seq);
+    CREATE INDEX IF NOT EXISTS idx_meta_events_sent_at
+        ON meta_events (sent_at);
+"""
+
+# Window used for the throughput metric
+THROUGHPUT_WINDOW = 60
+
+def make_dedup_key(event):
+    """(event_name, event_id) key, or None when the event has no event_id"""
+    if event.get('event_id') in (None, ''):
+        return None
+    return f"{event.get('event_name')}:{event.get('event_id')}"
+
+class MetaEventJournal:
+    """
+    SQLite-backed event journal
+    One connection shared by request threads and the drainer, guarded by a lock.
+    """
+
+    def __init__(self, path, synchronous=None, retention_seconds=7 * 24 * 3600):
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={synchronous or os.getenv('META_JOURNAL_SYNC', 'NORMAL')}")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def append(self, event):
+        """
+        Persist a prepared event.
+        Returns its sequence number, or None if it duplicates a pending or
+        sent event. A resubmitted failed event replaces the parked payload
+        and is queued again under its old sequence number.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                INSERT INTO meta_events
+                    (dedup_key, event_name, event_id, payload, enqueued_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (dedup_key) DO UPDATE SET
+                    payload = excluded.payload,
+                    status = 'pending',
+                    attempts = 0,
+                    enqueued_at = excluded.enqueued_at,
+                    next_attempt_at = excluded.next_attempt_at,
+                    sent_at = NULL,
+                    last_error = NULL
+                WHERE meta_events.status = 'failed'
+                RETURNING seq
+                """,
+                (make_dedup_key(event), event.get('event_name'), event.get('event_id'),
+                 json.dumps(event, separators=(',', ':')), now, now)
+            ).fetchone()
+            return row[0] if row else None
+
+    def pending_count(self):
+        """Events not yet sent or parked, including ones leased by a drainer"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM meta_events WHERE status = 'pending'"
+            ).fetchone()[0]
+
+    def fetch_due(self, limit):
+        """Oldest pending events that are due for (re)sending: [(seq, event, attempts)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT seq, payload, attempts FROM meta_events
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY seq
+                LIMIT ?
+                """,
+                (time.time(), limit)
+            ).fetchall()
+        return [(seq, json.loads(payload), attempts) for seq, payload, attempts in rows]
+
+    def claim_due(self, limit, lease_seconds=60):
+        """
+        Like fetch_due, but leases the rows: their next_attempt_at is pushed
+        lease_seconds ahead in the same transaction, so other processes
+        sharing the journal skip them. If the claimer dies before marking
+        them, they become due again when the lease runs out.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                rows = self._conn.execute(
+                    """
+                    SELECT seq, payload, attempts FROM meta_events
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY seq
+                    LIMIT ?
+                    """,
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE meta_events SET next_attempt_at = ? WHERE seq = ?",
+                    [(now + lease_seconds, seq) for seq, _, _ in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [(seq, json.loads(payload), attempts) for seq, payload, attempts in rows]
+
+    def _update(self, query, params_list):
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(query, params_list)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def mark_sent(self, seqs):
+        now = time.time()
+        self._update(
+            "UPDATE meta_events SET status = 'sent', sent_at = ?, last_error = NULL WHERE seq = ?",
+            [(now, seq) for seq in seqs]
+        )
+
+    def mark_retry(self, seqs, delay, error):
+        """Keep events pending and retry them after delay seconds"""
+        next_attempt_at = time.time() + delay
+        self._update(
+            """
+            UPDATE meta_events
+            SET attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+            WHERE seq = ?
+            """,
+            [(next_attempt_at, str(error)[:500], seq) for seq in seqs]
+        )
+
+    def mark_failed(self, seqs, error):
+        """Park events Meta rejected as invalid; they are kept for inspection"""
+        self._update(
+            "UPDATE meta_events SET status = 'failed', attempts = attempts + 1, last_error = ? WHERE seq = ?",
+            [(str(error)[:500], seq) for seq in seqs]
+        )
+
+    def purge_sent(self):
+        """Delete sent events older than the retention period; returns rows removed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM meta_events WHERE status = 'sent' AND sent_at < ?",
+                (time.time() - self.retention_seconds,)
+            )
+            return cursor.rowcount
+
+    def metrics(self):
+        """Backlog, lag and throughput figures for monitoring"""
+        now = time.time()
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM meta_events GROUP BY status"
+            ).fetchall())
+            oldest_pending = self._conn.execute(
+                "SELECT MIN(enqueued_at) FROM meta_events WHERE status = 'pending'"
+            ).fetchone()[0]
+            sent_recently = self._conn.execute(
+                "SELECT COUNT(*) FROM meta_events WHERE status = 'sent' AND sent_at >= ?",
+                (now - THROUGHPUT_WINDOW,)
+            ).fetchone()[0]
+
+        return {
+            'pending': counts.get('pending', 0),
+            'sent': counts.get('sent', 0),
+            'failed': counts.get('failed', 0),
+            'lag_seconds': round(now - oldest_pending, 3) if oldest_pending else 0.0,
+            'throughput_per_second': round(sent_recently / THROUGHPUT_WINDOW, 3)
+        }
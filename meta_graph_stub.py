@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Meta Graph API /events endpoint
+Lets flask-meta-conversions.py be exercised without network access:
+point META_GRAPH_URL at the stub and every request and event it receives
+is counted instead of reaching Meta.
+
+The stub answers like the real endpoint ({"events_received": n, ...}),
+rejects a whole request with 400 if any event lacks event_name or
+event_time, and can inject latency and 500 errors. Setting
+state.access_token makes requests with any other token fail like an
+expired token (400, OAuthException code 190).
+
+Usage:
+    python meta_graph_stub.py [--port=8999] [--latency=0.2] [--fail-rate=0.1]
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubState:
+    """Counters and behaviour switches shared by the stub's handler threads"""
+
+    def __init__(self, latency=0.0, fail_rate=0.0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.access_token = None  # None accepts any token
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.events = 0
+        self.rejected = 0
+        self.failed = 0
+        self.event_ids = []
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'events': self.events,
+                'rejected': self.rejected,
+                'failed': self.failed
+            }
+
+class GraphStubHandler(BaseHTTPRequestHandler):
+    """Handles POST /{version}/{pixel_id}/events"""
+
+    def log_message(self, format, *args):
+        # Keep load tests quiet
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self._reply(200, self.server.state.snapshot())
+        return self._reply(404, {'error': {'message': 'Unknown path'}})
+
+    def do_POST(self):
+        state = self.server.state
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._reply(400, {'error': {'message': 'Invalid JSON', 'code': 100}})
+
+        if not self.path.rstrip('/').endswith('/events'):
+            return self._reply(404, {'error': {'message': 'Unknown path'}})
+
+        if state.latency:
+            time.sleep(state.latency)
+
+        with state.lock:
+            state.requests += 1
+
+        if state.access_token is not None and payload.get('access_token') != state.access_token:
+            return self._reply(400, {'error': {
+                'message': 'Error validating access token: Session has expired',
+                'type': 'OAuthException',
+                'code': 190,
+                'error_subcode': 463
+            }})
+
+        if state.fail_rate and random.random() < state.fail_rate:
+            with state.lock:
+                state.failed += 1
+            return self._reply(500, {'error': {'message': 'Injected failure', 'code': 2}})
+
+        events = payload.get('data') or []
+        if not isinstance(events, list) or len(events) > 1000:
+            return self._reply(400, {'error': {'message': 'data must be a list of at most 1000 events', 'code': 100}})
+
+        invalid = [i for i, event in enumerate(events) if not event.get('event_name') or not event.get('event_time')]
+        if invalid:
+            with state.lock:
+                state.rejected += 1
+            return self._reply(400, {'error': {
+                'message': f"Invalid parameter: event {invalid[0]} is missing event_name or event_time",
+                'code': 100
+            }})
+
+        with state.lock:
+            state.events += len(events)
+            state.event_ids.extend(event.get('event_id') for event in events)
+
+        return self._reply(200, {
+            'events_received': len(events),
+            'messages': [],
+            'fbtrace_id': uuid.uuid4().hex
+        })
+
+def start_stub_server(port=0, latency=0.0, fail_rate=0.0):
+    """
+    Start the stub on a background thread (port 0 = any free port).
+    Returns the server; its URL is server.url and its counters server.state.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), GraphStubHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency=latency, fail_rate=fail_rate)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    thread = threading.Thread(target=server.serve_forever, name='meta-graph-stub', daemon=True)
+    thread.start()
+    return server
+
+def main():
+    port = 8999
+    latency = 0.0
+    fail_rate = 0.0
+
+    for arg in sys.argv[1:]:
+        if arg.startswith('--port='):
+            port = int(arg.split('=')[1])
+        elif arg.startswith('--latency='):
+            latency = float(arg.split('=')[1])
+        elif arg.startswith('--fail-rate='):
+            fail_rate = float(arg.split('=')[1])
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), GraphStubHandler)
+    server.state = StubState(latency=latency, fail_rate=fail_rate)
+    print(f"Meta Graph API stub listening on http://127.0.0.1:{port} (latency={latency}s, fail_rate={fail_rate})")
+    print(f"Set META_GRAPH_URL=http://127.0.0.1:{port}; counters at /stats")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Stopped. {server.state.snapshot()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+SEO Metadata Template Registry
+Holds the templates for flat meta titles, meta descriptions and image sitemap
+titles/captions, registered per property, flat category and city.
+
+Templates are parsed once when registered. Most flats of a property share
+everything except the flat number/name, so the shared placeholders
+(flat_category, city, property_master) are rendered once per distinct
+combination and kept in an LRU cache as literal fragments; rendering a flat
+then only joins its flat_number/flat_name into those fragments.
+
+Lookup order, most specific first:
+    (property, category, city), (property, category), (property, city),
+    (property), (category, city), (category), (city), default
+"""
+
+import logging
+from functools import lru_cache
+from string import Formatter
+
+logger = logging.getLogger(__name__)
+
+# Placeholders that differ per flat and are substituted on every render
+ROW_FIELDS = {'flat_number', 'flat_name'}
+
+# Placeholders shared by many flats and pre-rendered into cached fragments
+SHARED_FIELDS = {'flat_category', 'flat_category_lower', 'city', 'property_master'}
+
+# Fallbacks for missing shared values
+DEFAULT_VALUES = {
+    'flat_number': 'A601',
+    'flat_name': 'A601',
+    'flat_category': 'Studio',
+    'city': 'Koramangala',
+    'property_master': 'Kots Rive'
+}
+
+# Max rendered length per template kind (None = no limit). When a kind has
+# several templates the first one that fits wins, else the last one is used.
+MAX_LENGTHS = {
+    'title': 60,
+    'description': 160,
+    'image_title': None,
+    'image_caption': None
+}
+
+# (kind, property_id, flat_category, city) -> list of compiled templates
+_registry = {}
+
+def compile_template(template):
+    """
+    Parse a template into (literal, field, conversion, format_spec) pieces.
+    Unknown placeholders raise ValueError here rather than per flat.
+    """
+    pieces = []
+    for literal, field_name, format_spec, conversion in Formatter().parse(template):
+        if field_name is not None and field_name not in ROW_FIELDS | SHARED_FIELDS:
+            raise ValueError(f"Unknown placeholder {{{field_name}}} in template: {template}")
+        pieces.append((literal, field_name, conversion, format_spec))
+    return tuple(pieces)
+
+def register_template(kind, templates, property_id=None, flat_category=None, city=None):
+    """
+    Register the templates for a kind ('title', 'description', 'image_title',
+    'image_caption') at the given scope; all scope arguments None = default.
+    templates is a string or a list tried in order against the kind's max length.
+    """
+    if kind not in MAX_LENGTHS:
+        raise ValueError(f"Unknown template kind: {kind}")
+    if isinstance(templates, str):
+        templates = [templates]
+
+    key = (kind, property_id, normalise_key(flat_category), normalise_key(city))
+    _registry[key] = [compile_template(template) for template in templates]
+
+    # Cached fragments may come from the templates this one replaces
+    get_fragments.cache_clear()
+
+def normalise_key(value):
+    """Case/whitespace-insensitive form of a category or city scope"""
+    return value.strip().lower() if value else None
+
+def lookup_templates(kind, property_id=None, flat_category=None, city=None):
+    """Most specific compiled templates registered for a flat"""
+    category = normalise_key(flat_category)
+    city = normalise_key(city)
+
+    for scope in (
+        (property_id, category, city),
+        (property_id, category, None),
+        (property_id, None, city),
+        (property_id, None, None),
+        (None, category, city),
+        (None, category, None),
+        (None, None, city),
+        (None, None, None)
+    ):
+        templates = _registry.get((kind,) + scope)
+        if templates is not None:
+            return templates
+
+    raise KeyError(f"No {kind} template registered")
+
+def render_fragments(pieces, shared_values):
+    """
+    Render the shared placeholders of a compiled template.
+    Returns (literal parts, row fields between them, fixed length).
+    """
+    parts = []
+    slots = []
+    current = []
+
+    for literal, field_name, conversion, format_spec in pieces:
+        current.append(literal)
+        if field_name is None:
+            continue
+        if field_name in ROW_FIELDS:
+            parts.append(''.join(current))
+            slots.append(field_name)
+            current = []
+        else:
+            value = shared_values[field_name]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            current.append(format(value, format_spec or ''))
+
+    parts.append(''.join(current))
+    return tuple(parts), tuple(slots), sum(len(part) for part in parts)
+
+@lru_cache(maxsize=4096)
+def get_fragments(kind, property_id, flat_category, city, property_master):
+    """Pre-rendered fragments of every template for one combination of shared inputs"""
+    shared_values = {
+        'flat_category': flat_category,
+        'flat_category_lower': flat_category.lower(),
+        'city': city,
+        'property_master': property_master
+    }
+    return tuple(
+        render_fragments(pieces, shared_values)
+        for pieces in lookup_templates(kind, property_id, flat_category, city)
+    )
+
+def render(kind, flat_number=None, flat_name=None, flat_category=None, city=None,
+           property_master=None, property_id=None):
+    """Render one template kind for a flat"""
+    row_values = {
+        'flat_number': flat_number or DEFAULT_VALUES['flat_number'],
+        'flat_name': flat_name or flat_number or DEFAULT_VALUES['flat_name']
+    }
+    fragments = get_fragments(
+        kind,
+        property_id,
+        flat_category or DEFAULT_VALUES['flat_category'],
+        city or DEFAULT_VALUES['city'],
+        property_master or DEFAULT_VALUES['property_master']
+    )
+    max_length = MAX_LENGTHS[kind]
+
+    for parts, slots, fixed_length in fragments:
+        if max_length is None or fixed_length + sum(len(row_values[s]) for s in slots) <= max_length:
+            break
+
+    text = parts[0]
+    for slot, part in zip(slots, parts[1:]):
+        text += row_values[slot] + part
+    return text
+
+# Default templates
+register_template('title', [
+    "{flat_number}: Fully Furnished {flat_category} Flat in {city} | {property_master}",
+    "{flat_number}: {flat_category} Flat in {city} | {property_master}"
+])
+register_template('description', [
+    "{flat_number} is a fully furnished {flat_category_lower} flat for rent in {city} at {property_master}. "
+    "Book now with no Hidden cost, hassle free living near Maruti Nagar for men, women and couples",
+    "{flat_number} is a fully furnished {flat_category_lower} flat for rent in {city} at {property_master}. "
+    "Book now with no hidden cost, hassle free living for men, women and couples"
+])
+register_template(
+    'image_title',
+    "{flat_name}: Fully furnished {flat_category} Flat for rent in {city} | {property_master}"
+)
+register_template(
+    'image_caption',
+    "Book Now: {property_master} {flat_name} is a furnished {flat_category} rental flat in {city} "
+    "at {property_master}. Book now and enjoy premium living with world-class amenities."
+)
+
+# Kots Bien
+register_template('title', "{flat_number}:  Fully furnished 1 BHK flat in Whitefield | Kots Bien", property_id=1169)
+register_template('description', (
+    "{flat_number} is a fully furnished 1 BHK rental flat in Siddapura, Whitefield. "
+    "Book now and experience premium living with world class amenities at Kots Bien."
+), property_id=1169)
+
+# Kots Bilva
+register_template('image_title', "{flat_name}: Fully furnished 1BHK Flat for rent in HSR Layout | Kots Bilva", property_id=1142)
+register_template('image_caption', (
+    "Book Now: Kots Bilva {flat_name} is a furnished 1 BHK rental flat in HSR Layout at Kots Bilva. "
+    "Book now and enjoy premium living with high-speed internet and world-class amenities."
+), property_id=1142)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Meta Conversions API user_data normalisation and hashing
+Each user_data field Meta expects hashed has one normaliser in
+FIELD_NORMALISERS, applied as Meta's customer information parameters
+specify before SHA-256:
+
+    em          trimmed, lowercase
+    ph          digits only, E.164 without '+': leading zeros dropped and the
+                default country code added to bare national numbers
+    fn, ln      lowercase, no punctuation (UTF-8 letters kept)
+    ct          lowercase, no punctuation or spaces
+    st, zp      lowercase, no punctuation or spaces (US ZIP+4 cut to 5 digits)
+    country     lowercase ISO 3166-1 alpha-2 code; a few common country
+                names are mapped through COUNTRY_NAMES
+    ge          'f' or 'm' (from f/m/female/male)
+    db          YYYYMMDD, parsed with DATE_OF_BIRTH_FORMATS
+    external_id trimmed, lowercase
+
+A value that cannot be normalised exactly (an unknown country, another
+gender value, an unparseable date) is dropped rather than hashed as a
+guess, since a wrong hash never matches. Values that already look like
+SHA-256 hex digests are passed through, and list values are hashed element
+by element. Hashes of hot identifiers
+(returning visitors send the same email/phone on every page view) are kept
+in a bounded LRU cache.
+"""
+
+import hashlib
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+# Country code added to phone numbers given without one (India by default)
+DEFAULT_PHONE_COUNTRY_CODE = os.getenv('META_DEFAULT_PHONE_COUNTRY_CODE', '91')
+
+# Length of a national number without country code for DEFAULT_PHONE_COUNTRY_CODE
+NATIONAL_PHONE_LENGTH = int(os.getenv('META_NATIONAL_PHONE_LENGTH', '10'))
+
+HASH_CACHE_SIZE = int(os.getenv('META_HASH_CACHE_SIZE', '100000'))
+
+SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+NON_DIGITS = re.compile(r'\D+')
+# Punctuation and symbols; \w keeps letters of any script
+PUNCTUATION = re.compile(r'[^\w\s]+|_')
+PUNCTUATION_AND_SPACES = re.compile(r'[^\w]+|_')
+US_ZIP_PLUS_FOUR = re.compile(r'^(\d{5})-?\d{4}$')
+
+# ISO 3166-1 alpha-2 codes
+ISO_COUNTRY_CODES = frozenset('''
+    ad ae af ag ai al am ao aq ar as at au aw ax az ba bb bd be bf bg bh bi bj bl bm bn bo bq br bs bt bv
+    bw by bz ca cc cd cf cg ch ci ck cl cm cn co cr cu cv cw cx cy cz de dj dk dm do dz ec ee eg eh er es
+    et fi fj fk fm fo fr ga gb gd ge gf gg gh gi gl gm gn gp gq gr gs gt gu gw gy hk hm hn hr ht hu id ie
+    il im in io iq ir is it je jm jo jp ke kg kh ki km kn kp kr kw ky kz la lb lc li lk lr ls lt lu lv ly
+    ma mc md me mf mg mh mk ml mm mn mo mp mq mr ms mt mu mv mw mx my mz na nc ne nf ng ni nl no np nr nu
+    nz om pa pe pf pg ph pk pl pm pn pr ps pt pw py qa re ro rs ru rw sa sb sc sd se sg sh si sj sk sl sm
+    sn so sr ss st sv sx sy sz tc td tf tg th tj tk tl tm tn to tr tt tv tw tz ua ug um us uy uz va vc ve
+    vg vi vn vu wf ws ye yt za zm zw
+'''.split())
+
+# Country names (lowercase, spaces and punctuation removed) seen in our
+# forms -> ISO code; anything else that is not an ISO code is dropped
+COUNTRY_NAMES = {
+    'india': 'in', 'ind': 'in', 'bharat': 'in',
+    'unitedstates': 'us', 'unitedstatesofamerica': 'us', 'usa': 'us', 'america': 'us',
+    'unitedkingdom': 'gb', 'uk': 'gb', 'greatbritain': 'gb', 'england': 'gb',
+    'unitedarabemirates': 'ae', 'uae': 'ae',
+    'canada': 'ca', 'australia': 'au', 'newzealand': 'nz', 'singapore': 'sg',
+    'germany': 'de', 'france': 'fr', 'ireland': 'ie', 'netherlands': 'nl',
+    'saudiarabia': 'sa', 'qatar': 'qa', 'kuwait': 'kw', 'oman': 'om', 'bahrain': 'bh',
+    'nepal': 'np', 'bangladesh': 'bd', 'srilanka': 'lk', 'bhutan': 'bt', 'maldives': 'mv',
+    'malaysia': 'my', 'southafrica': 'za'
+}
+
+GENDERS = {'f': 'f', 'female': 'f', 'm': 'm', 'male': 'm'}
+
+# Accepted date of birth formats; slashed and dotted dates are day first
+# (Indian convention), so '02/01/1990' is 2 January 1990
+DATE_OF_BIRTH_FORMATS = ['%Y-%m-%d', '%Y%m%d', '%Y/%m/%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y']
+
+def normalise_email(value):
+    return value.strip().lower()
+
+def normalise_phone(value):
+    """E.164 digits without '+', e.g. '+91 98765-43210' -> '919876543210'"""
+    digits = NON_DIGITS.sub('', value).lstrip('0')
+    if DEFAULT_PHONE_COUNTRY_CODE and len(digits) == NATIONAL_PHONE_LENGTH:
+        digits = DEFAULT_PHONE_COUNTRY_CODE + digits
+    return digits
+
+def normalise_name(value):
+    return ' '.join(PUNCTUATION.sub('', value.lower()).split())
+
+def normalise_compact(value):
+    """Lowercase with punctuation and whitespace removed (city, state)"""
+    return PUNCTUATION_AND_SPACES.sub('', value.lower())
+
+def normalise_zip(value):
+    """Compact form; US ZIP+4 codes keep only the first 5 digits"""
+    match = US_ZIP_PLUS_FOUR.match(value.strip())
+    return match.group(1) if match else normalise_compact(value)
+
+def normalise_country(value):
+    """ISO alpha-2 code, or None for values that are not a known country"""
+    compact = normalise_compact(value)
+    if compact in COUNTRY_NAMES:
+        return COUNTRY_NAMES[compact]
+    return compact if compact in ISO_COUNTRY_CODES else None
+
+def normalise_gender(value):
+    """'f' or 'm', or None for any other value"""
+    return GENDERS.get(value.strip().lower())
+
+def normalise_date_of_birth(value):
+    """YYYYMMDD, or None when value is not a date in DATE_OF_BIRTH_FORMATS"""
+    value = value.strip()
+    for fmt in DATE_OF_BIRTH_FORMATS:
+        try:
+            date = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if date.year >= 1900 and date <= datetime.now():
+            return date.strftime('%Y%m%d')
+        return None
+    return None
+
+def normalise_trimmed(value):
+    return value.strip().lower()
+
+# user_data field -> normaliser; fields not listed are sent unhashed
+# (client_ip_address, client_user_agent, fbc, fbp, ...)
+FIELD_NORMALISERS = {
+    'em': normalise_email,
+    'ph': normalise_phone,
+    'fn': normalise_name,
+    'ln': normalise_name,
+    'ct': normalise_compact,
+    'st': normalise_compact,
+    'zp': normalise_zip,
+    'country': normalise_country,
+    'ge': normalise_gender,
+    'db': normalise_date_of_birth,
+    'external_id': normalise_trimmed
+}
+
+def sha256_hex(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+@lru_cache(maxsize=HASH_CACHE_SIZE)
+def hash_field(field, value):
+    """Normalised SHA-256 of one user_data value (cached); None if it cannot be normalised"""
+    if SHA256_HEX.match(value):
+        return value
+    normalised = FIELD_NORMALISERS[field](value)
+    return sha256_hex(normalised) if normalised else None
+
+def hash_value(field, value):
+    """Hash a scalar or list value of a hashed field; empty values become None"""
+    if isinstance(value, (list, tuple)):
+        hashed = [hash_value(field, item) for item in value]
+        return [item for item in hashed if item] or None
+    if value is None:
+        return None
+    text = str(value)
+    if not text.strip():
+        return None
+    return hash_field(field, text)
+
+def prepare_user_data(user_data):
+    """Copy of user_data with every hashed field normalised and hashed"""
+    prepared = dict(user_data)
+    for field in FIELD_NORMALISERS.keys() & prepared.keys():
+        if prepared[field]:
+            prepared[field] = hash_value(field, prepared[field])
+        if not prepared[field]:
+            del prepared[field]
+    return prepared
+
+def prepare_user_data_batch(user_data_list):
+    """
+    prepare_user_data for a batch of events.
+    Each distinct (field, value) in the batch is hashed once, however many
+    events share it, before the per-event dicts are rebuilt.
+    """
+    distinct = {}
+    for user_data in user_data_list:
+        for field in FIELD_NORMALISERS.keys() & user_data.keys():
+            value = user_data[field]
+            if value and isinstance(value, (str, int)):
+                distinct[(field, value)] = None
+
+    for key in distinct:
+        distinct[key] = hash_value(*key)
+
+    prepared_list = []
+    for user_data in user_data_list:
+        prepared = dict(user_data)
+        for field in FIELD_NORMALISERS.keys() & prepared.keys():
+            value = prepared[field]
+            if value and isinstance(value, (str, int)):
+                prepared[field] = distinct[(field, value)]
+            elif value:
+                prepared[field] = hash_value(field, value)
+            if not prepared[field]:
+                del prepared[field]
+        prepared_list.append(prepared)
+
+    return prepared_list
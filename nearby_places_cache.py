@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Geohash cell cache for nearby places searches
+Many properties sit a few hundred metres apart, so their nearby searches
+return almost the same places. Instead of one search per property, searches
+are made per geohash cell and shared:
+
+  - a property's search is planned on the cell that contains it: centred on
+    the cell centre, with the radius widened by the cell's half diagonal, so
+    the result covers the full radius around any point in the cell;
+  - results are stored per (cell, radius, place_type) in SQLite with a TTL;
+  - a property is served from any cached search whose coverage disc holds
+    its own search disc (its cell and the 8 neighbouring cells are checked),
+    by keeping the cached places within radius of the property.
+
+Only properties with no covering search trigger a fetch, properties in the
+same cell share it, and a refresh within the TTL makes no API calls at all.
+
+The precision trades sharing against widening. A search returns at most 60
+places, so for dense types a widened search keeps fewer of the places a
+direct search would list, and for sparse types it can take an extra page.
+The default precision 7 (cells of about 150 x 150 m) widens the radius by
+about 110 m, which costs nothing noticeable. Precision 6 (about 1.2 x 0.6 km)
+also shares searches between properties a few hundred metres apart, which
+suits sparse types such as hospital or subway_station.
+"""
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_METRES = 6371008.8
+
+DEFAULT_PRECISION = 7
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS nearby_place_cells (
+        cell TEXT NOT NULL,
+        radius INTEGER NOT NULL,
+        place_type TEXT NOT NULL,
+        center_lat REAL NOT NULL,
+        center_lng REAL NOT NULL,
+        fetch_radius REAL NOT NULL,
+        places TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (cell, radius, place_type)
+    );
+"""
+
+def geohash_encode(lat, lng, precision=DEFAULT_PRECISION):
+    """Geohash of a point, e.g. (12.9845, 77.7558, 6) -> 'tdr3c7'"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        coord_range, coord = (lng_range, lng) if even else (lat_range, lat)
+        middle = (coord_range[0] + coord_range[1]) / 2
+        value <<= 1
+        if coord >= middle:
+            value |= 1
+            coord_range[0] = middle
+        else:
+            coord_range[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+def geohash_bounds(cell):
+    """(min_lat, min_lng, max_lat, max_lng) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            coord_range = lng_range if even else lat_range
+            middle = (coord_range[0] + coord_range[1]) / 2
+            if value >> shift & 1:
+                coord_range[0] = middle
+            else:
+                coord_range[1] = middle
+            even = not even
+    return lat_range[0], lng_range[0], lat_range[1], lng_range[1]
+
+def geohash_neighbours(cell):
+    """The cell and its 8 neighbours"""
+    min_lat, min_lng, max_lat, max_lng = geohash_bounds(cell)
+    height, width = max_lat - min_lat, max_lng - min_lng
+    center_lat, center_lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+    return {
+        geohash_encode(center_lat + dy * height, center_lng + dx * width, len(cell))
+        for dy in (-1, 0, 1) for dx in (-1, 0, 1)
+    }
+
+def haversine_metres(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_METRES * math.asin(math.sqrt(a))
+
+def places_within(places, lat, lng, radius):
+    """Places whose location lies within radius metres of (lat, lng)"""
+    return [
+        place for place in places
+        if place.get('location', {}).get('lat') is not None
+        and haversine_metres(lat, lng, place['location']['lat'], place['location']['lng']) <= radius
+    ]
+
+class NearbyPlacesCache:
+    """
+    SQLite-backed cache of per-cell nearby searches
+    Entries are parsed once and kept in memory for the life of the object.
+    """
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS, precision=DEFAULT_PRECISION):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.precision = precision
+        self._lock = threading.Lock()
+        self._entries = {}  # (cell, radius, place_type) -> entry dict, or None if absent
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0}
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def plan_fetch(self, lat, lng, radius):
+        """(cell, center_lat, center_lng, fetch_radius) of the search covering (lat, lng)"""
+        cell = geohash_encode(lat, lng, self.precision)
+        min_lat, min_lng, max_lat, max_lng = geohash_bounds(cell)
+        center_lat, center_lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+        half_diagonal = haversine_metres(center_lat, center_lng, max_lat, max_lng)
+        return cell, center_lat, center_lng, math.ceil(radius + half_diagonal)
+
+    def _entry(self, cell, radius, place_type):
+        key = (cell, radius, place_type)
+        if key not in self._entries:
+            row = self._conn.execute(
+                """
+                SELECT center_lat, center_lng, fetch_radius, places, fetched_at
+                FROM nearby_place_cells
+                WHERE cell = ? AND radius = ? AND place_type = ?
+                """,
+                key
+            ).fetchone()
+            self._entries[key] = None if row is None else {
+                'center_lat': row[0], 'center_lng': row[1], 'fetch_radius': row[2],
+                'places': json.loads(row[3]), 'fetched_at': row[4]
+            }
+        entry = self._entries[key]
+        if entry and time.time() - entry['fetched_at'] > self.ttl_seconds:
+            return None
+        return entry
+
+    def lookup(self, lat, lng, radius, place_type):
+        """Cached places within radius of (lat, lng), or None if no cached search covers it"""
+        with self._lock:
+            for cell in geohash_neighbours(geohash_encode(lat, lng, self.precision)):
+                entry = self._entry(cell, radius, place_type)
+                if entry and haversine_metres(lat, lng, entry['center_lat'], entry['center_lng']) + radius <= entry['fetch_radius']:
+                    self.stats['hits'] += 1
+                    return places_within(entry['places'], lat, lng, radius)
+            self.stats['misses'] += 1
+            return None
+
+    def store(self, cell, radius, place_type, center_lat, center_lng, fetch_radius, places):
+        """Record the result of a planned cell search"""
+        fetched_at = time.time()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO nearby_place_cells
+                    (cell, radius, place_type, center_lat, center_lng, fetch_radius, places, fetched_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (cell, radius, place_type, center_lat, center_lng, fetch_radius,
+                 json.dumps(places, ensure_ascii=False), fetched_at)
+            )
+            self._conn.commit()
+            self._entries[(cell, radius, place_type)] = {
+                'center_lat': center_lat, 'center_lng': center_lng, 'fetch_radius': fetch_radius,
+                'places': places, 'fetched_at': fetched_at
+            }
+            self.stats['stored'] += 1
+
+    def purge_expired(self):
+        """Delete entries older than the TTL; returns rows removed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM nearby_place_cells WHERE fetched_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            self._entries.clear()
+            return cursor.rowcount
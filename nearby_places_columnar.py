@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk form of nearby places
+Stores slim places (fetch_nearby_places.slim_place) as one NumPy array per
+field in an .npz file instead of a list of JSON objects, for bulk analysis:
+coordinates and ratings load as float arrays without parsing, and a crawl
+of every property is one file.
+
+Layout:
+    place_id, name, vicinity,
+    business_status                 unicode arrays ('' when missing)
+    lat, lng                        float64
+    rating                          float32 (NaN when missing)
+    user_ratings_total              int32 (-1 when missing)
+    type_names                      vocabulary of place types
+    type_codes, type_offsets        types of place i are
+                                    type_names[type_codes[type_offsets[i]:type_offsets[i + 1]]]
+
+A crawl file (save_crawl_columnar) adds property_id, property_name,
+property_lat, property_lng and property_offsets: the places of property j
+are rows property_offsets[j]:property_offsets[j + 1].
+
+Usage:
+    python nearby_places_columnar.py nearby_places_by_property.json nearby_places_by_property.npz
+"""
+
+import json
+import sys
+
+import numpy as np
+
+from fetch_nearby_places import slim_place
+
+STRING_FIELDS = ('place_id', 'name', 'vicinity', 'business_status')
+
+def to_columns(places):
+    """Column arrays for a list of (formatted or slim) places"""
+    places = [place if 'photos' not in place else slim_place(place) for place in places]
+
+    columns = {
+        field: np.array([place.get(field) or '' for place in places], dtype=np.str_)
+        for field in STRING_FIELDS
+    }
+    columns['lat'] = np.array([place['location']['lat'] for place in places], dtype=np.float64)
+    columns['lng'] = np.array([place['location']['lng'] for place in places], dtype=np.float64)
+    columns['rating'] = np.array(
+        [np.nan if place.get('rating') is None else place['rating'] for place in places], dtype=np.float32
+    )
+    columns['user_ratings_total'] = np.array(
+        [-1 if place.get('user_ratings_total') is None else place['user_ratings_total'] for place in places],
+        dtype=np.int32
+    )
+
+    type_index = {}
+    codes = []
+    offsets = [0]
+    for place in places:
+        for place_type in place.get('types', []):
+            codes.append(type_index.setdefault(place_type, len(type_index)))
+        offsets.append(len(codes))
+    columns['type_names'] = np.array(list(type_index), dtype=np.str_)
+    columns['type_codes'] = np.array(codes, dtype=np.int16)
+    columns['type_offsets'] = np.array(offsets, dtype=np.int32)
+    return columns
+
+def from_columns(columns, start=0, stop=None):
+    """Slim place dicts for rows start:stop of the column arrays"""
+    stop = len(columns['lat']) if stop is None else stop
+    type_names = columns['type_names'].tolist()
+    type_codes = columns['type_codes'].tolist()
+    type_offsets = columns['type_offsets'].tolist()
+    strings = {field: columns[field][start:stop].tolist() for field in STRING_FIELDS}
+    lat = columns['lat'][start:stop].tolist()
+    lng = columns['lng'][start:stop].tolist()
+    rating = columns['rating'][start:stop].tolist()
+    ratings_total = columns['user_ratings_total'][start:stop].tolist()
+
+    places = []
+    for row, i in enumerate(range(start, stop)):
+        place = {
+            'place_id': strings['place_id'][row],
+            'name': strings['name'][row],
+            'vicinity': strings['vicinity'][row],
+            'location': {'lat': lat[row], 'lng': lng[row]},
+            'types': [type_names[code] for code in type_codes[type_offsets[i]:type_offsets[i + 1]]],
+            'rating': None if rating[row] != rating[row] else round(rating[row], 1),
+            'user_ratings_total': None if ratings_total[row] < 0 else ratings_total[row],
+            'business_status': strings['business_status'][row]
+        }
+        places.append({key: value for key, value in place.items() if value not in (None, '', [])})
+    return places
+
+def save_columnar(places, path):
+    np.savez_compressed(path, **to_columns(places))
+
+def load_columnar(path):
+    """Column arrays of a file written by save_columnar or save_crawl_columnar"""
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+def save_crawl_columnar(results, path):
+    """Write crawl_nearby_places results ({property_id: {..., 'places'}}) to one file"""
+    entries = list(results.items())
+    places = [place for _, entry in entries for place in entry['places']]
+    columns = to_columns(places)
+    columns['property_id'] = np.array([int(property_id) for property_id, _ in entries], dtype=np.int64)
+    columns['property_name'] = np.array([entry.get('name') or '' for _, entry in entries], dtype=np.str_)
+    columns['property_lat'] = np.array([entry['latitude'] for _, entry in entries], dtype=np.float64)
+    columns['property_lng'] = np.array([entry['longitude'] for _, entry in entries], dtype=np.float64)
+    columns['property_offsets'] = np.cumsum([0] + [len(entry['places']) for _, entry in entries]).astype(np.int32)
+    np.savez_compressed(path, **columns)
+
+def load_crawl_columnar(path):
+    """Inverse of save_crawl_columnar"""
+    columns = load_columnar(path)
+    offsets = columns['property_offsets'].tolist()
+    return {
+        property_id: {
+            'name': name,
+            'latitude': lat,
+            'longitude': lng,
+            'places': from_columns(columns, offsets[j], offsets[j + 1])
+        }
+        for j, (property_id, name, lat, lng) in enumerate(zip(
+            columns['property_id'].tolist(), columns['property_name'].tolist(),
+            columns['property_lat'].tolist(), columns['property_lng'].tolist()
+        ))
+    }
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+
+    source, target = sys.argv[1], sys.argv[2]
+    with open(source, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if isinstance(data, dict):
+        save_crawl_columnar(data, target)
+    else:
+        save_columnar(data, target)
+    print(f"Wrote {target}")
+
+if __name__ == "__main__":
+    main()
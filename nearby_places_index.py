@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Spatial index over stored nearby places
+Builds an in-memory grid index over the places in nearby_places.json or
+nearby_places_by_property.json (crawl_nearby_places.py) to answer
+"closest hospital/metro to this property" without scanning every place:
+
+    index = PlacesIndex(load_places('nearby_places_by_property.json'))
+    index.nearest(12.9845, 77.7558, k=3, place_type='hospital')
+    index.within(12.9845, 77.7558, 1000, place_type='subway_station')
+
+Places are bucketed into square cells of cell_metres and stored sorted by
+cell, so the candidates of a query are a few contiguous slices found with
+one vectorised searchsorted; their exact distances are computed with a
+vectorised haversine. Each place type gets its own grid, built on first use.
+
+Run as a script it exports, for every property, the top N places per
+category with their distance, for the listing pages:
+
+    python nearby_places_index.py [--places=nearby_places_by_property.json] [--csv=properties_data.csv]
+                                  [--categories=hospital,subway_station,...] [--top=3]
+                                  [--max-distance=3000] [--output=nearby_top_by_category.json]
+                                  [--benchmark]
+"""
+
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+EARTH_RADIUS_METRES = 6371008.8
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS_METRES / 180
+
+DEFAULT_CELL_METRES = 500
+DEFAULT_CATEGORIES = [
+    'hospital', 'pharmacy', 'subway_station', 'bus_station', 'school',
+    'supermarket', 'restaurant', 'atm', 'gym', 'park', 'shopping_mall'
+]
+
+def haversine_metres(lat, lng, lat_rad, lng_rad, cos_lat):
+    """Distances from one point (degrees) to arrays of points (radians, with cos of their latitude)"""
+    lat0, lng0 = math.radians(lat), math.radians(lng)
+    a = (np.sin((lat_rad - lat0) / 2) ** 2 +
+         math.cos(lat0) * cos_lat * np.sin((lng_rad - lng0) / 2) ** 2)
+    return 2 * EARTH_RADIUS_METRES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class SpatialGrid:
+    """
+    Uniform grid over a set of points
+    Cells are cell_metres square in an equirectangular projection around
+    the points' mean latitude (accurate at city scale). Points are stored in
+    cell order, so each grid row's cells in a query window form one slice.
+    """
+
+    def __init__(self, lat, lng, cell_metres=DEFAULT_CELL_METRES):
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        self.size = len(lat)
+        self.cell_metres = cell_metres
+        self.lat_step = cell_metres / METRES_PER_DEGREE
+        self.lng_step = self.lat_step / math.cos(math.radians(float(lat.mean()) if self.size else 0.0))
+        self.lat_origin = float(lat.min()) if self.size else 0.0
+        self.lng_origin = float(lng.min()) if self.size else 0.0
+
+        rows = np.floor((lat - self.lat_origin) / self.lat_step).astype(np.int64)
+        cols = np.floor((lng - self.lng_origin) / self.lng_step).astype(np.int64)
+        self.rows = int(rows.max()) + 1 if self.size else 0
+        self.cols = int(cols.max()) + 1 if self.size else 0
+
+        keys = rows * self.cols + cols
+        self.order = np.argsort(keys, kind='stable')
+        self.keys = keys[self.order]
+        self.lat_rad = np.radians(lat[self.order])
+        self.lng_rad = np.radians(lng[self.order])
+        self.cos_lat = np.cos(self.lat_rad)
+
+    def _cell(self, lat, lng):
+        return (math.floor((lat - self.lat_origin) / self.lat_step),
+                math.floor((lng - self.lng_origin) / self.lng_step))
+
+    def _window(self, row, col, reach):
+        """Sorted positions of the points in the cells within reach cells of (row, col)"""
+        row_lo, row_hi = max(row - reach, 0), min(row + reach, self.rows - 1)
+        col_lo, col_hi = max(col - reach, 0), min(col + reach, self.cols - 1)
+        if row_lo > row_hi or col_lo > col_hi:
+            return np.empty(0, dtype=np.int64)
+
+        grid_rows = np.arange(row_lo, row_hi + 1, dtype=np.int64) * self.cols
+        starts = np.searchsorted(self.keys, grid_rows + col_lo, side='left')
+        ends = np.searchsorted(self.keys, grid_rows + col_hi, side='right')
+        spans = [np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def _distances(self, lat, lng, positions):
+        return haversine_metres(lat, lng, self.lat_rad[positions], self.lng_rad[positions], self.cos_lat[positions])
+
+    def within(self, lat, lng, radius):
+        """(point indices, distances) within radius metres, closest first"""
+        row, col = self._cell(lat, lng)
+        positions = self._window(row, col, math.ceil(radius / self.cell_metres))
+        distances = self._distances(lat, lng, positions)
+        keep = distances <= radius
+        positions, distances = positions[keep], distances[keep]
+        ranked = np.argsort(distances, kind='stable')
+        return self.order[positions[ranked]], distances[ranked]
+
+    def nearest(self, lat, lng, k, max_distance=None):
+        """(point indices, distances) of the k closest points, closest first"""
+        if max_distance is not None:
+            indices, distances = self.within(lat, lng, max_distance)
+            return indices[:k], distances[:k]
+
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        row, col = self._cell(lat, lng)
+        reach = 1
+        while True:
+            positions = self._window(row, col, reach)
+            covers_all = len(positions) == self.size
+            if len(positions) >= k or covers_all:
+                distances = self._distances(lat, lng, positions)
+                ranked = np.argsort(distances, kind='stable')[:k]
+                # Every point closer than `reach` cells lies inside the window
+                if covers_all or distances[ranked[-1]] <= reach * self.cell_metres * 0.999:
+                    return self.order[positions[ranked]], distances[ranked]
+            reach *= 2
+
+class PlacesIndex:
+    """Places plus one SpatialGrid for all of them and one per place type"""
+
+    def __init__(self, places, cell_metres=DEFAULT_CELL_METRES):
+        self.places = [
+            place for place in places
+            if place.get('location', {}).get('lat') is not None
+            and place.get('location', {}).get('lng') is not None
+        ]
+        self.cell_metres = cell_metres
+        self.lat = np.array([place['location']['lat'] for place in self.places], dtype=np.float64)
+        self.lng = np.array([place['location']['lng'] for place in self.places], dtype=np.float64)
+
+        self.type_members = {}
+        for i, place in enumerate(self.places):
+            for place_type in place.get('types') or []:
+                self.type_members.setdefault(place_type, []).append(i)
+
+        self._grids = {None: (SpatialGrid(self.lat, self.lng, cell_metres), None)}
+
+    def _grid(self, place_type):
+        """(grid, member indices) for a type; member indices is None for the all-places grid"""
+        if place_type not in self._grids:
+            members = np.array(self.type_members.get(place_type, []), dtype=np.int64)
+            self._grids[place_type] = (SpatialGrid(self.lat[members], self.lng[members], self.cell_metres), members)
+        return self._grids[place_type]
+
+    def _results(self, members, indices, distances):
+        if members is not None:
+            indices = members[indices]
+        return [(self.places[i], float(d)) for i, d in zip(indices.tolist(), distances.tolist())]
+
+    def nearest(self, lat, lng, k=5, place_type=None, max_distance=None):
+        """[(place, distance_m)] of the k closest places (of place_type), closest first"""
+        grid, members = self._grid(place_type)
+        if not grid.size:
+            return []
+        return self._results(members, *grid.nearest(lat, lng, k, max_distance))
+
+    def within(self, lat, lng, radius, place_type=None):
+        """[(place, distance_m)] within radius metres (of place_type), closest first"""
+        grid, members = self._grid(place_type)
+        if not grid.size:
+            return []
+        return self._results(members, *grid.within(lat, lng, radius))
+
+    def top_by_category(self, lat, lng, categories=None, n=3, max_distance=None):
+        """{category: [place summary with distance_m]} of the n closest places per category"""
+        return {
+            category: [
+                {
+                    'place_id': place.get('place_id'),
+                    'name': place.get('name'),
+                    'distance_m': round(distance),
+                    'rating': place.get('rating'),
+                    'user_ratings_total': place.get('user_ratings_total'),
+                    'vicinity': place.get('vicinity')
+                }
+                for place, distance in self.nearest(lat, lng, n, place_type=category, max_distance=max_distance)
+            ]
+            for category in (categories or DEFAULT_CATEGORIES)
+        }
+
+def load_json_or_columnar(path):
+    """Contents of a places JSON file, or of its .npz columnar form (nearby_places_columnar.py)"""
+    if path.endswith('.npz'):
+        from nearby_places_columnar import from_columns, load_columnar, load_crawl_columnar
+        columns = load_columnar(path)
+        return load_crawl_columnar(path) if 'property_id' in columns else from_columns(columns)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_places(path):
+    """
+    Places from nearby_places.json (a list) or nearby_places_by_property.json
+    ({property_id: {..., 'places': [...]}}), or their .npz forms, once per place_id
+    """
+    data = load_json_or_columnar(path)
+
+    place_lists = [entry.get('places', []) for entry in data.values()] if isinstance(data, dict) else [data]
+    seen = set()
+    places = []
+    for place_list in place_lists:
+        for place in place_list:
+            if place.get('place_id') in seen:
+                continue
+            seen.add(place.get('place_id'))
+            places.append(place)
+    return places
+
+def load_locations(places_path, csv_path=None):
+    """Property locations: from the properties CSV if given, else from the per-property places file"""
+    if csv_path:
+        from crawl_nearby_places import load_property_locations_csv
+        return load_property_locations_csv(csv_path)
+
+    data = load_json_or_columnar(places_path)
+    if not isinstance(data, dict):
+        return []
+    return [
+        {'id': int(property_id), 'name': entry.get('name'),
+         'latitude': entry['latitude'], 'longitude': entry['longitude']}
+        for property_id, entry in data.items()
+    ]
+
+def export_top_by_category(index, locations, categories=None, n=3, max_distance=None):
+    """{property_id: {'name', 'categories': {category: [...]}}} for the listing pages"""
+    return {
+        str(location['id']): {
+            'name': location['name'],
+            'categories': index.top_by_category(location['latitude'], location['longitude'],
+                                                categories, n, max_distance)
+        }
+        for location in locations
+    }
+
+def benchmark(index, locations, categories, repeat=200):
+    """Average microseconds per nearest/within query"""
+    queries = [(location['latitude'], location['longitude'], category)
+               for location in locations for category in categories]
+    if not queries:
+        return
+    for category in categories:
+        index._grid(category)  # build outside the timing
+
+    for name, query in (('nearest k=3', lambda lat, lng, t: index.nearest(lat, lng, 3, place_type=t)),
+                        ('within 1000m', lambda lat, lng, t: index.within(lat, lng, 1000, place_type=t))):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for lat, lng, place_type in queries:
+                query(lat, lng, place_type)
+        elapsed = time.perf_counter() - start
+        print(f"{name:14} {elapsed / (repeat * len(queries)) * 1e6:8.1f} us/query over {len(queries)} queries")
+
+def main():
+    places_path = 'nearby_places_by_property.json'
+    csv_path = None
+    categories = DEFAULT_CATEGORIES
+    top = 3
+    max_distance = 3000.0
+    output = 'nearby_top_by_category.json'
+
+    if '--help' in sys.argv or '-h' in sys.argv:
+        print(__doc__)
+        sys.exit(0)
+
+    for arg in sys.argv[1:]:
+        if arg.startswith('--places='):
+            places_path = arg.split('=', 1)[1]
+        elif arg.startswith('--csv='):
+            csv_path = arg.split('=', 1)[1]
+        elif arg.startswith('--categories='):
+            categories = [c.strip() for c in arg.split('=')[1].split(',') if c.strip()]
+        elif arg.startswith('--top='):
+            top = int(arg.split('=')[1])
+        elif arg.startswith('--max-distance='):
+            max_distance = float(arg.split('=')[1]) or None
+        elif arg.startswith('--output='):
+            output = arg.split('=', 1)[1]
+
+    start = time.perf_counter()
+    index = PlacesIndex(load_places(places_path))
+    print(f"Indexed {len(index.places)} places ({len(index.type_members)} types) "
+          f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    locations = load_locations(places_path, csv_path)
+    if not locations:
+        print("No property locations: pass --csv=properties_data.csv for a plain places list")
+        sys.exit(1)
+
+    if '--benchmark' in sys.argv:
+        benchmark(index, locations, categories)
+
+    export = export_top_by_category(index, locations, categories, top, max_distance)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(export, f, ensure_ascii=False, separators=(',', ':'))
+    print(f"Saved top {top} places per category for {len(export)} properties to {output}")
+
+if __name__ == "__main__":
+    main()
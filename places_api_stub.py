@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Local stub of the Google Places Nearby Search endpoint
+Lets the nearby-places crawler be exercised without network access or quota:
+point it at the stub (--base-url) and every request is counted instead of
+reaching Google.
+
+The stub holds a fixed, seeded set of synthetic places spread over
+Bengaluru and answers like the real endpoint: results within the radius
+that carry the requested type, 20 per page and at most 60 per search, in
+the same raw shape (geometry, viewport, icons, photos, plus_code ...).
+Like Google, a next_page_token only becomes valid a short while after it is
+issued (token_delay); using it earlier returns INVALID_REQUEST.
+
+Usage:
+    python places_api_stub.py [--port=8998] [--latency=0.1] [--token-delay=1.5] [--places=20000]
+"""
+
+import json
+import math
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+NEARBY_SEARCH_PATH = '/maps/api/place/nearbysearch/json'
+PAGE_SIZE = 20
+MAX_RESULTS = 60
+
+# Area the synthetic places are spread over (greater Bengaluru)
+BOUNDS = (12.85, 77.55, 13.10, 77.80)
+
+PLACE_TYPES = [
+    'hospital', 'pharmacy', 'school', 'restaurant', 'cafe', 'supermarket',
+    'bank', 'atm', 'gym', 'park', 'shopping_mall', 'subway_station',
+    'bus_station', 'lodging', 'gas_station'
+]
+
+# Grid cell size (degrees) used to look places up by location
+CELL_DEGREES = 0.01
+
+def haversine_metres(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2 +
+         math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * 6371008.8 * math.asin(math.sqrt(a))
+
+def make_places(count, seed=42):
+    """Synthetic raw places in the Nearby Search response shape"""
+    rng = random.Random(seed)
+    places = []
+    for i in range(count):
+        lat = rng.uniform(BOUNDS[0], BOUNDS[2])
+        lng = rng.uniform(BOUNDS[1], BOUNDS[3])
+        place_type = rng.choice(PLACE_TYPES)
+        places.append({
+            'business_status': 'OPERATIONAL',
+            'geometry': {
+                'location': {'lat': lat, 'lng': lng},
+                'viewport': {
+                    'northeast': {'lat': lat + 0.0013, 'lng': lng + 0.0013},
+                    'southwest': {'lat': lat - 0.0013, 'lng': lng - 0.0013}
+                }
+            },
+            'icon': f'https://maps.gstatic.com/mapfiles/place_api/icons/v1/png_71/{place_type}-71.png',
+            'icon_background_color': '#7B9EB0',
+            'icon_mask_base_uri': f'https://maps.gstatic.com/mapfiles/place_api/icons/v2/{place_type}_pinlet',
+            'name': f'Stub {place_type.replace("_", " ").title()} {i}',
+            'opening_hours': {'open_now': rng.random() < 0.7},
+            'photos': [{
+                'height': 320,
+                'width': 480,
+                'html_attributions': [f'<a href="https://maps.google.com/maps/contrib/{i}">Contributor {i}</a>'],
+                'photo_reference': uuid.UUID(int=rng.getrandbits(128)).hex * 4
+            }],
+            'place_id': f'stub-place-{i}',
+            'plus_code': {'compound_code': f'{i:04d}+XX Bengaluru, Karnataka', 'global_code': f'7J4V{i:04d}+XX'},
+            'rating': round(rng.uniform(2.5, 5.0), 1),
+            'reference': f'stub-place-{i}',
+            'scope': 'GOOGLE',
+            'types': [place_type, 'point_of_interest', 'establishment'],
+            'user_ratings_total': rng.randint(1, 20000),
+            'vicinity': f'{rng.randint(1, 300)}, Stub Road, Bengaluru'
+        })
+    return places
+
+class StubState:
+    """Places, issued page tokens and counters shared by the handler threads"""
+
+    def __init__(self, latency=0.0, token_delay=1.5, place_count=20000):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.lock = threading.Lock()
+        self.places = make_places(place_count)
+        self.cells = {}
+        for place in self.places:
+            location = place['geometry']['location']
+            key = (int(location['lat'] // CELL_DEGREES), int(location['lng'] // CELL_DEGREES))
+            self.cells.setdefault(key, []).append(place)
+        self.page_tokens = {}  # token -> (ready_at, remaining results)
+        self.requests = 0
+        self.searches = 0
+        self.pages = 0
+        self.premature_tokens = 0
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'searches': self.searches,
+                'pages': self.pages,
+                'premature_tokens': self.premature_tokens
+            }
+
+    def search(self, lat, lng, radius, place_type):
+        """Places within radius carrying place_type, closest first (capped at MAX_RESULTS)"""
+        lat_cells = int(radius / 111320 / CELL_DEGREES) + 1
+        lng_cells = int(radius / (111320 * math.cos(math.radians(lat))) / CELL_DEGREES) + 1
+        base_lat, base_lng = int(lat // CELL_DEGREES), int(lng // CELL_DEGREES)
+
+        found = []
+        for i in range(base_lat - lat_cells, base_lat + lat_cells + 1):
+            for j in range(base_lng - lng_cells, base_lng + lng_cells + 1):
+                for place in self.cells.get((i, j), ()):
+                    if place_type and place_type not in place['types']:
+                        continue
+                    location = place['geometry']['location']
+                    distance = haversine_metres(lat, lng, location['lat'], location['lng'])
+                    if distance <= radius:
+                        found.append((distance, place))
+        found.sort(key=lambda item: item[0])
+        return [place for _, place in found[:MAX_RESULTS]]
+
+    def page(self, results):
+        """Response for the first PAGE_SIZE results, issuing a token for the rest"""
+        response = {'html_attributions': [], 'results': results[:PAGE_SIZE], 'status': 'OK'}
+        if not results:
+            response['status'] = 'ZERO_RESULTS'
+        elif len(results) > PAGE_SIZE:
+            token = uuid.uuid4().hex
+            with self.lock:
+                self.page_tokens[token] = (time.monotonic() + self.token_delay, results[PAGE_SIZE:])
+            response['next_page_token'] = token
+        return response
+
+class PlacesStubHandler(BaseHTTPRequestHandler):
+    """Handles GET /maps/api/place/nearbysearch/json"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        state = self.server.state
+        url = urlparse(self.path)
+        if url.path == '/stats':
+            return self._reply(200, state.snapshot())
+        if url.path != NEARBY_SEARCH_PATH:
+            return self._reply(404, {'status': 'NOT_FOUND'})
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if state.latency:
+            time.sleep(state.latency)
+        with state.lock:
+            state.requests += 1
+
+        if not params.get('key'):
+            return self._reply(200, {'status': 'REQUEST_DENIED', 'error_message': 'You must use an API key', 'results': []})
+
+        token = params.get('pagetoken')
+        if token:
+            with state.lock:
+                ready_at, remaining = state.page_tokens.get(token, (None, None))
+                if ready_at is not None and time.monotonic() >= ready_at:
+                    del state.page_tokens[token]
+                    state.pages += 1
+                else:
+                    state.premature_tokens += 1
+                    remaining = None
+            if remaining is None:
+                return self._reply(200, {'status': 'INVALID_REQUEST', 'results': []})
+            return self._reply(200, state.page(remaining))
+
+        try:
+            lat, lng = (float(value) for value in params['location'].split(','))
+            radius = float(params.get('radius', 1500))
+        except (KeyError, ValueError):
+            return self._reply(200, {'status': 'INVALID_REQUEST', 'results': []})
+
+        with state.lock:
+            state.searches += 1
+        return self._reply(200, state.page(state.search(lat, lng, radius, params.get('type'))))
+
+def start_stub_server(port=0, latency=0.0, token_delay=1.5, place_count=20000):
+    """
+    Start the stub on a background thread (port 0 = any free port).
+    Returns the server; its base URL is server.url and its counters server.state.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), PlacesStubHandler)
+    server.daemon_threads = True
+    server.state = StubState(latency=latency, token_delay=token_delay, place_count=place_count)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}{NEARBY_SEARCH_PATH}"
+
+    thread = threading.Thread(target=server.serve_forever, name='places-api-stub', daemon=True)
+    thread.start()
+    return server
+
+def main():
+    port = 8998
+    latency = 0.0
+    token_delay = 1.5
+    place_count = 20000
+
+    for arg in sys.argv[1:]:
+        if arg.startswith('--port='):
+            port = int(arg.split('=')[1])
+        elif arg.startswith('--latency='):
+            latency = float(arg.split('=')[1])
+        elif arg.startswith('--token-delay='):
+            token_delay = float(arg.split('=')[1])
+        elif arg.startswith('--places='):
+            place_count = int(arg.split('=')[1])
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), PlacesStubHandler)
+    server.state = StubState(latency=latency, token_delay=token_delay, place_count=place_count)
+    print(f"Places API stub listening on http://127.0.0.1:{port} (latency={latency}s, token_delay={token_delay}s)")
+    print(f"Use --base-url=http://127.0.0.1:{port}{NEARBY_SEARCH_PATH}; counters at /stats")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"Stopped. {server.state.snapshot()}")
+
+if __name__ == "__main__":
+    main()
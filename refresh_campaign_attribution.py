@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Campaign Attribution Refresh Script
+Maintains campaign_visit_attribution: one row per visitor IP holding the
+latest campaign visit and its attribution (META/GOOGLE source, action_type,
+bookings flag, flat view), as computed by campaign_visits_export.py.
+
+Each run only looks at campaign_visits, contact_enquiries, sales_webhook and
+flat_booking_orders rows added since the previous run (tracked by id), plus
+flat_booking_orders rows updated since then (tracked by updated_at), works
+out which visitor IPs they affect, and recomputes just those IPs.
+
+The id high-water marks are re-scanned ID_RESCAN_WINDOW ids back, so rows
+whose transactions commit out of id order are still seen, and updated_at is
+compared with a UPDATED_AT_LOOKBACK_MINUTES overlap.
+Not covered: UPDATEs to campaign_visits, contact_enquiries or sales_webhook
+rows, bookings whose dummy_order_code is changed (the IPs of the old code),
+and rows committed more than ID_RESCAN_WINDOW ids late. Run --full-refresh
+periodically (e.g. nightly) to correct those.
+Exports can then read the table with campaign_visits_export.py --from-attribution.
+
+Usage:
+    python refresh_campaign_attribution.py                 # incremental refresh
+    python refresh_campaign_attribution.py --full-refresh  # rebuild everything
+"""
+
+import sys
+import time
+import logging
+
+from campaign_visits_export import (
+    connect_db,
+    CAMPAIGN_ATTRIBUTION_CTE,
+    EXPORT_WINDOW_START
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Source tables and the high-water mark column tracked for each
+SOURCE_TABLES = ['campaign_visits', 'contact_enquiries', 'sales_webhook', 'flat_booking_orders']
+
+# Ids re-scanned behind each high-water mark, for rows committed out of id order
+ID_RESCAN_WINDOW = 1000
+
+# Overlap applied to the previous run's time when looking for updated bookings.
+# updated_at is written by application clocks, so keep this generous.
+UPDATED_AT_LOOKBACK_MINUTES = 360
+
+CREATE_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS campaign_visit_attribution (
+        ip_address TEXT PRIMARY KEY,
+        visit_id BIGINT,
+        timestamp TIMESTAMPTZ NOT NULL,
+        campaign_id TEXT,
+        page TEXT,
+        dummy_order_code TEXT,
+        source TEXT NOT NULL,
+        action_type TEXT,
+        bookings TEXT NOT NULL,
+        flat_view TEXT,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    CREATE INDEX IF NOT EXISTS idx_campaign_visit_attribution_timestamp
+        ON campaign_visit_attribution (timestamp DESC);
+
+    CREATE TABLE IF NOT EXISTS campaign_attribution_refresh_state (
+        source_table TEXT PRIMARY KEY,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+"""
+
+# Visitor IPs whose attribution can change because of new or updated source rows.
+# %(last_*)s are the previous high-water marks minus ID_RESCAN_WINDOW,
+# %(max_*)s the current ones, %(updated_since)s the previous run minus the lookback.
+AFFECTED_IPS_SQL = """
+    CREATE TEMP TABLE affected_ips ON COMMIT DROP AS
+    -- new visits
+    SELECT cv.ip_address::text AS ip
+    FROM campaign_visits cv
+    WHERE cv.id > %(last_campaign_visits)s AND cv.id <= %(max_campaign_visits)s
+      AND cv.timestamp > %(since)s::timestamptz
+    UNION
+    -- new contact enquiries change action_type (paidlead_form)
+    SELECT cv.ip_address::text
+    FROM contact_enquiries ce
+    JOIN campaign_visits cv ON cv.ip_address::text = ce.ip::text
+    WHERE ce.id > %(last_contact_enquiries)s AND ce.id <= %(max_contact_enquiries)s
+      AND cv.timestamp > %(since)s::timestamptz
+    UNION
+    -- new or updated booking orders change bookings / flat_view / phone_call
+    SELECT cv.ip_address::text
+    FROM flat_booking_orders fbo
+    JOIN campaign_visits cv ON cv.dummy_order_code = fbo.dummy_order_code
+    WHERE ((fbo.id > %(last_flat_booking_orders)s AND fbo.id <= %(max_flat_booking_orders)s)
+           OR fbo.updated_at > %(updated_since)s::timestamptz)
+      AND cv.timestamp > %(since)s::timestamptz
+    UNION
+    -- new sales calls change action_type (phone_call) via the booking phone
+    SELECT cv.ip_address::text
+    FROM sales_webhook sw
+    JOIN flat_booking_orders fbo ON sw.phone = CONCAT('+91', fbo.tenant_phone_number)
+    JOIN campaign_visits cv ON cv.dummy_order_code = fbo.dummy_order_code
+    WHERE sw.id > %(last_sales_webhook)s AND sw.id <= %(max_sales_webhook)s
+      AND cv.timestamp > %(since)s::timestamptz;
+
+    CREATE INDEX ON affected_ips (ip);
+    ANALYZE affected_ips;
+"""
+
+UPSERT_SQL = CAMPAIGN_ATTRIBUTION_CTE.format(
+    visit_filter="AND cv.ip_address::text IN (SELECT ip FROM affected_ips)"
+) + """
+    INSERT INTO campaign_visit_attribution (
+        ip_address, visit_id, timestamp, campaign_id, page,
+        dummy_order_code, source, action_type, bookings, flat_view, refreshed_at
+    )
+    SELECT
+        ip_address::text, id, timestamp, campaign_id, page,
+        dummy_order_code, source, action_type, bookings, flat_view, NOW()
+    FROM distinct_visits
+    ON CONFLICT (ip_address) DO UPDATE SET
+        visit_id = EXCLUDED.visit_id,
+        timestamp = EXCLUDED.timestamp,
+        campaign_id = EXCLUDED.campaign_id,
+        page = EXCLUDED.page,
+        dummy_order_code = EXCLUDED.dummy_order_code,
+        source = EXCLUDED.source,
+        action_type = EXCLUDED.action_type,
+        bookings = EXCLUDED.bookings,
+        flat_view = EXCLUDED.flat_view,
+        refreshed_at = EXCLUDED.refreshed_at
+"""
+
+FULL_REFRESH_SQL = CAMPAIGN_ATTRIBUTION_CTE.format(visit_filter='') + """
+    INSERT INTO campaign_visit_attribution (
+        ip_address, visit_id, timestamp, campaign_id, page,
+        dummy_order_code, source, action_type, bookings, flat_view, refreshed_at
+    )
+    SELECT
+        ip_address::text, id, timestamp, campaign_id, page,
+        dummy_order_code, source, action_type, bookings, flat_view, NOW()
+    FROM distinct_visits
+"""
+
+def ensure_tables(cursor):
+    """Create the attribution and refresh-state tables if needed"""
+    cursor.execute(CREATE_TABLES_SQL)
+
+def get_refresh_state(cursor):
+    """Return {source_table: last_id} from the previous run (0 if never run)"""
+    cursor.execute("SELECT source_table, last_id FROM campaign_attribution_refresh_state")
+    state = {table: 0 for table in SOURCE_TABLES}
+    state.update(dict(cursor.fetchall()))
+    return state
+
+def get_updated_since(cursor):
+    """
+    Start of the updated_at window: previous booking refresh minus the lookback.
+    None on the first run, when the id range already covers every booking
+    (and updated_at > NULL matches nothing).
+    """
+    cursor.execute("""
+        SELECT MAX(refreshed_at) - make_interval(mins => %s)
+        FROM campaign_attribution_refresh_state
+        WHERE source_table = 'flat_booking_orders'
+    """, (UPDATED_AT_LOOKBACK_MINUTES,))
+    return cursor.fetchone()[0]
+
+def get_current_max_ids(cursor):
+    """Snapshot the current max id of every source table"""
+    max_ids = {}
+    for table in SOURCE_TABLES:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        max_ids[table] = cursor.fetchone()[0]
+    return max_ids
+
+def save_refresh_state(cursor, max_ids):
+    """Store the high-water marks processed by this run"""
+    for table, last_id in max_ids.items():
+        cursor.execute("""
+            INSERT INTO campaign_attribution_refresh_state (source_table, last_id, refreshed_at)
+            VALUES (%s, %s, NOW())
+            ON CONFLICT (source_table) DO UPDATE
+            SET last_id = EXCLUDED.last_id, refreshed_at = EXCLUDED.refreshed_at
+        """, (table, last_id))
+
+def refresh_attribution(conn, full_refresh=False):
+    """
+    Bring campaign_visit_attribution up to date in a single transaction.
+    Returns the number of attribution rows written.
+    """
+    try:
+        cursor = conn.cursor()
+        ensure_tables(cursor)
+
+        # Serialise concurrent refresh runs
+        cursor.execute("LOCK TABLE campaign_attribution_refresh_state IN EXCLUSIVE MODE")
+
+        last_ids = get_refresh_state(cursor)
+        max_ids = get_current_max_ids(cursor)
+        params = {'since': EXPORT_WINDOW_START, 'updated_since': get_updated_since(cursor)}
+
+        if full_refresh:
+            logger.info("Full refresh: rebuilding campaign_visit_attribution...")
+            cursor.execute("TRUNCATE campaign_visit_attribution")
+            cursor.execute(FULL_REFRESH_SQL, params)
+            written = cursor.rowcount
+        else:
+            for table in SOURCE_TABLES:
+                params[f'last_{table}'] = max(last_ids[table] - ID_RESCAN_WINDOW, 0)
+                params[f'max_{table}'] = max_ids[table]
+                logger.info(f"{table}: {max_ids[table] - last_ids[table]} new ids since last run")
+            if params['updated_since']:
+                logger.info(f"flat_booking_orders: also rechecking rows updated since {params['updated_since']}")
+
+            cursor.execute(AFFECTED_IPS_SQL, params)
+            cursor.execute("SELECT COUNT(*) FROM affected_ips")
+            affected = cursor.fetchone()[0]
+            logger.info(f"Visitor IPs to recompute: {affected}")
+
+            written = 0
+            if affected:
+                cursor.execute(UPSERT_SQL, params)
+                written = cursor.rowcount
+
+        save_refresh_state(cursor, max_ids)
+        conn.commit()
+        cursor.close()
+
+        return written
+
+    except Exception as e:
+        logger.error(f"Error refreshing campaign attribution: {e}")
+        conn.rollback()
+        raise
+
+def main():
+    """Main function"""
+    logger.info("="*60)
+    logger.info("Campaign Attribution Refresh")
+    logger.info("="*60)
+
+    full_refresh = '--full-refresh' in sys.argv
+
+    conn = None
+    try:
+        conn = connect_db()
+        logger.info("Database connection established")
+
+        start = time.perf_counter()
+        written = refresh_attribution(conn, full_refresh=full_refresh)
+        elapsed = time.perf_counter() - start
+
+        logger.info("="*60)
+        logger.info(f"Refresh completed: {written} attribution rows written in {elapsed:.2f}s")
+        logger.info("="*60)
+
+    except Exception as e:
+        logger.error(f"Script failed: {e}")
+        sys.exit(1)
+
+    finally:
+        if conn:
+            conn.close()
+            logger.info("Database connection closed")
+
+if __name__ == "__main__":
+    main()
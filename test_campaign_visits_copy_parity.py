@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Parity check for campaign_visits_export.py --copy mode.
+Loads a small fixture into a scratch database and verifies that the COPY
+export and the Python export produce byte-for-byte identical CSV files.
+
+The fixture tables are created inside a transaction that is rolled back, but
+the script still refuses to run unless FIXTURE_DB_NAME points at a scratch DB.
+"""
+
+import os
+import sys
+import filecmp
+import tempfile
+import psycopg2
+from dotenv import load_dotenv
+
+import campaign_visits_export as export
+
+FIXTURE_SCHEMA = """
+    CREATE TABLE public.campaign_visits (
+        id SERIAL PRIMARY KEY,
+        timestamp TIMESTAMPTZ,
+        ip_address INET,
+        created_at TIMESTAMPTZ DEFAULT NOW(),
+        referrer TEXT,
+        user_agent TEXT,
+        area TEXT,
+        city TEXT,
+        flat_id INTEGER,
+        dummy_order_code TEXT,
+        campaign_id TEXT,
+        lead_id TEXT,
+        page TEXT
+    );
+    CREATE TABLE public.flat_booking_orders (
+        id SERIAL PRIMARY KEY,
+        dummy_order_code TEXT,
+        flat_booking_order_code TEXT,
+        flat_slug TEXT,
+        tenant_phone_number TEXT,
+        created_at TIMESTAMPTZ DEFAULT NOW()
+    );
+    CREATE TABLE public.contact_enquiries (
+        id SERIAL PRIMARY KEY,
+        ip TEXT
+    );
+    CREATE TABLE public.sales_webhook (
+        id SERIAL PRIMARY KEY,
+        phone TEXT
+    );
+"""
+
+FIXTURE_DATA = """
+    INSERT INTO public.flat_booking_orders
+        (dummy_order_code, flat_booking_order_code, flat_slug, tenant_phone_number, created_at)
+    VALUES
+        ('D001', 'FB001', 'hsr-layout-2bhk-101', '9876543210', '2026-01-02 10:00:00+00'),
+        ('D001', 'FB002', 'hsr-layout-2bhk-102', '9876543210', '2026-01-03 10:00:00+00'),
+        ('D002', '-', 'ignored-slug', NULL, '2026-01-03 10:00:00+00'),
+        ('D003', 'FB003', 'koramangala-1bhk-7', NULL, '2026-01-04 10:00:00+00');
+
+    INSERT INTO public.contact_enquiries (ip) VALUES ('10.0.0.3/32');
+    INSERT INTO public.sales_webhook (phone) VALUES ('+919876543210');
+
+    INSERT INTO public.campaign_visits
+        (timestamp, ip_address, dummy_order_code, campaign_id, page)
+    VALUES
+        -- excluded: before the export window
+        ('2025-12-18 09:00:00+00', '10.0.0.9', NULL, 'G001', 'landing'),
+        -- same IP twice: only the latest visit is kept
+        ('2026-01-01 08:00:00+00', '10.0.0.1', NULL, 'M001', 'landing'),
+        ('2026-01-05 08:30:15.123456+00', '10.0.0.1', 'D001', 'M001', 'property-detail'),
+        ('2026-01-06 12:00:00+00', '10.0.0.2', NULL, 'G012', 'whatsapp_click'),
+        ('2026-01-07 23:59:59+00', '10.0.0.3', NULL, NULL, ''),
+        ('2026-01-08 00:00:01+00', '10.0.0.4', 'D002', 'G008', 'page,with "quotes"'),
+        ('2026-01-09 18:45:00+00', '10.0.0.5', 'D003', 'M002', NULL);
+"""
+
+def connect_fixture_db():
+    """Connect to the scratch fixture database"""
+    return psycopg2.connect(
+        dbname=os.getenv("FIXTURE_DB_NAME"),
+        user=os.getenv("FIXTURE_DB_USER", os.getenv("DB_USER")),
+        password=os.getenv("FIXTURE_DB_PASSWORD", os.getenv("DB_PASSWORD")),
+        host=os.getenv("FIXTURE_DB_HOST", os.getenv("DB_HOST")),
+        port=os.getenv("FIXTURE_DB_PORT", os.getenv("DB_PORT", 5432))
+    )
+
+def run_parity_check(conn, work_dir):
+    """Export the fixture both ways and compare the files"""
+    cursor = conn.cursor()
+    cursor.execute(FIXTURE_SCHEMA)
+    cursor.execute(FIXTURE_DATA)
+    cursor.close()
+
+    python_file = os.path.join(work_dir, 'python_export.csv')
+    copy_file = os.path.join(work_dir, 'copy_export.csv')
+
+    columns, rows = export.get_campaign_visits_data(conn)
+    export.export_to_csv(columns, rows, python_file)
+    export.export_with_copy(conn, copy_file)
+
+    if filecmp.cmp(python_file, copy_file, shallow=False):
+        print(f"SUCCESS: COPY export matches Python export ({len(rows)} rows)")
+        return True
+
+    print("ERROR: COPY export differs from Python export")
+    with open(python_file, 'rb') as f:
+        print("Python export:")
+        print(f.read().decode('utf-8'))
+    with open(copy_file, 'rb') as f:
+        print("COPY export:")
+        print(f.read().decode('utf-8'))
+    return False
+
+def main():
+    print("CAMPAIGN VISITS COPY PARITY CHECK")
+    print("="*50)
+
+    load_dotenv()
+
+    if not os.getenv("FIXTURE_DB_NAME"):
+        print("ERROR: Set FIXTURE_DB_NAME to a scratch database (never the live DB)")
+        sys.exit(1)
+
+    conn = connect_fixture_db()
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            ok = run_parity_check(conn, work_dir)
+    finally:
+        # Fixture tables only ever exist inside this transaction
+        conn.rollback()
+        conn.close()
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Batching check for flask-meta-conversions.py against the local Graph API stub.
+Posts a burst of tracking requests through the Flask test client and verifies
+that every event reaches the stub in far fewer outbound requests, that a
+batch rejected because of one invalid event still delivers the valid ones,
+that an expired token fails a batch with one request instead of bisecting
+it, and that a resent event_id is answered from the dedup store.
+Runs fully offline.
+"""
+
+import os
+import sys
+import tempfile
+import time
+import importlib
+
+from meta_event_dedup import SQLiteDedupStore
+from meta_graph_stub import start_stub_server
+
+BURST_SIZE = 2500
+
+def load_app(stub_url, journal_path):
+    """Import the conversions module with its Graph URL pointed at the stub"""
+    os.environ['META_GRAPH_URL'] = stub_url
+    os.environ['META_JOURNAL_PATH'] = journal_path
+    os.environ.setdefault('META_BATCH_FLUSH_INTERVAL', '0.2')
+    return importlib.import_module('flask-meta-conversions')
+
+def check_burst(app, stub):
+    """A burst of page views should go out as a handful of batched requests"""
+    client = app.test_client()
+    endpoints = ['/api/meta/track-page-view', '/api/meta/track-lead', '/api/meta/track-purchase']
+
+    for i in range(BURST_SIZE):
+        response = client.post(endpoints[i % len(endpoints)], json={
+            'user_data': {'em': f'user{i}@example.com'},
+            'event_source_url': 'https://www.kots.world/'
+        })
+        if response.status_code != 202:
+            print(f"ERROR: request {i} returned {response.status_code}")
+            return False
+
+    app.extensions['meta_dispatcher'].stop(timeout=30)
+    stats = stub.state.snapshot()
+    print(f"Stub received {stats['events']} events in {stats['requests']} requests")
+
+    if stats['events'] != BURST_SIZE:
+        print(f"ERROR: expected {BURST_SIZE} events at the stub")
+        return False
+    if stats['requests'] * 100 > BURST_SIZE:
+        print("ERROR: events were not batched")
+        return False
+    return True
+
+def check_bisect(module, app, stub):
+    """One invalid event must not take the rest of its batch down with it"""
+    results = []
+    dispatcher = module.MetaEventDispatcher(
+        app.extensions['meta_dispatcher'].service,
+        workers=1,
+        flush_interval=0.2,
+        on_result=lambda event, success, detail: results.append((event.get('event_id'), success))
+    )
+
+    for i in range(8):
+        event = {'event_name': 'Lead', 'event_id': f'bisect-{i}', 'user_data': {}}
+        if i == 5:
+            event['event_name'] = None
+        dispatcher.submit(event)
+
+    dispatcher.start()
+    dispatcher.stop(timeout=10)
+
+    failed = [event_id for event_id, success in results if not success]
+    print(f"Bisect: {len(results)} results, failed {failed}")
+    return len(results) == 8 and failed == ['bisect-5']
+
+def check_auth_fault(module, stub):
+    """An expired token fails the batch once and is reported until a send succeeds"""
+    results = []
+    service = module.MetaConversionsService('123', 'expired-token', graph_url=stub.url, timeout=2)
+    dispatcher = module.MetaEventDispatcher(
+        service,
+        workers=1,
+        flush_interval=0.2,
+        on_result=lambda event, success, detail: results.append(success)
+    )
+    stub.state.access_token = 'valid-token'
+    before = stub.state.snapshot()['requests']
+
+    for i in range(8):
+        dispatcher.submit({'event_name': 'Lead', 'event_id': f'auth-{i}', 'user_data': {}})
+    dispatcher.start()
+    deadline = time.monotonic() + 10
+    while len(results) < 8 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    requests_made = stub.state.snapshot()['requests'] - before
+    readiness = dispatcher.readiness()
+
+    # Token fixed: the next batch goes through and clears the fault
+    service.access_token = 'valid-token'
+    dispatcher.submit({'event_name': 'Lead', 'event_id': 'auth-ok', 'user_data': {}})
+    dispatcher.stop(timeout=10)
+    stub.state.access_token = None
+
+    print(f"Auth fault: {requests_made} requests, results {results}, fault {readiness['fault']}, "
+          f"after fix {dispatcher.fault()}")
+    return (requests_made == 1 and results == [False] * 8 + [True]
+            and not readiness['ready'] and readiness['fault'] and dispatcher.fault() is None)
+
+def check_dedup(app, work_dir):
+    """Resent event_ids get the cached response; the SQLite store is shared across instances"""
+    client = app.test_client()
+    before = app.extensions['meta_dispatcher'].metrics()['queued']
+    payload = {'event_name': 'Lead', 'event_id': 'dedup-1', 'user_data': {'em': 'dedup@example.com'}}
+
+    first = client.post('/api/meta/track-conversion', json=payload)
+    repeats = [client.post('/api/meta/track-conversion', json=payload) for _ in range(5)]
+    queued = app.extensions['meta_dispatcher'].metrics()['queued'] - before
+    print(f"Dedup: first {first.status_code}, repeats {[r.get_json().get('duplicate') for r in repeats]}, queued {queued}")
+    if first.get_json().get('duplicate') or queued != 1:
+        return False
+    if not all(r.status_code == 202 and r.get_json().get('duplicate') for r in repeats):
+        return False
+
+    # A failed event's key is released, so a corrected resend reaches the dispatcher
+    app.extensions['meta_dispatcher'].on_result({'event_name': 'Lead', 'event_id': 'dedup-1'}, False, 'rejected')
+    resend = client.post('/api/meta/track-conversion', json=payload)
+    if resend.status_code != 202 or resend.get_json().get('duplicate'):
+        print("ERROR: a failed event's dedup key was not released")
+        return False
+
+    path = os.path.join(work_dir, 'dedup.db')
+    worker_a, worker_b = SQLiteDedupStore(path), SQLiteDedupStore(path)
+    claimed = worker_a.claim('Lead:shared-1', {'event_id': 'shared-1'})
+    cached = worker_b.claim('Lead:shared-1', {'event_id': 'other'})
+    worker_b.release('Lead:shared-1')
+    reclaimed = worker_a.claim('Lead:shared-1', {'event_id': 'shared-1'})
+    worker_a.close()
+    worker_b.close()
+    print(f"SQLite dedup: first claim {claimed}, second worker got {cached}, after release {reclaimed}")
+    return claimed is None and cached == {'event_id': 'shared-1'} and reclaimed is None
+
+def main():
+    print("META CONVERSIONS BATCHING CHECK")
+    print("="*50)
+
+    stub = start_stub_server()
+    with tempfile.TemporaryDirectory() as work_dir:
+        module = load_app(stub.url, os.path.join(work_dir, 'journal.db'))
+        app = module.create_app()
+        ok = check_burst(app, stub) and check_dedup(app, work_dir) and check_bisect(module, app, stub)
+        ok = ok and check_auth_fault(module, stub)
+        app.extensions['meta_dispatcher'].journal.close()
+    stub.shutdown()
+
+    print("SUCCESS" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
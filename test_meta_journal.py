@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Journal check for flask-meta-conversions.py, fully offline.
+Simulates a Meta outage followed by a process restart:
+  1. events are accepted while the Graph API is unreachable,
+  2. the dispatcher is stopped with the events still journaled,
+  3. a new dispatcher on the same journal file replays them to the stub.
+Also checks that a resent event_id is journaled only once, that an expired
+token keeps events pending (one request, no bisection) until it is fixed,
+and that a corrected resend of an event parked as failed is sent.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import importlib
+
+from meta_graph_stub import start_stub_server
+from meta_event_journal import MetaEventJournal
+
+EVENT_COUNT = 300
+
+def load_module():
+    """Import the conversions module (no app or dispatcher is created on import)"""
+    return importlib.import_module('flask-meta-conversions')
+
+def make_dispatcher(module, graph_url, journal_path, access_token='test-token'):
+    service = module.MetaConversionsService('123', access_token, graph_url=graph_url, timeout=2)
+    return module.JournaledMetaEventDispatcher(
+        service,
+        MetaEventJournal(journal_path),
+        flush_interval=0.1,
+        backoff_base=0.05,
+        backoff_max=0.5
+    )
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+def check_auth_fault(module, stub, work_dir):
+    """An expired token must not bisect the batch or park its events"""
+    stub.state.access_token = 'valid-token'
+    dispatcher = make_dispatcher(module, stub.url, os.path.join(work_dir, 'fault.db'), 'expired-token')
+    before = stub.state.snapshot()['requests']
+    for i in range(50):
+        dispatcher.submit({'event_name': 'Lead', 'event_id': f'fault-{i}', 'user_data': {}})
+    dispatcher.start()
+
+    wait_until(lambda: dispatcher.fault() is not None)
+    time.sleep(0.2)
+    requests_made = stub.state.snapshot()['requests'] - before
+    metrics = dispatcher.journal.metrics()
+    readiness = dispatcher.readiness()
+
+    # Token fixed: the pending events go out on the next probe
+    dispatcher.service.access_token = 'valid-token'
+    delivered = wait_until(lambda: dispatcher.journal.metrics()['sent'] == 50)
+    dispatcher.stop(timeout=2)
+    dispatcher.journal.close()
+    stub.state.access_token = None
+
+    print(f"Auth fault: {requests_made} requests, journal {metrics}, fault reported {bool(readiness['fault'])}, "
+          f"delivered after fix {delivered}")
+    return (requests_made == 1 and metrics['pending'] == 50 and metrics['failed'] == 0
+            and readiness['ready'] and readiness['fault'] and delivered and dispatcher.fault() is None)
+
+def check_resubmit_failed(module, stub, work_dir):
+    """A corrected resend of an event parked as failed is journaled and sent"""
+    dispatcher = make_dispatcher(module, stub.url, os.path.join(work_dir, 'resubmit.db'))
+    dispatcher.start()
+    dispatcher.submit({'event_name': 'Lead', 'event_id': 'fix-1', 'event_time': None, 'user_data': {}})
+    parked = wait_until(lambda: dispatcher.journal.metrics()['failed'] == 1)
+
+    dispatcher.submit({'event_name': 'Lead', 'event_id': 'fix-1', 'user_data': {}})
+    sent = wait_until(lambda: dispatcher.journal.metrics()['sent'] == 1)
+    # Once sent, further resends are duplicates again
+    dispatcher.submit({'event_name': 'Lead', 'event_id': 'fix-1', 'user_data': {}})
+    dispatcher.stop(timeout=2)
+    metrics = dispatcher.journal.metrics()
+    dispatcher.journal.close()
+
+    print(f"Resubmit: parked {parked}, sent after fix {sent}, journal {metrics}, "
+          f"duplicates {dispatcher.stats['duplicates']}")
+    return parked and sent and metrics['failed'] == 0 and metrics['pending'] == 0 and dispatcher.stats['duplicates'] == 1
+
+def main():
+    print("META CONVERSIONS JOURNAL CHECK")
+    print("="*50)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        journal_path = os.path.join(work_dir, 'journal.db')
+        module = load_module()
+
+        # 1. Outage: nothing listens on this port
+        dispatcher = make_dispatcher(module, 'http://127.0.0.1:9', journal_path)
+        dispatcher.start()
+        for i in range(EVENT_COUNT):
+            dispatcher.submit({'event_name': 'Lead', 'event_id': f'lead-{i}', 'user_data': {'em': f'u{i}@example.com'}})
+        # A frontend retry of the same event
+        dispatcher.submit({'event_name': 'Lead', 'event_id': 'lead-0', 'user_data': {'em': 'u0@example.com'}})
+        time.sleep(0.5)
+
+        # 2. Restart with the events still on disk
+        dispatcher.stop(timeout=1)
+        metrics = dispatcher.journal.metrics()
+        print(f"After outage: {metrics}, duplicates={dispatcher.stats['duplicates']}")
+        dispatcher.journal.close()
+        if metrics['pending'] != EVENT_COUNT or dispatcher.stats['duplicates'] != 1:
+            print("ERROR: events were not all journaled exactly once")
+            sys.exit(1)
+
+        # 3. Meta is back: the new process drains the journal
+        stub = start_stub_server()
+        dispatcher = make_dispatcher(module, stub.url, journal_path)
+        # Skip the backoff scheduled during the outage
+        dispatcher.journal._conn.execute("UPDATE meta_events SET next_attempt_at = 0")
+        dispatcher.start()
+
+        deadline = time.monotonic() + 20
+        while dispatcher.journal.metrics()['pending'] and time.monotonic() < deadline:
+            time.sleep(0.1)
+        dispatcher.stop(timeout=5)
+
+        metrics = dispatcher.journal.metrics()
+        stats = stub.state.snapshot()
+        print(f"After replay: {metrics}; stub received {stats['events']} events in {stats['requests']} requests")
+        dispatcher.journal.close()
+
+        ok = metrics['pending'] == 0 and metrics['sent'] == EVENT_COUNT and stats['events'] == EVENT_COUNT
+        ok = ok and check_auth_fault(module, stub, work_dir) and check_resubmit_failed(module, stub, work_dir)
+        stub.shutdown()
+        print("SUCCESS" if ok else "FAILED")
+        sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
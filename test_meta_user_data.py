@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Normalisation check for meta_user_data.py, fully offline.
+Hashes the examples from Meta's customer information parameters
+documentation and compares them with the SHA-256 of the expected normalised
+form, checks that values which cannot be normalised exactly are dropped
+instead of hashed, that pre-hashed values and list values are handled, and
+that prepare_user_data_batch matches prepare_user_data event by event.
+"""
+
+import hashlib
+import sys
+
+from meta_user_data import hash_value, prepare_user_data, prepare_user_data_batch
+
+def sha256(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+# (field, raw value, expected normalised value or None when it must be dropped)
+EXAMPLES = [
+    ('em', 'John_Smith@gmail.com', 'john_smith@gmail.com'),
+    ('em', '  Mary@Example.COM ', 'mary@example.com'),
+    ('ph', '+1 (616) 954-7888', '16169547888'),
+    ('ph', '098765 43210', '919876543210'),
+    ('ph', '+91 98765-43210', '919876543210'),
+    ('fn', 'John', 'john'),
+    ('fn', 'Valéry', 'valéry'),
+    ('ln', "O'Neil-Smith", 'oneilsmith'),
+    ('ct', 'Menlo Park', 'menlopark'),
+    ('ct', 'New York', 'newyork'),
+    ('st', 'CA', 'ca'),
+    ('zp', '94025', '94025'),
+    ('zp', '94025-1234', '94025'),
+    ('zp', 'W1 1AA', 'w11aa'),
+    ('country', 'US', 'us'),
+    ('country', 'in', 'in'),
+    ('country', 'United States', 'us'),
+    ('country', 'India', 'in'),
+    ('country', 'UK', 'gb'),
+    ('country', 'Atlantis', None),
+    ('country', 'XX', None),
+    ('ge', 'f', 'f'),
+    ('ge', 'Male', 'm'),
+    ('ge', 'FEMALE', 'f'),
+    ('ge', 'other', None),
+    ('db', '19970216', '19970216'),
+    ('db', '1997-02-16', '19970216'),
+    ('db', '02/01/1990', '19900102'),
+    ('db', '31.12.1985', '19851231'),
+    ('db', '13/13/1990', None),
+    ('db', 'soon', None),
+    ('external_id', ' ABC-123 ', 'abc-123'),
+]
+
+def check_examples():
+    ok = True
+    for field, raw, expected in EXAMPLES:
+        got = hash_value(field, raw)
+        wanted = sha256(expected) if expected is not None else None
+        if got != wanted:
+            print(f"ERROR: {field} {raw!r} should normalise to {expected!r}")
+            ok = False
+    print(f"Examples: {len(EXAMPLES)} checked")
+    return ok
+
+def check_passthrough_and_lists():
+    ok = True
+    digest = sha256('john_smith@gmail.com')
+    if hash_value('em', digest) != digest:
+        print("ERROR: an already hashed value was hashed again")
+        ok = False
+
+    emails = hash_value('em', ['A@example.com', ' b@example.com ', ''])
+    if emails != [sha256('a@example.com'), sha256('b@example.com')]:
+        print(f"ERROR: list of emails hashed to {emails}")
+        ok = False
+
+    prepared = prepare_user_data({
+        'em': 'A@example.com',
+        'ge': 'other',
+        'country': ['Atlantis'],
+        'client_ip_address': '10.0.0.1'
+    })
+    if prepared != {'em': sha256('a@example.com'), 'client_ip_address': '10.0.0.1'}:
+        print(f"ERROR: unnormalisable fields were not dropped: {prepared}")
+        ok = False
+    return ok
+
+def check_batch():
+    user_data_list = [
+        {'em': 'John_Smith@gmail.com', 'ph': '+1 (616) 954-7888', 'client_user_agent': 'ua'},
+        {'em': 'john_smith@gmail.com ', 'fn': 'John', 'country': 'United States'},
+        {'em': 'John_Smith@gmail.com', 'zp': 94025, 'ge': 'other', 'db': '02/01/1990'},
+        {'em': ['a@example.com', 'A@example.com'], 'ph': ['9876543210'], 'country': 'XX'},
+        {'external_id': sha256('abc'), 'ct': 'Menlo Park', 'db': 'soon'},
+        {},
+    ]
+    batch = prepare_user_data_batch(user_data_list)
+    single = [prepare_user_data(user_data) for user_data in user_data_list]
+    if batch != single:
+        for i, (b, s) in enumerate(zip(batch, single)):
+            if b != s:
+                print(f"ERROR: event {i} batch {b} != single {s}")
+        return False
+    print(f"Batch: {len(batch)} events match prepare_user_data")
+    return True
+
+def main():
+    print("META USER DATA NORMALISATION CHECK")
+    print("="*50)
+
+    ok = check_examples()
+    ok = check_passthrough_and_lists() and ok
+    ok = check_batch() and ok
+
+    print("SUCCESS" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Crawler check for crawl_nearby_places.py against the local Places API stub.
+Crawls the properties in properties_data.csv for several place types and
+verifies that every property gets exactly the places the stub holds for it,
+that paging completes without a fixed 2s sleep per page, and that the
+crawl beats the sequential time by a wide margin. A second pass through
+the geohash cell cache must need fewer searches than one per property and
+then none at all on refresh. Searches the stub rejects must be counted as
+failed rather than passed off as empty answers, and must not be cached,
+while a genuinely empty answer is cached like any other. Runs fully offline.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from crawl_nearby_places import crawl_nearby_places, load_property_locations_csv
+from nearby_places_cache import NearbyPlacesCache, haversine_metres
+from places_api_stub import start_stub_server
+
+PLACE_TYPES = ['point_of_interest', 'hospital', 'school', 'subway_station']
+RADIUS = 1500
+LATENCY = 0.05
+TOKEN_DELAY = 1.0
+
+def check_cache(stub, locations, direct_results):
+    """Cell-cached crawl: fewer searches, same places for uncapped types, none on refresh"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache_path = os.path.join(work_dir, 'cache.db')
+        # Precision 6 cells let properties ~650m apart share searches
+        cache = NearbyPlacesCache(cache_path, precision=6)
+        results, stats = crawl_nearby_places(locations, 'test-key', PLACE_TYPES, RADIUS,
+                                             workers=16, rate=200, base_url=stub.url, cache=cache)
+        cache.close()
+        print(f"Cached crawl stats: {stats}")
+        if stats['searches'] >= len(locations) * len(PLACE_TYPES):
+            print("ERROR: neighbouring properties did not share cell searches")
+            return False
+
+        for location in locations:
+            places = results[location['id']]['places']
+            for place in places:
+                distance = haversine_metres(location['latitude'], location['longitude'],
+                                            place['location']['lat'], place['location']['lng'])
+                if distance > RADIUS:
+                    print(f"ERROR: property {location['id']} got a place {distance:.0f}m away")
+                    return False
+            # Types with fewer than 60 places around a cell are never truncated
+            for place_type in PLACE_TYPES[1:]:
+                direct = {p['place_id'] for p in direct_results[location['id']]['places'] if place_type in p['types']}
+                cached = {p['place_id'] for p in places if place_type in p['types']}
+                if direct != cached:
+                    print(f"ERROR: property {location['id']} {place_type}: {len(cached)} cached vs {len(direct)} direct")
+                    return False
+
+        # Refresh from a new process: everything comes from the persisted cache
+        cache = NearbyPlacesCache(cache_path, precision=6)
+        refreshed, stats = crawl_nearby_places(locations, 'test-key', PLACE_TYPES, RADIUS,
+                                               workers=16, rate=200, base_url=stub.url, cache=cache)
+        cache.close()
+        print(f"Refresh stats: {stats}")
+        return stats['searches'] == 0 and refreshed == results
+
+def check_failures(stub, locations):
+    """Rejected searches are counted as failed and leave the properties without places"""
+    results, stats = crawl_nearby_places(locations, '', PLACE_TYPES, RADIUS,
+                                         workers=16, rate=200, base_url=stub.url)
+    print(f"Rejected crawl stats: {stats}")
+    if stats['failed'] != stats['searches'] or not stats['searches']:
+        print("ERROR: rejected searches were not counted as failed")
+        return False
+    return all(not result['places'] for result in results.values())
+
+def check_empty_and_failed_cache(stub):
+    """ZERO_RESULTS answers are cached; searches that failed are fetched again"""
+    # Well outside the stub's bounds, so every search comes back empty
+    empty = [{'id': 'empty', 'name': 'Nowhere', 'latitude': 13.6, 'longitude': 78.4}]
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache_path = os.path.join(work_dir, 'cache.db')
+        for api_key, label in (('', 'Rejected'), ('test-key', 'Empty'), ('test-key', 'Empty refresh')):
+            cache = NearbyPlacesCache(cache_path, precision=6)
+            results, stats = crawl_nearby_places(empty, api_key, PLACE_TYPES, RADIUS,
+                                                 workers=4, rate=200, base_url=stub.url, cache=cache)
+            cache.close()
+            print(f"{label} cached crawl stats: {stats}")
+            if label == 'Empty' and (stats['searches'] != len(PLACE_TYPES) or stats['failed']):
+                print("ERROR: failed searches were cached")
+                return False
+        if stats['searches'] or results['empty']['places']:
+            print("ERROR: empty answers were not cached")
+            return False
+    return True
+
+def main():
+    print("NEARBY PLACES CRAWLER CHECK")
+    print("="*50)
+
+    stub = start_stub_server(latency=LATENCY, token_delay=TOKEN_DELAY)
+    locations = load_property_locations_csv('properties_data.csv')
+    print(f"{len(locations)} properties with coordinates")
+
+    start = time.monotonic()
+    results, stats = crawl_nearby_places(locations, 'test-key', PLACE_TYPES, RADIUS,
+                                         workers=16, rate=200, base_url=stub.url)
+    elapsed = time.monotonic() - start
+    print(f"Crawl stats: {stats}")
+    print(f"Stub counters: {stub.state.snapshot()}")
+
+    ok = True
+    for location in locations:
+        expected = set()
+        for place_type in PLACE_TYPES:
+            expected.update(place['place_id'] for place in
+                            stub.state.search(location['latitude'], location['longitude'], RADIUS, place_type))
+        got = [place['place_id'] for place in results[location['id']]['places']]
+        if set(got) != expected or len(got) != len(set(got)):
+            print(f"ERROR: property {location['id']} got {len(got)} places, expected {len(expected)}")
+            ok = False
+
+    # The old loop: one request at a time plus a 2s sleep before every page
+    snapshot = stub.state.snapshot()
+    sequential = snapshot['searches'] * LATENCY + snapshot['pages'] * (2 + LATENCY)
+    print(f"Elapsed {elapsed:.1f}s vs ~{sequential:.1f}s sequentially")
+    if elapsed * 4 > sequential:
+        print("ERROR: crawl was not substantially faster than sequential")
+        ok = False
+    if snapshot['premature_tokens'] > snapshot['pages']:
+        print("ERROR: too many premature page token polls")
+        ok = False
+
+    if stats['failed']:
+        print(f"ERROR: {stats['failed']} searches failed against the stub")
+        ok = False
+
+    ok = check_failures(stub, locations[:5]) and ok
+    ok = check_empty_and_failed_cache(stub) and ok
+    ok = check_cache(stub, locations, results) and ok
+
+    stub.shutdown()
+    print("SUCCESS" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Index check for nearby_places_index.py.
+Builds the index over the Places API stub's synthetic places (formatted as
+stored by fetch_nearby_places) and compares nearest/within answers for
+random query points against a brute-force scan, then times the queries.
+Runs fully offline.
+"""
+
+import random
+import sys
+import time
+
+from fetch_nearby_places import format_places
+from nearby_places_cache import haversine_metres
+from nearby_places_index import PlacesIndex
+from places_api_stub import BOUNDS, make_places
+
+PLACE_COUNT = 20000
+QUERIES = 300
+
+def brute_force(places, lat, lng, place_type):
+    return sorted(
+        (haversine_metres(lat, lng, p['location']['lat'], p['location']['lng']), p['place_id'])
+        for p in places if place_type is None or place_type in p['types']
+    )
+
+def main():
+    print("NEARBY PLACES INDEX CHECK")
+    print("="*50)
+
+    places = format_places(make_places(PLACE_COUNT))
+    start = time.perf_counter()
+    index = PlacesIndex(places)
+    print(f"Indexed {len(index.places)} places in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    rng = random.Random(7)
+    queries = []
+    for _ in range(QUERIES):
+        # Mostly inside the data, some well outside it
+        lat = rng.uniform(BOUNDS[0] - 0.05, BOUNDS[2] + 0.05)
+        lng = rng.uniform(BOUNDS[1] - 0.05, BOUNDS[3] + 0.05)
+        queries.append((lat, lng, rng.choice([None, 'hospital', 'subway_station', 'park'])))
+
+    ok = True
+    for lat, lng, place_type in queries:
+        expected = brute_force(places, lat, lng, place_type)
+        nearest = [(round(d, 3), p['place_id']) for p, d in index.nearest(lat, lng, 5, place_type=place_type)]
+        if nearest != [(round(d, 3), pid) for d, pid in expected[:5]]:
+            print(f"ERROR: nearest mismatch at {lat},{lng} ({place_type})")
+            ok = False
+            break
+        within = {p['place_id'] for p, _ in index.within(lat, lng, 1200, place_type=place_type)}
+        if within != {pid for d, pid in expected if d <= 1200}:
+            print(f"ERROR: within mismatch at {lat},{lng} ({place_type})")
+            ok = False
+            break
+
+    for name, query in (('nearest k=3', lambda q: index.nearest(q[0], q[1], 3, place_type=q[2])),
+                        ('within 1000m', lambda q: index.within(q[0], q[1], 1000, place_type=q[2]))):
+        start = time.perf_counter()
+        for _ in range(10):
+            for q in queries:
+                query(q)
+        print(f"{name}: {(time.perf_counter() - start) / (10 * QUERIES) * 1e6:.1f} us/query")
+
+    print("SUCCESS" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
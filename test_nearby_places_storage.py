@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Storage check for the slim nearby places schema.
+Compares the per-property payload size and JSON parse time of the full
+format_places output against get_places_json_string's slim form (using the
+stored nearby_places.json), checks photos are kept as references by
+place_id, and round-trips a crawl through the columnar
+.npz form. Runs fully offline.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+from fetch_nearby_places import get_places_json_string, photo_references, slim_places
+from nearby_places_columnar import load_crawl_columnar, save_crawl_columnar
+
+def parse_time(payload, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        json.loads(payload)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    print("NEARBY PLACES STORAGE CHECK")
+    print("="*50)
+
+    with open('nearby_places.json', 'r', encoding='utf-8') as f:
+        places = json.load(f)
+
+    full = get_places_json_string(places, slim=False)
+    slim = get_places_json_string(places)
+    full_us, slim_us = parse_time(full), parse_time(slim)
+    print(f"{len(places)} places: full {len(full.encode('utf-8'))} bytes / {full_us:.0f} us to parse, "
+          f"slim {len(slim.encode('utf-8'))} bytes / {slim_us:.0f} us to parse")
+
+    ok = len(slim) * 2 < len(full)
+    for original, kept in zip(places, json.loads(slim)):
+        if kept['name'] != original['name'] or kept['location'] != original['location']:
+            print(f"ERROR: slim place differs: {kept}")
+            ok = False
+            break
+
+    photos = photo_references(places)
+    with_photos = {place['place_id'] for place in places if place.get('photos')}
+    print(f"Photo references: {len(photos)} places, {len(json.dumps(photos))} bytes stored once")
+    if set(photos) != with_photos or any('photo_reference' not in ref for ref in photos.values()):
+        print("ERROR: photo references do not match the places with photos")
+        ok = False
+
+    results = {
+        '142': {'name': 'KOTS HUIT', 'latitude': 12.985737151, 'longitude': 77.705841043,
+                'places': slim_places(places[:40])},
+        '135': {'name': 'KOTS RUE', 'latitude': 12.958152217, 'longitude': 77.700949142,
+                'places': slim_places(places[30:])}
+    }
+    with tempfile.TemporaryDirectory() as work_dir:
+        path = os.path.join(work_dir, 'crawl.npz')
+        save_crawl_columnar(results, path)
+        print(f"Columnar crawl file: {os.path.getsize(path)} bytes")
+        loaded = load_crawl_columnar(path)
+
+    expected = {int(property_id): entry for property_id, entry in results.items()}
+    if loaded != expected:
+        print("ERROR: columnar round trip changed the data")
+        ok = False
+
+    print("SUCCESS" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
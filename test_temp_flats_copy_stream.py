@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Offline check for the COPY loader in csv_to_temp_flats_insert.py.
+Builds a converter plan from an information_schema listing of temp_flats
+columns, then the COPY stream from some_flats.csv plus a few deliberately
+broken rows. Verifies that the plan is introspected once and cached, that
+varchar limits and column overrides are applied, that every good row
+round-trips through the COPY text format, and that the broken rows land in
+the reject file with a reason instead of in the stream.
+"""
+
+import csv
+import io
+import sys
+
+from csv_to_temp_flats_insert import build_copy_stream, format_copy_value, get_converter_plan
+
+CSV_FILE = 'some_flats.csv'
+
+# (column_name, data_type, character_maximum_length) as information_schema reports them
+COLUMNS = [
+    ('id', 'bigint', None),
+    ('name', 'character varying', 5),
+    ('flat_number', 'character varying', 255),
+    ('quantity', 'integer', None),
+    ('price_with_tax', 'numeric', None),
+    ('description', 'text', None),
+    ('images', 'jsonb', None),
+    ('email_opt_out', 'boolean', None),
+    ('available_date_for_next_booking', 'date', None),
+    ('last_activity_time', 'timestamp with time zone', None),
+    ('reserved_car_parking_available', 'character varying', 3),
+    ('booking_lock_status', 'USER-DEFINED', None),
+    ('not_in_csv', 'text', None),
+]
+
+class SchemaCursor:
+    """Answers the information_schema query with COLUMNS"""
+
+    def __init__(self):
+        self.queries = 0
+
+    def execute(self, query, params):
+        self.queries += 1
+        self.params = params
+
+    def fetchall(self):
+        return COLUMNS
+
+def parse_copy_field(field):
+    """Inverse of format_copy_value for the escapes it emits"""
+    if field == '\\N':
+        return None
+    return (field.replace('\\\\', '\0').replace('\\t', '\t').replace('\\n', '\n')
+            .replace('\\r', '\r').replace('\0', '\\'))
+
+def main():
+    print("TEMP_FLATS COPY STREAM CHECK")
+    print("="*50)
+
+    ok = True
+    cursor = SchemaCursor()
+    plan = get_converter_plan(cursor, 'temp_flats')
+    if get_converter_plan(cursor, 'temp_flats') is not plan or cursor.queries != 1:
+        print("ERROR: converter plan was not cached after the first introspection")
+        ok = False
+    if cursor.params != ('public', 'temp_flats'):
+        print(f"ERROR: introspected {cursor.params}")
+        ok = False
+
+    with open(CSV_FILE, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    convert = {col: entry['convert'] for col, entry in plan.items()}
+    checks = [
+        (convert['name']('K02B602'), 'K02B6'),
+        (convert['name']('   '), None),
+        (convert['quantity']('3.0'), 3),
+        (convert['price_with_tax']('12.50'), 12.5),
+        (convert['email_opt_out']('TRUE'), True),
+        (convert['reserved_car_parking_available']('y'), 'YES'),
+        (convert['reserved_car_parking_available']('NULL'), 'NO'),
+        (convert['booking_lock_status']('booked'), 'available'),
+        (convert['images']('{savedName: a.webp}'), '{"savedName": "a.webp"}'),
+        (convert['last_activity_time']('2025-09-02 07:08:39.309031+00'), '2025-09-02 07:08:39.309031+00'),
+    ]
+    for got, expected in checks:
+        if got != expected:
+            print(f"ERROR: converted to {got!r}, expected {expected!r}")
+            ok = False
+
+    bad_rows = [
+        {**rows[0], 'quantity': '99999999999'},
+        {**rows[0], 'available_date_for_next_booking': 'next tuesday'},
+        {**rows[0], 'description': 'nul\x00byte'},
+    ]
+    escaped_row = {**rows[0], 'description': 'tab\there\nnew line \\ backslash'}
+
+    source = io.StringIO()
+    writer = csv.DictWriter(source, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(rows + bad_rows + [escaped_row])
+    source.write(','.join(['x'] * (len(fieldnames) + 3)) + '\n')  # Too many fields
+    source.seek(0)
+
+    valid_columns = [col for col in fieldnames if col in plan]
+    rejects = io.StringIO()
+    reject_writer = csv.DictWriter(rejects, fieldnames=fieldnames + ['_row_number', '_reject_reason'])
+    reject_writer.writeheader()
+    stream, accepted, rejected = build_copy_stream(csv.DictReader(source), valid_columns, plan, reject_writer)
+    print(f"Accepted {accepted}, rejected {rejected}")
+
+    good_rows = rows + [escaped_row]
+    if accepted != len(good_rows) or rejected != len(bad_rows) + 1:
+        print(f"ERROR: expected {len(good_rows)} accepted and {len(bad_rows) + 1} rejected")
+        ok = False
+
+    lines = stream.getvalue().split('\n')[:-1]
+    for row, line in zip(good_rows, lines):
+        fields = line.split('\t')
+        if len(fields) != len(valid_columns):
+            print(f"ERROR: line has {len(fields)} fields, expected {len(valid_columns)}")
+            ok = False
+            break
+        for col, field in zip(valid_columns, fields):
+            expected = convert[col](row[col])
+            expected = None if expected is None else parse_copy_field(format_copy_value(expected))
+            if parse_copy_field(field) != expected:
+                print(f"ERROR: {col} round-tripped to {field!r}, expected {expected!r}")
+                ok = False
+                break
+        name = parse_copy_field(fields[valid_columns.index('name')])
+        if name is not None and len(name) > 5:
+            print(f"ERROR: name {name!r} exceeds varchar(5)")
+            ok = False
+
+    if escaped_row['description'] != parse_copy_field(lines[-1].split('\t')[valid_columns.index('description')]):
+        print("ERROR: escaped text did not survive the COPY format")
+        ok = False
+
+    rejects.seek(0)
+    reasons = [(r['_row_number'], r['_reject_reason']) for r in csv.DictReader(rejects)]
+    print(f"Rejects: {reasons}")
+    expected_prefixes = ['quantity', 'available_date_for_next_booking', 'description', 'wrong number of fields']
+    if [reason.split(':')[0] for _, reason in reasons] != expected_prefixes:
+        print("ERROR: reject reasons do not match the broken rows")
+        ok = False
+    if [int(n) for n, _ in reasons] != list(range(len(rows) + 2, len(rows) + 5)) + [len(rows) + 6]:
+        print("ERROR: reject row numbers are wrong")
+        ok = False
+
+    print("SUCCESS" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,8 @@ import json
 from dotenv import load_dotenv
 import logging
 
+from batch_update import batch_update
+
 # Load environment variables
 load_dotenv()
 
@@ -20,6 +22,9 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Columns a CSV row can set, in statement order; the last two are optional
+FLAT_IMAGE_COLUMNS = ('images', 'featured_image', 'terms_conditions', 'youtube_link')
+
 def connect_db():
     """Create database connection using environment variables"""
     try:
@@ -107,6 +112,51 @@ def get_youtube_link_json(video_value):
         logger.error(f"Error creating youtube link JSON: {e}")
         return None
 
+def get_flat_ids_by_slug(cursor, slugs):
+    """Resolve slugs to flat ids with a single query: {slug: [flat ids]}"""
+    flat_ids_by_slug = {}
+    if not slugs:
+        return flat_ids_by_slug
+    
+    cursor.execute("SELECT slug, id FROM flats WHERE slug = ANY(%s)", (slugs,))
+    for slug, flat_id in cursor.fetchall():
+        flat_ids_by_slug.setdefault(slug, []).append(flat_id)
+    
+    return flat_ids_by_slug
+
+def apply_flat_image_updates(conn, pending, flat_ids_by_slug, chunk_size=500):
+    """
+    Write the collected image updates with batched UPDATE ... FROM (VALUES ...).
+    Rows are grouped by which optional columns (terms_conditions, youtube_link)
+    they carry so that every row of a statement sets the same columns.
+    Returns {'updated': count, 'unchanged': count, 'failed': count}.
+    """
+    stats = {'updated': 0, 'unchanged': 0, 'failed': 0}
+    groups = {}
+    slugs_by_id = {}
+    
+    for slug, entry in pending.items():
+        values = entry['values']
+        columns = tuple(column for column in FLAT_IMAGE_COLUMNS if column in values)
+        for flat_id in flat_ids_by_slug.get(slug, []):
+            groups.setdefault(columns, []).append((flat_id,) + tuple(values[c] for c in columns))
+            slugs_by_id[flat_id] = slug
+    
+    for columns, rows in groups.items():
+        logger.info(f"Updating {len(rows)} flats setting {', '.join(columns)}")
+        result = batch_update(conn, 'flats', 'id', list(columns), rows, chunk_size=chunk_size)
+        
+        for flat_id in result['updated']:
+            logger.info(f"Updated flat ID {flat_id} with slug '{slugs_by_id[flat_id]}'")
+        for flat_id, error in result['failed']:
+            logger.error(f"Error updating flat ID {flat_id} with slug '{slugs_by_id[flat_id]}': {error}")
+        
+        stats['updated'] += len(result['updated'])
+        stats['unchanged'] += result['unchanged']
+        stats['failed'] += len(result['failed'])
+    
+    return stats
+
 def process_csv_and_update_flats(csv_file_path):
     """
     Process CSV file and update flats table with images and featured_image
@@ -185,6 +235,7 @@ def process_csv_and_update_flats(csv_file_path):
             rows_updated = 0
             rows_not_found = 0
             rows_failed = 0
+            pending = {}  # slug -> {'row_num', 'values'}
             
             # Re-open file for processing data rows with the same delimiter
             with open(csv_file_path, 'r', encoding='utf-8', errors='replace') as file:
@@ -250,59 +301,22 @@ def process_csv_and_update_flats(csv_file_path):
                             if youtube_link_json:
                                 logger.info(f"Row {row_num}: youtube_link_json='{youtube_link_json}'")
                         
-                        # Check if flat exists with this slug
-                        cursor.execute("SELECT id FROM flats WHERE slug = %s", (slug,))
-                        flat_record = cursor.fetchone()
-                        
-                        if not flat_record:
-                            logger.warning(f"Row {row_num}: No flat found with slug '{slug}'")
-                            rows_not_found += 1
-                            continue
-                        
-                        flat_id = flat_record[0]
-                        
-                        # Prepare update query and parameters based on available data
-                        update_fields = ["images = %s::jsonb", "featured_image = %s::jsonb"]
-                        update_params = [images_json, featured_image_json]
-                        
+                        # Collect the update; the database is touched once all rows are read
+                        values = {'images': images_json, 'featured_image': featured_image_json}
                         if terms_conditions:
-                            update_fields.append("terms_conditions = %s")
-                            update_params.append(terms_conditions)
-                        
+                            values['terms_conditions'] = terms_conditions
                         if youtube_link_json:
-                            update_fields.append("youtube_link = %s::jsonb")
-                            update_params.append(youtube_link_json)
+                            values['youtube_link'] = youtube_link_json
                         
-                        update_params.append(slug)  # Add slug for WHERE clause
-                        
-                        update_query = f"""
-                            UPDATE flats 
-                            SET {', '.join(update_fields)}
-                            WHERE slug = %s
-                        """
-                        
-                        try:
-                            cursor.execute(update_query, update_params)
-                            
-                            if cursor.rowcount > 0:
-                                rows_updated += 1
-                                logger.info(f"Row {row_num}: Updated flat ID {flat_id} with slug '{slug}'")
-                            else:
-                                logger.warning(f"Row {row_num}: No rows updated for slug '{slug}'")
-                        except Exception as db_error:
-                            logger.error(f"Row {row_num}: Database error: {db_error}")
-                            logger.error(f"Row {row_num}: Query: {update_query}")
-                            logger.error(f"Row {row_num}: Params: {update_params}")
-                            # Rollback the transaction and start fresh
-                            conn.rollback()
-                            raise db_error
+                        if slug in pending:
+                            # Later rows win column by column, as when rows were applied one at a time
+                            logger.warning(f"Row {row_num}: Duplicate slug '{slug}' (first seen in row {pending[slug]['row_num']})")
+                            pending[slug]['values'].update(values)
+                            pending[slug]['row_num'] = row_num
+                        else:
+                            pending[slug] = {'row_num': row_num, 'values': values}
                         
                         rows_processed += 1
-                        
-                        # Commit every 100 rows
-                        if rows_processed % 100 == 0:
-                            conn.commit()
-                            logger.info(f"Processed {rows_processed} rows, updated {rows_updated} flats...")
                     
                     except Exception as e:
                         logger.error(f"Error processing row {row_num}: {e}")
@@ -310,12 +324,25 @@ def process_csv_and_update_flats(csv_file_path):
                         rows_failed += 1
                         continue
             
+            # Resolve every slug with one query, then apply the updates in batches
+            flat_ids_by_slug = get_flat_ids_by_slug(cursor, list(pending))
+            
+            for slug, entry in pending.items():
+                if slug not in flat_ids_by_slug:
+                    logger.warning(f"Row {entry['row_num']}: No flat found with slug '{slug}'")
+                    rows_not_found += 1
+            
+            update_stats = apply_flat_image_updates(conn, pending, flat_ids_by_slug)
+            rows_updated = update_stats['updated']
+            rows_failed += update_stats['failed']
+            
             # Final commit
             conn.commit()
             
             logger.info(f"Processing complete!")
             logger.info(f"Total rows processed: {rows_processed}")
             logger.info(f"Flats updated: {rows_updated}")
+            logger.info(f"Flats unchanged: {update_stats['unchanged']}")
             logger.info(f"Flats not found: {rows_not_found}")
             logger.info(f"Failed rows: {rows_failed}")
             
@@ -13,6 +13,9 @@ from datetime import datetime
 from dotenv import load_dotenv
 import logging
 
+from excel_cache import read_excel_cached
+from batch_update import batch_update
+
 # Load environment variables
 load_dotenv()
 
@@ -78,7 +81,7 @@ def read_excel_file(excel_file_path):
         
         # Try openpyxl engine first
         try:
-            df = pd.read_excel(excel_file_path, engine='openpyxl')
+            df = read_excel_cached(excel_file_path, engine='openpyxl')
             logger.info(f"Successfully read Excel file with openpyxl engine")
         except Exception as e:
             logger.warning(f"Failed to read with openpyxl: {e}")
@@ -202,9 +205,11 @@ def get_existing_flats(conn):
         logger.error(f"Error fetching existing flats: {e}")
         return {}
 
-def update_flat_descriptions(conn, flat_descriptions, existing_flats):
+def update_flat_descriptions(conn, flat_descriptions, existing_flats, chunk_size=500):
     """
     Update flat descriptions in the database
+    Descriptions are written in chunks with one UPDATE ... FROM (VALUES ...)
+    per chunk; a savepoint per chunk isolates bad rows.
     Returns statistics about the update process
     """
     stats = {
@@ -216,54 +221,45 @@ def update_flat_descriptions(conn, flat_descriptions, existing_flats):
     }
     
     try:
-        cursor = conn.cursor()
-        
-        # Prepare update query
-        update_query = """
-            UPDATE flats 
-            SET description = %s, modified_date = %s 
-            WHERE id = %s
-        """
-        
-        current_time = datetime.now()
+        pending = []
+        names_by_id = {}
         
         for flat_name, new_description in flat_descriptions.items():
-            try:
-                # Check if flat exists in database
-                if flat_name not in existing_flats:
-                    stats['not_found'] += 1
-                    logger.debug(f"Flat '{flat_name}' not found in database")
-                    continue
-                
-                stats['matched'] += 1
-                flat_info = existing_flats[flat_name]
-                current_description = flat_info['current_description']
-                
-                # Check if description actually needs updating
-                if current_description == new_description:
-                    stats['unchanged'] += 1
-                    logger.debug(f"Flat '{flat_name}' description unchanged")
-                    continue
-                
-                # Perform the update
-                cursor.execute(update_query, (new_description, current_time, flat_info['id']))
-                
-                if cursor.rowcount > 0:
-                    stats['updated'] += 1
-                    logger.info(f"Updated description for flat '{flat_name}' (ID: {flat_info['id']})")
-                else:
-                    stats['errors'] += 1
-                    logger.warning(f"No rows updated for flat '{flat_name}' (ID: {flat_info['id']})")
-                
-            except Exception as e:
-                stats['errors'] += 1
-                logger.error(f"Error updating flat '{flat_name}': {e}")
-                conn.rollback()  # Rollback this transaction
+            # Check if flat exists in database
+            if flat_name not in existing_flats:
+                stats['not_found'] += 1
+                logger.debug(f"Flat '{flat_name}' not found in database")
+                continue
+            
+            stats['matched'] += 1
+            flat_info = existing_flats[flat_name]
+            
+            # Check if description actually needs updating
+            if flat_info['current_description'] == new_description:
+                stats['unchanged'] += 1
+                logger.debug(f"Flat '{flat_name}' description unchanged")
                 continue
+            
+            pending.append((flat_info['id'], new_description))
+            names_by_id[flat_info['id']] = flat_name
+        
+        result = batch_update(
+            conn, 'flats', 'id', ['description'], pending,
+            extra_assignments={'modified_date': datetime.now()},
+            chunk_size=chunk_size
+        )
+        
+        for flat_id in result['updated']:
+            logger.info(f"Updated description for flat '{names_by_id.get(flat_id)}' (ID: {flat_id})")
+        for flat_id, error in result['failed']:
+            logger.error(f"Error updating flat '{names_by_id.get(flat_id)}': {error}")
+        
+        stats['updated'] = len(result['updated'])
+        stats['unchanged'] += result['unchanged']
+        stats['errors'] = len(result['failed'])
         
         # Commit all successful updates
         conn.commit()
-        cursor.close()
         
         return stats
         
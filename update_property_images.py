@@ -13,6 +13,8 @@ import psycopg2
 from dotenv import load_dotenv
 import logging
 
+from batch_update import batch_update
+
 # Load environment variables
 load_dotenv('staging.env')
 
@@ -27,6 +29,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Columns a CSV row can set, in statement order
+PROPERTY_IMAGE_COLUMNS = ('featured_image', 'youtube_link')
+
 def connect_db():
     """Connect to PostgreSQL database"""
     try:
@@ -103,6 +108,53 @@ def process_youtube_link_json(youtube_value):
         logger.error(f"Error creating youtube link JSON: {e}")
         return None
 
+def get_property_ids_by_slug(cursor, slugs):
+    """Resolve slugs to property ids with a single query: {slug: [property ids]}"""
+    property_ids_by_slug = {}
+    if not slugs:
+        return property_ids_by_slug
+    
+    cursor.execute("SELECT slug, id FROM properties WHERE slug = ANY(%s)", (slugs,))
+    for slug, property_id in cursor.fetchall():
+        property_ids_by_slug.setdefault(slug, []).append(property_id)
+    
+    return property_ids_by_slug
+
+def apply_property_image_updates(conn, pending, property_ids_by_slug, chunk_size=500):
+    """
+    Write the collected updates with batched UPDATE ... FROM (VALUES ...).
+    Rows are grouped by which columns (featured_image, youtube_link) they
+    carry so that every row of a statement sets the same columns.
+    
+    Returns:
+        dict: {'updated': count, 'unchanged': count, 'failed': count}
+    """
+    stats = {'updated': 0, 'unchanged': 0, 'failed': 0}
+    groups = {}
+    slugs_by_id = {}
+    
+    for slug, entry in pending.items():
+        values = entry['values']
+        columns = tuple(column for column in PROPERTY_IMAGE_COLUMNS if column in values)
+        for property_id in property_ids_by_slug.get(slug, []):
+            groups.setdefault(columns, []).append((property_id,) + tuple(values[c] for c in columns))
+            slugs_by_id[property_id] = slug
+    
+    for columns, rows in groups.items():
+        logger.info(f"Updating {len(rows)} properties setting {', '.join(columns)}")
+        result = batch_update(conn, 'properties', 'id', list(columns), rows, chunk_size=chunk_size)
+        
+        for property_id in result['updated']:
+            logger.info(f"Updated property ID {property_id} with slug '{slugs_by_id[property_id]}'")
+        for property_id, error in result['failed']:
+            logger.error(f"Error updating property ID {property_id} with slug '{slugs_by_id[property_id]}': {error}")
+        
+        stats['updated'] += len(result['updated'])
+        stats['unchanged'] += result['unchanged']
+        stats['failed'] += len(result['failed'])
+    
+    return stats
+
 def process_csv_and_update_properties(csv_file_path):
     """
     Process CSV file and update properties table with featured_image and youtube_link
@@ -176,6 +228,7 @@ def process_csv_and_update_properties(csv_file_path):
             rows_updated = 0
             rows_not_found = 0
             rows_failed = 0
+            pending = {}  # slug -> {'row_num', 'values'}
             
             # Re-open file for processing data rows with the same delimiter
             with open(csv_file_path, 'r', encoding='utf-8', errors='replace') as file:
@@ -233,59 +286,22 @@ def process_csv_and_update_properties(csv_file_path):
                                 logger.info(f"Row {row_num}: youtube_link_value='{youtube_link_value}'")
                                 logger.info(f"Row {row_num}: youtube_link_json='{youtube_link_json}'")
                         
-                        # Check if property exists with this slug
-                        cursor.execute("SELECT id FROM properties WHERE slug = %s", (slug,))
-                        property_record = cursor.fetchone()
-                        
-                        if not property_record:
-                            logger.warning(f"Row {row_num}: No property found with slug '{slug}'")
-                            rows_not_found += 1
-                            continue
-                        
-                        property_id = property_record[0]
-                        
-                        # Prepare update query and parameters based on available data
-                        update_fields = []
-                        update_params = []
-                        
+                        # Collect the update; the database is touched once all rows are read
+                        values = {}
                         if featured_image_json:
-                            update_fields.append("featured_image = %s::jsonb")
-                            update_params.append(featured_image_json)
-                        
+                            values['featured_image'] = featured_image_json
                         if youtube_link_json:
-                            update_fields.append("youtube_link = %s::jsonb")
-                            update_params.append(youtube_link_json)
+                            values['youtube_link'] = youtube_link_json
                         
-                        update_params.append(slug)  # Add slug for WHERE clause
-                        
-                        update_query = f"""
-                            UPDATE properties 
-                            SET {', '.join(update_fields)}
-                            WHERE slug = %s
-                        """
-                        
-                        try:
-                            cursor.execute(update_query, update_params)
-                            
-                            if cursor.rowcount > 0:
-                                rows_updated += 1
-                                logger.info(f"Row {row_num}: Updated property ID {property_id} with slug '{slug}'")
-                            else:
-                                logger.warning(f"Row {row_num}: No rows updated for slug '{slug}'")
-                        except Exception as db_error:
-                            logger.error(f"Row {row_num}: Database error: {db_error}")
-                            logger.error(f"Row {row_num}: Query: {update_query}")
-                            logger.error(f"Row {row_num}: Params: {update_params}")
-                            # Rollback the transaction and start fresh
-                            conn.rollback()
-                            raise db_error
+                        if slug in pending:
+                            # Later rows win column by column, as when rows were applied one at a time
+                            logger.warning(f"Row {row_num}: Duplicate slug '{slug}' (first seen in row {pending[slug]['row_num']})")
+                            pending[slug]['values'].update(values)
+                            pending[slug]['row_num'] = row_num
+                        else:
+                            pending[slug] = {'row_num': row_num, 'values': values}
                         
                         rows_processed += 1
-                        
-                        # Commit every 10 rows (smaller batches for properties)
-                        if rows_processed % 10 == 0:
-                            conn.commit()
-                            logger.info(f"Processed {rows_processed} rows, updated {rows_updated} properties...")
                     
                     except Exception as e:
                         logger.error(f"Error processing row {row_num}: {e}")
@@ -293,12 +309,25 @@ def process_csv_and_update_properties(csv_file_path):
                         rows_failed += 1
                         continue
             
+            # Resolve every slug with one query, then apply the updates in batches
+            property_ids_by_slug = get_property_ids_by_slug(cursor, list(pending))
+            
+            for slug, entry in pending.items():
+                if slug not in property_ids_by_slug:
+                    logger.warning(f"Row {entry['row_num']}: No property found with slug '{slug}'")
+                    rows_not_found += 1
+            
+            update_stats = apply_property_image_updates(conn, pending, property_ids_by_slug)
+            rows_updated = update_stats['updated']
+            rows_failed += update_stats['failed']
+            
             # Final commit
             conn.commit()
             
             logger.info(f"Processing complete!")
             logger.info(f"Total rows processed: {rows_processed}")
             logger.info(f"Properties updated: {rows_updated}")
+            logger.info(f"Properties unchanged: {update_stats['unchanged']}")
             logger.info(f"Properties not found: {rows_not_found}")
             logger.info(f"Failed rows: {rows_failed}")
             